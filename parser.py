@@ -1,26 +1,48 @@
 #!/usr/bin/env python3
 
-import re
 import itertools
 from typing import Final
 
 from html.parser import HTMLParser
 
-EXCLUDE_PATHS: Final = [
-    re.compile(r'/api/', re.IGNORECASE),
-    re.compile(r'/api2/', re.IGNORECASE),
-    re.compile(r'/__debug__/', re.IGNORECASE),
-    ]
+from spidercheck.exclusion import get_excluder
 
 
 def is_valid_url(url: str) -> bool:
-    for _pattern in EXCLUDE_PATHS:
-        if _pattern.match(url):
-            return False
-    return True
+    """Verdadero si la URL no está excluida por las reglas por defecto.
+
+    Las reglas de cada *site* se aplican al clasificar los enlaces (Ver
+    el módulo ``exclusion`` y ``Page.classify_urls``).
+    """
+    return not get_excluder()(url)
+
+
+#: Etiquetas que contienen enlaces, y el atributo con el enlace
+LINK_ATTRS: Final = {
+    'a': 'href',
+    'link': 'href',
+    'img': 'src',
+    'script': 'src',
+    }
+
+#: Etiquetas cuyo contenido es texto, no HTML, según la especificación
+#: de HTML. Los enlaces que contengan no se tienen en cuenta.
+RAW_TEXT_TAGS: Final = (
+    'script', 'style', 'xmp', 'iframe', 'noembed', 'noframes',
+    'textarea', 'title',
+    )
 
 
 class LinkExtractor(HTMLParser):
+    """Extrae los enlaces de una página HTML.
+
+    Se sigue la especificación de HTML, igual que los navegadores: si
+    un atributo está repetido, vale el primero; el contenido de las
+    etiquetas de ``RAW_TEXT_TAGS`` es texto, y el de las plantillas
+    (``<template>``) no forma parte del documento.
+    """
+
+    CDATA_CONTENT_ELEMENTS = RAW_TEXT_TAGS
 
     def __init__(self, *args, **kwargs):
         super(LinkExtractor, self).__init__(*args, **kwargs)
@@ -28,6 +50,7 @@ class LinkExtractor(HTMLParser):
         self.images = set()
         self.styles = set()
         self.scripts = set()
+        self._template = 0
 
     def all_links(self):
         return itertools.chain(
@@ -38,17 +61,24 @@ class LinkExtractor(HTMLParser):
         )
 
     def handle_starttag(self, tag, attrs):
-        parameters = dict(attrs)
+        if tag == 'template':
+            self._template += 1
+            return
+        name = LINK_ATTRS.get(tag)
+        if name is None or self._template:
+            return
+        url = next((value for key, value in attrs if key == name), None)
+        if not url:
+            return
         if tag == 'a':
-            if url := parameters.get('href'):
-                if is_valid_url(url):
-                    self.links.add(url)
+            self.links.add(url)
         elif tag == 'link':
-            if url := parameters.get('href'):
-                self.styles.add(url)
+            self.styles.add(url)
         elif tag == 'img':
-            if url := parameters.get('src'):
-                self.images.add(url)
-        elif tag == 'script':
-            if url := parameters.get('src'):
-                self.scripts.add(url)
+            self.images.add(url)
+        else:
+            self.scripts.add(url)
+
+    def handle_endtag(self, tag):
+        if tag == 'template':
+            self._template = max(0, self._template - 1)
@@ -0,0 +1,302 @@
+#!/usr/bin/env python3
+
+"""
+Módulo ``archive``
+------------------------------------------------------------------------
+
+Archivo de las respuestas descargadas, al estilo de los ficheros WARC.
+
+Si el *site* tiene definido un directorio de archivo (campo
+``archive_dir``), el contenido de cada página HTML descargada se guarda
+comprimido en disco, de forma que se pueda volver a procesar más tarde
+(Por ejemplo, al añadir un *plugin* nuevo o corregir el analizador) sin
+tener que volver a rastrear el *site*. Ver la orden ``replay``.
+
+Las respuestas se añaden al final de **ficheros de segmento**, que
+nunca se modifican. Cada proceso escribe en su propio segmento, así que
+no hacen falta bloqueos entre procesos, y se empieza un segmento nuevo
+al superar ``SEGMENT_SIZE``. La posición de cada respuesta dentro del
+segmento se guarda en la base de datos (Modelo ``ArchivedResponse``).
+
+Cada registro está formado por:
+
+- La marca ``MAGIC`` (4 bytes).
+
+- La longitud de la cabecera y la del contenido, como enteros de 32
+  bits sin signo, en orden de red.
+
+- La cabecera, en JSON: página, URL, fecha y hora de descarga, código
+  de estado, cabeceras HTTP, algoritmo de compresión y diccionario.
+
+- El contenido, en UTF-8, comprimido.
+
+Si está instalado el paquete ``zstandard``, se usa para comprimir el
+contenido y, una vez reunidas ``DICT_SAMPLES`` páginas del *site*, se
+entrena un diccionario propio del *site*, que mejora mucho la
+compresión de páginas pequeñas y parecidas entre sí. Los diccionarios
+se guardan en el mismo directorio, con la clave primaria del *site* en
+el nombre (``dict-<site>-<id>.zdict``), de forma que varios *sites*
+pueden compartir directorio. Si no está instalado, se usa ``zlib``.
+"""
+
+from pathlib import Path
+from typing import Optional
+import json
+import os
+import struct
+import threading
+import time
+import zlib
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+
+#: Marca de inicio de cada registro
+MAGIC = b'SCA1'
+
+RECORD_HEADER = struct.Struct('!4sII')
+
+#: Tamaño a partir del cual se empieza un segmento nuevo (256 MiB)
+SEGMENT_SIZE = 256 * 1024 * 1024
+
+#: Número de páginas con las que se entrena el diccionario del *site*
+DICT_SAMPLES = 200
+
+#: Tamaño máximo del diccionario del *site*
+DICT_SIZE = 112 * 1024
+
+#: Nivel de compresión
+COMPRESSION_LEVEL = 6
+
+
+class ArchiveError(Exception):
+    pass
+
+
+class Archive:
+    """Archivo de respuestas en un directorio.
+
+    Params:
+
+        - root (str): El directorio del archivo. Se crea si no existe.
+
+        - segment_size (int): Tamaño a partir del cual se empieza un
+          segmento nuevo.
+
+        - dict_samples (int): Número de páginas con las que se entrena
+          el diccionario, si se usa ``zstandard``. Si vale cero, no se
+          usan diccionarios.
+    """
+
+    def __init__(self, root, segment_size=SEGMENT_SIZE, dict_samples=DICT_SAMPLES):
+        self.root = Path(root)
+        self.segment_size = segment_size
+        self.dict_samples = dict_samples if zstandard is not None else 0
+        self._segment = None
+        self._file = None
+        # Por site: muestras, diccionario actual y compresor
+        self._samples = {}
+        self._dict_ids = {}
+        self._compressors = {}
+        self._untrained = set()
+        self._dictionaries = {}
+        self._lock = threading.Lock()
+        self.root.mkdir(parents=True, exist_ok=True)
+
+    def __repr__(self):
+        return f'Archive({str(self.root)!r})'
+
+    @property
+    def codec(self) -> str:
+        return 'zstd' if zstandard is not None else 'zlib'
+
+    # Diccionarios
+
+    def _dictionary_path(self, site: int, dict_id: int) -> Path:
+        return self.root / f'dict-{site}-{dict_id}.zdict'
+
+    def _load_latest_dictionary(self, site: int):
+        paths = sorted(
+            self.root.glob(f'dict-{site}-*.zdict'),
+            key=lambda path: path.stat().st_mtime,
+            )
+        if paths:
+            dict_id = int(paths[-1].stem.rsplit('-', 1)[1])
+            self._use_dictionary(site, dict_id, self._get_dictionary(site, dict_id))
+        else:
+            self._dict_ids[site] = 0
+
+    def _get_dictionary(self, site: int, dict_id: int):
+        dictionary = self._dictionaries.get((site, dict_id))
+        if dictionary is None:
+            data = self._dictionary_path(site, dict_id).read_bytes()
+            dictionary = zstandard.ZstdCompressionDict(data)
+            self._dictionaries[site, dict_id] = dictionary
+        return dictionary
+
+    def _use_dictionary(self, site: int, dict_id: int, dictionary):
+        self._dict_ids[site] = dict_id
+        self._dictionaries[site, dict_id] = dictionary
+        self._compressors[site] = zstandard.ZstdCompressor(
+            level=COMPRESSION_LEVEL,
+            dict_data=dictionary,
+            )
+
+    def _train_dictionary(self, site: int):
+        try:
+            dictionary = zstandard.train_dictionary(DICT_SIZE, self._samples[site])
+        except zstandard.ZstdError:
+            # Muestras insuficientes; se sigue sin diccionario
+            self._untrained.add(site)
+            return
+        finally:
+            del self._samples[site]
+        dict_id = dictionary.dict_id()
+        path = self._dictionary_path(site, dict_id)
+        tmp_path = path.with_suffix(f'.{os.getpid()}.tmp')
+        tmp_path.write_bytes(dictionary.as_bytes())
+        tmp_path.replace(path)
+        self._use_dictionary(site, dict_id, dictionary)
+
+    # Compresión
+
+    def _compress(self, data: bytes, site: int) -> tuple[bytes, int]:
+        if zstandard is None:
+            return zlib.compress(data, COMPRESSION_LEVEL), 0
+        if site not in self._dict_ids:
+            self._load_latest_dictionary(site)
+        if not self._dict_ids[site] and self.dict_samples and site not in self._untrained:
+            samples = self._samples.setdefault(site, [])
+            samples.append(data)
+            if len(samples) >= self.dict_samples:
+                self._train_dictionary(site)
+        compressor = self._compressors.get(site)
+        if compressor is None:
+            compressor = zstandard.ZstdCompressor(level=COMPRESSION_LEVEL)
+            self._compressors[site] = compressor
+        return compressor.compress(data), self._dict_ids[site]
+
+    def _decompress(self, data: bytes, codec: str, site: int, dict_id: int) -> bytes:
+        if codec == 'zlib':
+            return zlib.decompress(data)
+        if codec == 'zstd':
+            if zstandard is None:
+                raise ArchiveError('Se necesita el paquete zstandard para leer el archivo')
+            if dict_id:
+                decompressor = zstandard.ZstdDecompressor(
+                    dict_data=self._get_dictionary(site, dict_id),
+                    )
+            else:
+                decompressor = zstandard.ZstdDecompressor()
+            return decompressor.decompress(data)
+        raise ArchiveError(f'Algoritmo de compresión desconocido: {codec}')
+
+    # Segmentos
+
+    def _open_segment(self):
+        if self._file is not None:
+            self._file.close()
+        self._segment = f'segment-{time.time_ns()}-{os.getpid()}.sca'
+        self._file = open(self.root / self._segment, 'ab')
+
+    def append(self, header: dict, body: str, site: int = 0) -> tuple[str, int, int]:
+        """Añade una respuesta al archivo.
+
+        Params:
+
+            - header (dict): Metadatos de la respuesta. Se guardan en
+              JSON, así que deben ser serializables.
+
+            - body (str): El contenido de la respuesta.
+
+            - site (int): Opcional. La clave primaria del *site*, que
+              elige el diccionario de compresión.
+
+        Returns:
+
+            Una tupla con el nombre del segmento, la posición del
+            registro dentro del segmento y la longitud total del
+            registro.
+        """
+        with self._lock:
+            if self._file is None or self._file.tell() >= self.segment_size:
+                self._open_segment()
+            payload, dict_id = self._compress(body.encode('utf-8'), site)
+            header = dict(header, codec=self.codec, dict_id=dict_id)
+            header_bytes = json.dumps(header).encode('utf-8')
+            record = (
+                RECORD_HEADER.pack(MAGIC, len(header_bytes), len(payload))
+                + header_bytes
+                + payload
+                )
+            offset = self._file.tell()
+            self._file.write(record)
+            self._file.flush()
+            return self._segment, offset, len(record)
+
+    def read(self, segment: str, offset: int, site: int = 0) -> tuple[dict, str]:
+        """Lee una respuesta del archivo.
+
+        Params:
+
+            - segment (str): El nombre del segmento.
+
+            - offset (int): La posición del registro en el segmento.
+
+            - site (int): Opcional. La clave primaria del *site*, la
+              misma que al añadir la respuesta.
+
+        Returns:
+
+            Una tupla con los metadatos y el contenido de la respuesta.
+        """
+        with open(self.root / segment, 'rb') as source:
+            source.seek(offset)
+            magic, header_size, payload_size = RECORD_HEADER.unpack(
+                source.read(RECORD_HEADER.size)
+                )
+            if magic != MAGIC:
+                raise ArchiveError(f'Registro no válido en {segment}:{offset}')
+            header = json.loads(source.read(header_size))
+            payload = source.read(payload_size)
+        with self._lock:
+            data = self._decompress(payload, header['codec'], site, header['dict_id'])
+        return header, data.decode('utf-8')
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+
+_archives = {}
+_archives_lock = threading.Lock()
+
+
+def get_archive(root) -> Optional[Archive]:
+    """Devuelve el archivo asociado a un directorio.
+
+    El archivo se crea la primera vez que se solicita, y se mantiene
+    durante toda la vida del proceso.
+
+    Params:
+
+        - root (str): El directorio del archivo. Si está vacío, no hay
+          archivo.
+
+    Returns:
+
+        Una instancia de ``Archive``, o ``None`` si no se indica el
+        directorio.
+    """
+    if not root:
+        return None
+    with _archives_lock:
+        archive = _archives.get(root)
+        if archive is None:
+            archive = _archives[root] = Archive(root)
+        return archive
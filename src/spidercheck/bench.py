@@ -0,0 +1,460 @@
+#!/usr/bin/env python3
+
+"""
+Módulo ``bench``
+------------------------------------------------------------------------
+
+Banco de pruebas para medir el rendimiento del rastreo sin acceder a
+ningún servidor real.
+
+Se genera un *site* sintético (Clase ``SyntheticSite``), con un número
+configurable de páginas, enlaces por página, proporción de recursos
+(imágenes, hojas de estilo), errores y redirecciones, y se sirve desde
+un servidor HTTP local (Clase ``SyntheticServer``), que puede simular
+además la latencia de un servidor real.
+
+La función ``run_benchmark`` rastrea ese *site* con el motor indicado
+(``check``, es decir, ``core.check_site``, o ``crawl``, es decir,
+``crawler.AsyncCrawler``) y mide:
+
+- Páginas comprobadas por segundo.
+
+- Peticiones HTTP por página.
+
+- Consultas a la base de datos por página.
+
+- Memoria máxima usada por el proceso (*Peak RSS*).
+
+Ejemplo de uso desde la línea de órdenes::
+
+    ./manage.py spidercheck bench --pages 500 --fan-out 20 --latency 0.01
+"""
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional
+import asyncio
+import functools
+import random
+import threading
+import time
+import uuid
+
+from django.db import connection
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+
+#: Extensiones de los recursos del *site* sintético, con su tipo MIME
+ASSET_TYPES = {
+    'png': 'image/png',
+    'css': 'text/css',
+    'js': 'application/javascript',
+    }
+
+#: Distribuciones de latencia soportadas
+LATENCY_DISTRIBUTIONS = ('fixed', 'uniform', 'exponential')
+
+FILLER = (
+    'Lorem ipsum dolor sit amet, consectetur adipiscing elit, sed do'
+    ' eiusmod tempor incididunt ut labore et dolore magna aliqua. '
+    )
+
+
+class SyntheticSite:
+    """Grafo de un *site* sintético.
+
+    Todas las páginas son accesibles desde la primera (``/p/0/``),
+    porque cada página enlaza siempre a la siguiente, además de a otros
+    ``fan_out`` enlaces elegidos al azar. El grafo es reproducible: con
+    la misma semilla se obtiene siempre el mismo *site*.
+
+    Params:
+
+        - num_pages (int): Número de páginas HTML.
+
+        - fan_out (int): Número de enlaces de cada página.
+
+        - asset_ratio (float): Proporción de enlaces a recursos que no
+          son HTML (imágenes, hojas de estilo, *scripts*).
+
+        - error_rate (float): Proporción de páginas que responden con
+          un error (``404`` o ``500``).
+
+        - redirect_rate (float): Proporción de enlaces que pasan por
+          una redirección antes de llegar a la página.
+
+        - page_size (int): Tamaño aproximado, en *bytes*, de cada
+          página.
+
+        - seed (int): Semilla del generador de números aleatorios.
+
+    Examples:
+
+        >>> site = SyntheticSite(num_pages=10, fan_out=3, seed=1)
+        >>> site.resolve('/p/0/')[0]
+        200
+        >>> site.resolve('/no-existe/')[0]
+        404
+        >>> SyntheticSite(num_pages=10, seed=1).links == SyntheticSite(num_pages=10, seed=1).links
+        True
+    """
+
+    def __init__(
+            self,
+            num_pages: int = 200,
+            fan_out: int = 10,
+            asset_ratio: float = 0.2,
+            error_rate: float = 0.02,
+            redirect_rate: float = 0.05,
+            page_size: int = 8 * 1024,
+            seed: int = 1,
+            ):
+        rng = random.Random(seed)
+        self.num_pages = num_pages
+        self.page_size = page_size
+        self.errors = {
+            num: rng.choice((404, 500))
+            for num in range(1, num_pages)
+            if rng.random() < error_rate
+            }
+        num_assets = max(1, num_pages // 10)
+        extensions = list(ASSET_TYPES)
+        self.assets = [
+            f'/static/{num}.{extensions[num % len(extensions)]}'
+            for num in range(num_assets)
+            ]
+        self.redirects = {}
+        self.links = {}
+        for num in range(num_pages):
+            links = []
+            if num + 1 < num_pages:
+                links.append(f'/p/{num + 1}/')
+            for _ in range(fan_out):
+                dice = rng.random()
+                if dice < asset_ratio:
+                    links.append(rng.choice(self.assets))
+                    continue
+                target = f'/p/{rng.randrange(num_pages)}/'
+                if dice < asset_ratio + redirect_rate:
+                    path = f'/r/{len(self.redirects)}'
+                    self.redirects[path] = target
+                    target = path
+                links.append(target)
+            self.links[f'/p/{num}/'] = links
+
+    @property
+    def num_urls(self) -> int:
+        """Número total de URL distintas del *site*.
+        """
+        return self.num_pages + len(self.assets) + len(self.redirects)
+
+    def render(self, path: str) -> bytes:
+        links = ''.join(
+            f'<li><a href="{link}">{link}</a></li>'
+            if link.startswith(('/p/', '/r/'))
+            else f'<li><img src="{link}"></li>'
+            for link in self.links[path]
+            )
+        head = (
+            f'<!DOCTYPE html>\n<html><head><title>Página {path}</title>'
+            f'</head><body><ul>{links}</ul>'
+            )
+        filler = FILLER * max(0, (self.page_size - len(head)) // len(FILLER))
+        return f'{head}<p>{filler}</p></body></html>'.encode('utf-8')
+
+    def resolve(self, path: str) -> tuple[int, dict, bytes]:
+        """Respuesta del *site* para una ruta.
+
+        Returns:
+
+            Una tupla con el código de estado, las cabeceras y el
+            contenido.
+        """
+        if path == '/robots.txt':
+            return 200, {'Content-Type': 'text/plain'}, b'User-agent: *\nDisallow: /privado/\n'
+        if path in self.redirects:
+            return 301, {'Location': self.redirects[path]}, b''
+        if path in self.links:
+            num = int(path.split('/')[2])
+            if num in self.errors:
+                return self.errors[num], {'Content-Type': 'text/html'}, b'Error'
+            return 200, {'Content-Type': 'text/html; charset=utf-8'}, self.render(path)
+        if path in self.assets:
+            extension = path.rsplit('.', 1)[1]
+            return 200, {'Content-Type': ASSET_TYPES[extension]}, b'\x00' * 512
+        return 404, {'Content-Type': 'text/html'}, b'No encontrado'
+
+
+class SyntheticHandler(BaseHTTPRequestHandler):
+
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+
+    def log_message(self, *args):
+        pass
+
+    def _reply(self, with_body):
+        self.server.count_request()
+        delay = self.server.get_latency()
+        if delay > 0:
+            time.sleep(delay)
+        status, headers, body = self.server.site.resolve(self.path)
+        self.send_response(status)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        if with_body:
+            self.wfile.write(body)
+
+    def do_HEAD(self):
+        self._reply(with_body=False)
+
+    def do_GET(self):
+        self._reply(with_body=True)
+
+
+class SyntheticServer(ThreadingHTTPServer):
+    """Servidor HTTP local para un *site* sintético.
+
+    Se puede usar como gestor de contexto, que arranca el servidor en
+    un hilo aparte y lo detiene al salir.
+
+    Params:
+
+        - site (SyntheticSite): El *site* a servir.
+
+        - latency (float): Latencia media, en segundos, de cada
+          respuesta.
+
+        - latency_dist (str): Distribución de la latencia: ``fixed``
+          (siempre la misma), ``uniform`` (entre cero y el doble de
+          la media) o ``exponential``.
+
+        - seed (int): Semilla para la latencia.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, site, latency=0.0, latency_dist='exponential', seed=1):
+        if latency_dist not in LATENCY_DISTRIBUTIONS:
+            raise ValueError(f'Distribución de latencia desconocida: {latency_dist}')
+        super().__init__(('127.0.0.1', 0), SyntheticHandler)
+        self.site = site
+        self.latency = latency
+        self.latency_dist = latency_dist
+        self.num_requests = 0
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def url(self, path='/') -> str:
+        host, port = self.server_address
+        return f'http://{host}:{port}{path}'
+
+    def count_request(self):
+        with self._lock:
+            self.num_requests += 1
+
+    def get_latency(self) -> float:
+        if self.latency <= 0:
+            return 0.0
+        with self._lock:
+            if self.latency_dist == 'uniform':
+                return self._rng.uniform(0, 2 * self.latency)
+            if self.latency_dist == 'exponential':
+                return self._rng.expovariate(1.0 / self.latency)
+        return self.latency
+
+    def __enter__(self):
+        self._thread = threading.Thread(
+            target=self.serve_forever,
+            args=(0.05,),
+            daemon=True,
+            )
+        self._thread.start()
+        return self
+
+    def __exit__(self, *args):
+        self.shutdown()
+        self.server_close()
+
+
+class QueryCounter:
+    """Contador de consultas a la base de datos, seguro entre hilos.
+
+    Se instala con ``connection.execute_wrapper``. El método ``wrap``
+    permite instalarlo en la conexión del hilo en el que se ejecute una
+    función.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def __call__(self, execute, sql, params, many, context):
+        with self._lock:
+            self.count += 1
+        return execute(sql, params, many, context)
+
+    def wrap(self, func):
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with connection.execute_wrapper(self):
+                return func(*args, **kwargs)
+
+        return wrapper
+
+
+def get_peak_rss() -> float:
+    """Memoria máxima usada por el proceso, en MiB.
+
+    Returns:
+
+        La memoria residente máxima (*Peak RSS*), o ``0.0`` si no se
+        puede obtener en este sistema operativo.
+    """
+    if resource is None:
+        return 0.0
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0
+
+
+class BenchmarkResult:
+    """Resultado de un banco de pruebas.
+    """
+
+    def __init__(self, engine, num_pages, num_errors, num_requests, num_queries, elapsed):
+        self.engine = engine
+        self.num_pages = num_pages
+        self.num_errors = num_errors
+        self.num_requests = num_requests
+        self.num_queries = num_queries
+        self.elapsed = elapsed
+        self.peak_rss = get_peak_rss()
+
+    def __str__(self):
+        return (
+            f'{self.engine}: {self.num_pages} páginas en {self.elapsed:.2f}s,'
+            f' {self.pages_per_second:.1f} páginas/s,'
+            f' {self.requests_per_page:.2f} peticiones/página,'
+            f' {self.queries_per_page:.1f} consultas/página,'
+            f' {self.peak_rss:.1f} MiB'
+            )
+
+    def _per_page(self, value) -> float:
+        return value / self.num_pages if self.num_pages else 0.0
+
+    @property
+    def pages_per_second(self) -> float:
+        return self.num_pages / self.elapsed if self.elapsed else 0.0
+
+    @property
+    def requests_per_page(self) -> float:
+        return self._per_page(self.num_requests)
+
+    @property
+    def queries_per_page(self) -> float:
+        return self._per_page(self.num_queries)
+
+    def as_dict(self) -> dict:
+        return {
+            'engine': self.engine,
+            'pages': self.num_pages,
+            'errors': self.num_errors,
+            'elapsed': round(self.elapsed, 3),
+            'pages_per_second': round(self.pages_per_second, 2),
+            'requests_per_page': round(self.requests_per_page, 2),
+            'queries_per_page': round(self.queries_per_page, 2),
+            'peak_rss_mib': round(self.peak_rss, 1),
+            }
+
+
+async def _collect(results):
+    return [result async for result in results]
+
+
+def run_benchmark(
+        synthetic: SyntheticSite,
+        engine: str = 'check',
+        num: Optional[int] = None,
+        latency: float = 0.0,
+        latency_dist: str = 'exponential',
+        concurrency: int = 8,
+        per_host: int = 2,
+        keep: bool = False,
+        ) -> BenchmarkResult:
+    """Rastrea un *site* sintético y mide el rendimiento.
+
+    Se crea un *site* temporal, que se borra al terminar salvo que se
+    indique lo contrario con ``keep``.
+
+    Params:
+
+        - synthetic (SyntheticSite): El *site* sintético.
+
+        - engine (str): El motor de rastreo: ``check`` o ``crawl``.
+
+        - num (int): Número de páginas a comprobar. Por defecto, el
+          número de URL del *site* sintético.
+
+        - latency (float): Latencia media del servidor, en segundos.
+
+        - latency_dist (str): Distribución de la latencia. Ver
+          ``SyntheticServer``.
+
+        - concurrency (int): Comprobaciones simultáneas, para el motor
+          ``crawl``.
+
+        - per_host (int): Peticiones simultáneas al servidor, para el
+          motor ``crawl``.
+
+        - keep (bool): No borrar el *site* temporal al terminar.
+
+    Returns:
+
+        Una instancia de ``BenchmarkResult``.
+    """
+    from .core import check_page
+    from .core import check_site
+    from .core import init_site
+    from .crawler import AsyncCrawler
+
+    num = num or synthetic.num_urls
+    counter = QueryCounter()
+    with SyntheticServer(synthetic, latency, latency_dist) as server:
+        site = init_site(server.url('/p/0/'), name=f'bench-{uuid.uuid4().hex[:8]}')
+        # El ritmo de peticiones no se limita, ni al principio ni después
+        site.max_rate = 1e6
+        site.save()
+        site.get_rate_controller(rate=site.max_rate)
+        start_time = time.perf_counter()
+        if engine == 'check':
+            with connection.execute_wrapper(counter):
+                results = list(check_site(site, num, gap=0))
+        elif engine == 'crawl':
+            site.next_page_to_check = counter.wrap(site.next_page_to_check)
+            crawler = AsyncCrawler(
+                site,
+                concurrency=concurrency,
+                per_host=per_host,
+                check=counter.wrap(check_page),
+                )
+            results = asyncio.run(_collect(crawler.crawl(num)))
+        else:
+            raise ValueError(f'Motor de rastreo desconocido: {engine}')
+        elapsed = time.perf_counter() - start_time
+        num_requests = server.num_requests
+    if not keep:
+        site.delete()
+    return BenchmarkResult(
+        engine,
+        num_pages=len(results),
+        num_errors=sum(1 for result in results if not result),
+        num_requests=num_requests,
+        num_queries=counter.count,
+        elapsed=elapsed,
+        )
@@ -0,0 +1,205 @@
+#!/usr/bin/env python3
+
+"""
+Módulo ``canonical``
+------------------------------------------------------------------------
+
+Normalización (*canonicalización*) de las URL de las páginas.
+
+Muchas URL distintas llevan a la misma página: ``?a=1&b=2`` y
+``?b=2&a=1``, ``/index.html`` y ``/``, ``%7e`` y ``~``, o las que
+solo se diferencian en parámetros de seguimiento como ``utm_source`` o
+identificadores de sesión. Si no se normalizan, cada variante se
+almacena como una página distinta, y se descarga y procesa por
+separado.
+
+La normalización se hace en varios pasos, configurables por *site*:
+
+- Se elimina el fragmento (``#...``).
+
+- Se normaliza la codificación: los caracteres no reservados
+  codificados (``%7E``) se decodifican, el resto de códigos se pasan a
+  mayúsculas (``%2f`` pasa a ser ``%2F``) y se codifican los caracteres
+  no válidos, como espacios o letras acentuadas.
+
+- Opcionalmente, la ruta se pasa a minúsculas.
+
+- Se eliminan los documentos por defecto (``index.html``, etc.) al
+  final de la ruta.
+
+- Se descartan los parámetros cuyo nombre esté en la lista de
+  parámetros a descartar, tanto en la consulta como en los parámetros
+  de ruta (``;jsessionid=...``). Se admiten comodines (``utm_*``).
+
+- Opcionalmente, se ordenan los parámetros por su nombre.
+"""
+
+from typing import Iterable
+from urllib.parse import quote
+from urllib.parse import unquote
+from urllib.parse import urlsplit
+from urllib.parse import urlunsplit
+import fnmatch
+import functools
+import re
+import string
+
+
+#: Parámetros que se descartan por defecto
+DEFAULT_DROP_PARAMS = (
+    'utm_*', 'fbclid', 'gclid', 'mc_cid', 'mc_eid',
+    'jsessionid', 'phpsessid', 'sid',
+    )
+
+#: Documentos por defecto de un directorio
+DEFAULT_DOCUMENTS = (
+    'index.html', 'index.htm', 'index.php',
+    'default.htm', 'default.html', 'default.aspx',
+    )
+
+#: Caracteres que nunca hace falta codificar
+UNRESERVED = frozenset(string.ascii_letters + string.digits + '-._~')
+
+#: Caracteres válidos, además de los no reservados, en la ruta
+PATH_SAFE = "/:@!$&'()*+,;=%"
+
+#: Caracteres válidos, además de los no reservados, en los parámetros
+QUERY_SAFE = "/?:@!$'()*+,;=%"
+
+_pat_escape = re.compile('%([0-9A-Fa-f]{2})')
+
+
+def _fix_escape(match):
+    char = chr(int(match.group(1), 16))
+    if char in UNRESERVED:
+        return char
+    return '%' + match.group(1).upper()
+
+
+def normalize_encoding(text: str, safe: str = PATH_SAFE) -> str:
+    """Normaliza la codificación de una parte de una URL.
+
+    Examples:
+
+        >>> normalize_encoding('/%7euser/a%2fb/año nuevo')
+        '/~user/a%2Fb/a%C3%B1o%20nuevo'
+        >>> normalize_encoding('/100%/')
+        '/100%/'
+    """
+    return quote(_pat_escape.sub(_fix_escape, text), safe=safe)
+
+
+def _compile_patterns(patterns: Iterable[str]):
+    patterns = [fnmatch.translate(pattern.lower()) for pattern in patterns if pattern]
+    if not patterns:
+        return None
+    return re.compile('|'.join(patterns))
+
+
+class Canonicalizer:
+    """Normaliza las URL según la configuración de un *site*.
+
+    Params:
+
+        - drop_params (Iterable[str]): Nombres de los parámetros a
+          descartar. Se admiten comodines, como ``utm_*``, y no se
+          distingue entre mayúsculas y minúsculas.
+
+        - sort_params (bool): Ordenar los parámetros por su nombre. Si
+          un parámetro se repite, se mantiene el orden de sus valores.
+
+        - lowercase (bool): Pasar la ruta a minúsculas.
+
+        - default_documents (Iterable[str]): Nombres de los documentos
+          por defecto, que se eliminan del final de la ruta.
+
+    Examples:
+
+        >>> canonicalize = Canonicalizer()
+        >>> canonicalize('/noticias/index.html?b=2&utm_source=x&a=1#arriba')
+        '/noticias/?a=1&b=2'
+        >>> canonicalize('/sesion;jsessionid=A1B2?PHPSESSID=3')
+        '/sesion'
+        >>> canonicalize('http://example.com/Docs/?q=caf%c3%a9')
+        'http://example.com/Docs/?q=caf%C3%A9'
+        >>> Canonicalizer(lowercase=True, sort_params=False)('/Docs/?b=1&a=2')
+        '/docs/?b=1&a=2'
+    """
+
+    def __init__(
+            self,
+            drop_params: Iterable[str] = DEFAULT_DROP_PARAMS,
+            sort_params: bool = True,
+            lowercase: bool = False,
+            default_documents: Iterable[str] = DEFAULT_DOCUMENTS,
+            ):
+        self.pat_drop = _compile_patterns(drop_params)
+        self.sort_params = sort_params
+        self.lowercase = lowercase
+        self.default_documents = frozenset(
+            document.lower() for document in default_documents if document
+            )
+
+    def is_dropped(self, name: str) -> bool:
+        """Verdadero si el parámetro indicado se debe descartar.
+        """
+        if self.pat_drop is None:
+            return False
+        return self.pat_drop.match(unquote(name).lower()) is not None
+
+    def canonicalize_path(self, path: str) -> str:
+        if ';' in path:
+            segments = []
+            for segment in path.split('/'):
+                name, *params = segment.split(';')
+                params = [
+                    param for param in params
+                    if not self.is_dropped(param.partition('=')[0])
+                    ]
+                segments.append(';'.join([name, *params]))
+            path = '/'.join(segments)
+        path = normalize_encoding(path, PATH_SAFE)
+        if self.lowercase:
+            path = path.lower()
+        _, _, last = path.rpartition('/')
+        if last.lower() in self.default_documents:
+            path = path[:-len(last)]
+        return path
+
+    def canonicalize_query(self, query: str) -> str:
+        params = []
+        for param in query.split('&'):
+            if not param:
+                continue
+            param = normalize_encoding(param, QUERY_SAFE)
+            name = param.partition('=')[0]
+            if not self.is_dropped(name):
+                params.append((name, param))
+        if self.sort_params:
+            params.sort(key=lambda item: item[0])
+        return '&'.join(param for _, param in params)
+
+    def __call__(self, url: str) -> str:
+        parts = urlsplit(url)
+        return urlunsplit((
+            parts.scheme,
+            parts.netloc,
+            self.canonicalize_path(parts.path),
+            self.canonicalize_query(parts.query),
+            '',
+            ))
+
+
+@functools.lru_cache(maxsize=64)
+def get_canonicalizer(
+        drop_params: tuple = DEFAULT_DROP_PARAMS,
+        sort_params: bool = True,
+        lowercase: bool = False,
+        default_documents: tuple = DEFAULT_DOCUMENTS,
+        ) -> Canonicalizer:
+    """Devuelve un ``Canonicalizer`` con la configuración indicada.
+
+    Los patrones se compilan una sola vez para cada configuración, que
+    normalmente es la de un *site*.
+    """
+    return Canonicalizer(drop_params, sort_params, lowercase, default_documents)
@@ -1,89 +1,106 @@
 #!/usr/bin/env python3
 
 from typing import Union
+import functools
 import time
 from urllib.parse import urlparse
-from urllib.request import Request, urlopen
+from urllib.parse import urlsplit
 import logging
 import sys
 
 from .fechas import just_now
+from .fechas import ONE_DAY
+from .fetcher import fetch_page
+from .fingerprint import content_hash
+from .fingerprint import simhash
+from .archive import ArchiveError
+from .document import IncrementalParser
+from .document import parse_document
+from .models import ArchivedResponse
+from .models import ExternalLink
+from .models import ExternalUrl
+from .models import FrontierEntry
 from .models import Page
 from .models import Link
 from .models import Site
 from .models import Value
 from .plugins import registry
+from .pool import get_pool
 from .results import Success, Failure
-from .webparser import is_valid_html
+from .seqtools import first
+from .timings import Timings
+from .webparser import check_html
 
 
+#: Tiempo mínimo entre dos comprobaciones de un mismo enlace externo
+EXTERNAL_TTL = ONE_DAY
+
+#: Longitud máxima de las URL externas que se registran
+MAX_EXTERNAL_URL_LENGTH = 1024
+
 _logger = logging.getLogger(__name__)
 _logger.setLevel(logging.WARNING)
 _logger.handlers.append(logging.StreamHandler(sys.stderr))
 logging.getLogger("urllib3").setLevel(logging.WARNING)
 
 
-def get_text_from_url(url):
-    try:
-        request = Request(method="GET", url=url)
-        with urlopen(request) as req:
-            text = req.read().decode('utf-8')
-            if 'content-length' not in req.headers:
-                req.headers['content-length'] = len(text)
-            return req.headers, text
-    except IOError as err:
-        return False, 503, f"Conexion error: {err}", {}
-
-
-def get_content_type(headers):
-    value = headers.get('content-type', '')
-    if value and ';' in value:
-        value, _ = value.split(';', 1)
-    return value.lower()
-
-
-def get_content_length(headers):
-    value = headers.get('content-length', '0')
-    return int(value)
-
-
-def content_is_html(headers):
-    content_type = get_content_type(headers)
-    return content_type == 'text/html'
-
-
-def _run_plugins(page, headers, body):
+def _run_plugins(page, headers, body, timings=None, document=None, sink=None):
+    timings = timings if timings is not None else Timings()
     values = {}
     failures = []
-    for name, plugin_process in registry.get_all_plugins():
-        try:
-            result = plugin_process(page, headers, body)
-            if result:
-                values.update(result)
-        except Exception as err:
-            failures.append(f'{name}: {err}')
-    antes = set([v.name for v in page.values.all()])
-    despues = set(values)
-    a_borrar = antes - despues
-    if a_borrar:
-        page.values.filter(name__in=a_borrar).delete()
-    for name in values:
-        Value.upsert(page, name, values[name])
+    with timings.phase('plugins'):
+        for name, plugin_process in registry.get_all_plugins():
+            try:
+                if registry.accepts_document(name):
+                    result = plugin_process(page, headers, body, document=document)
+                else:
+                    result = plugin_process(page, headers, body)
+                if result:
+                    values.update(result)
+            except Exception as err:
+                failures.append(f'{name}: {err}')
+    with timings.phase('db'):
+        if sink is None:
+            Value.bulk_upsert(page, values)
+        else:
+            sink.set_values(page, values)
     if failures:
         return Failure('Error al ejecutar los plug-ins:\n' + '\n - '.join(failures))
     return Success(values)
 
 
-def _update_links(page, body):
+def _update_links(page, body, timings=None, offline=False, document=None, sink=None):
     """
     Actualiza los enlaces de una página.
 
+    Se trabaja por conjuntos, con un número de consultas que no depende
+    del número de enlaces: las páginas enlazadas se buscan, y se crean
+    las que falten, a la vez (Ver ``Site.load_or_create_many``), los
+    enlaces nuevos se insertan a la vez, y los que sobran se borran
+    con una sola consulta. Lo mismo con los enlaces externos, si el
+    *site* los comprueba. Si el conjunto de páginas y URL enlazadas es
+    el mismo que la vez anterior (Campo ``links_hash`` de la página),
+    no se hace nada más.
+
     Params:
 
         - page (Page) : La página cuyos enlaces estamos actualizando.
 
         - body (str) : El texto de la página.
 
+        - timings (Timings) : Opcional. Acumulador de los tiempos de
+          las fases ``parse`` y ``links``.
+
+        - offline (bool) : Opcional. No acceder a la red para obtener
+          el ``robots.txt``; se usa la última copia almacenada.
+
+        - document (HtmlDocument) : Opcional. El contenido de la página
+          ya analizado. Si no se indica, se analiza el texto.
+
+        - sink (ResultSink) : Opcional. Si se indica, los cambios en los
+          enlaces no se escriben en el momento, sino que se añaden al
+          lote pendiente (Ver el módulo ``sink``).
+
     Returns:
 
         Una tupla con dos listas, la primera, los enlaces borrados, la segunda,
@@ -91,25 +108,236 @@ def _update_links(page, body):
         listas vacias.
 
     """
-    before_links = {p.to_page.pk for p in page.outgoing_links.all()}
-    after_links = set({})
-    for new_url in page.get_all_valid_links(body):
-        target_page, created = page.site.add_page(new_url)
-        if target_page.is_linkable:
-            Link.objects.get_or_create(from_page=page, to_page=target_page)
-            after_links.add(target_page.pk)
-    to_remove_links = before_links - after_links
-    to_add_links = after_links - before_links
-    if to_remove_links:
-        qset = (
-            Link.objects
-            .filter(from_page=page)
-            .filter(to_page__in=to_remove_links)
+    timings = timings if timings is not None else Timings()
+    with timings.phase('parse'):
+        new_urls, external_urls = page.classify_links(
+            body,
+            offline=offline,
+            document=document,
             )
-        qset.delete()
+    with timings.phase('links'):
+        paths = {_as_path(url) for url in new_urls}
+        targets = page.site.load_or_create_many(paths)
+        after_links = {target.pk for target in targets.values() if target.is_linkable}
+        if not page.site.check_external_links:
+            external_urls = []
+        # La huella es la de los enlaces que se guardan, de forma que
+        # cambia también si una página enlazada deja de poder
+        # enlazarse, o si se borra y se vuelve a crear.
+        links = [str(pk) for pk in sorted(after_links)]
+        links += sorted(set(external_urls))
+        links_hash = content_hash('\n'.join(links))
+        if links_hash == page.links_hash:
+            return set(), set()
+        if page.site.check_external_links:
+            _update_external_links(page, external_urls)
+        before_links = set(page.outgoing_links.values_list('to_page', flat=True))
+        to_remove_links = before_links - after_links
+        to_add_links = after_links - before_links
+        page.links_hash = links_hash
+        if sink is not None:
+            sink.update_links(page, to_add_links, to_remove_links)
+            sink.save_page(page, ['links_hash'])
+            return to_remove_links, to_add_links
+        if to_add_links:
+            Link.objects.bulk_create(
+                [Link(from_page=page, to_page_id=pk) for pk in to_add_links],
+                ignore_conflicts=True,
+                )
+        if to_remove_links:
+            qset = (
+                Link.objects
+                .filter(from_page=page)
+                .filter(to_page__in=to_remove_links)
+                )
+            qset.delete()
+        Page.objects.filter(pk=page.pk).update(links_hash=links_hash)
     return to_remove_links, to_add_links
 
 
+def _save(page, sink, update_fields=None):
+    if sink is None:
+        page.save(update_fields=update_fields)
+    else:
+        sink.save_page(page, update_fields)
+
+
+def _clear_links(page, sink=None):
+    # Sin la huella, la próxima vez que la página tenga enlaces se
+    # vuelven a crear, aunque sean los mismos que antes de borrarlos.
+    if sink is None:
+        page.outgoing_links.all().delete()
+    else:
+        sink.clear_links(page)
+    page.links_hash = ''
+    _save(page, sink, ['links_hash'])
+
+
+def _as_path(url):
+    info = urlparse(url)
+    return info.path, info.query
+
+
+def _update_external_links(page, urls):
+    """
+    Actualiza los enlaces de una página a URL externas.
+
+    Cada URL externa se registra una única vez en el modelo
+    ``ExternalUrl``, compartido por todos los *sites*. Como con los
+    enlaces internos, se trabaja por conjuntos (Ver
+    ``ExternalUrl.load_or_create_many``).
+
+    Params:
+
+        - page (Page) : La página cuyos enlaces estamos actualizando.
+
+        - urls (list) : Las URL externas enlazadas desde la página.
+    """
+    urls = [url for url in urls if len(url) <= MAX_EXTERNAL_URL_LENGTH]
+    before_urls = set(page.external_links.values_list('to_url', flat=True))
+    after_urls = {
+        external_url.pk
+        for external_url in ExternalUrl.load_or_create_many(urls).values()
+        }
+    to_add_urls = after_urls - before_urls
+    if to_add_urls:
+        ExternalLink.objects.bulk_create(
+            [ExternalLink(from_page=page, to_url_id=pk) for pk in to_add_urls],
+            ignore_conflicts=True,
+            )
+    to_remove_urls = before_urls - after_urls
+    if to_remove_urls:
+        page.external_links.filter(to_url__in=to_remove_urls).delete()
+
+
+def _add_pages(page, links):
+    """
+    Añade a la frontera las páginas enlazadas desde una página.
+
+    Se usa para ir añadiendo los enlaces mientras se descarga la página
+    (Ver ``document.IncrementalParser``); los enlaces propiamente
+    dichos (Modelo ``Link``) se actualizan al terminar, con
+    ``_update_links``.
+
+    Params:
+
+        - page (Page) : La página que se está descargando.
+
+        - links (list) : Los enlaces, tal y como aparecen en la página.
+    """
+    local_urls, _ = page.classify_urls(links)
+    page.site.load_or_create_many(_as_path(url) for url in local_urls)
+
+
+def _archive_response(page, response):
+    try:
+        ArchivedResponse.store(page, response, page.checked_at)
+    except (OSError, ArchiveError) as err:
+        _logger.warning("Imposible archivar %s: %s", page, err)
+
+
+def _process_body(
+        page,
+        headers,
+        body,
+        is_truncated,
+        timings,
+        offline=False,
+        action='Comprobando',
+        html_check=None,
+        document=None,
+        previous_hash='',
+        sink=None,
+        ):
+    """
+    Procesa el contenido de una página HTML: enlaces y *plugins*.
+
+    El contenido se analiza una sola vez (Ver el módulo ``document``),
+    y el resultado se comparte entre los enlaces y los *plugins*. Si la
+    huella del contenido coincide con ``previous_hash``, no ha cambiado
+    desde la última vez que se procesó por completo, y no se analiza.
+
+    Params:
+
+        - page (Page) : La página.
+
+        - headers : Las cabeceras de la respuesta.
+
+        - body (str) : El texto de la página.
+
+        - is_truncated (bool) : El contenido está incompleto.
+
+        - timings (Timings) : Acumulador de los tiempos de cada fase.
+
+        - offline (bool) : No acceder a la red (Ver ``replay_page``).
+
+        - action (str) : Descripción de la acción, para el mensaje.
+
+        - html_check : Opcional. El resultado de comprobar si el
+          contenido parece HTML, si ya se hizo durante la descarga
+          (Ver ``fetcher.read_body``).
+
+        - document (HtmlDocument) : Opcional. El contenido ya
+          analizado durante la descarga. Si no se indica, se analiza
+          el texto.
+
+        - previous_hash (str) : Opcional. La huella del contenido
+          procesado en la comprobación anterior (Ver el módulo
+          ``fingerprint``).
+
+        - sink (ResultSink) : Opcional. Si se indica, los resultados se
+          escriben por lotes (Ver el módulo ``sink``).
+
+    Returns:
+
+        Una instancia de ``Success`` o de ``Failure``.
+    """
+    url = page.get_full_url()
+    with timings.phase('parse'):
+        if html_check is None:
+            html_check = Success(True) if is_truncated else check_html(body)
+    if not html_check:
+        page.status = 418 # I'm a TeaPot
+        msg = (
+            f'La URL {url} debería ser HTML, pero no lo parece:'
+            f' {html_check.error_message}'
+            )
+        page.error_message = msg
+        page.timings = timings.as_dict()
+        _save(page, sink)
+        return Failure(msg)
+    with timings.phase('parse'):
+        digest = content_hash(body)
+    if digest == previous_hash:
+        # Ni los enlaces, ni los plugins, ni sus valores pueden haber
+        # cambiado
+        page.content_hash = digest
+        page.timings = timings.as_dict()
+        _save(page, sink, ['content_hash', 'timings'])
+        return Success(f'{action} {url} Sin cambios (Misma huella)')
+    if document is None:
+        with timings.phase('parse'):
+            document = parse_document(body)
+    if page.site.detect_near_duplicates:
+        with timings.phase('parse'):
+            page.simhash = simhash(document.text)
+    deleted_links, added_links = _update_links(page, body, timings, offline, document, sink)
+    plugins_phase = _run_plugins(page, headers, body, timings, document, sink)
+    if plugins_phase:
+        # Solo se guarda la huella si se ha procesado todo
+        # correctamente; si no, una respuesta 304 impediría
+        # volver a procesar la página.
+        page.content_hash = digest
+    page.timings = timings.as_dict()
+    _save(page, sink, ['content_hash', 'simhash', 'timings'])
+    return Success(
+        f'{action} {url}'
+        f' Enlaces nuevos: {len(added_links)}'
+        f' Enlaces Borrados: {len(deleted_links)}'
+        f' Plugins: {"✓" if plugins_phase else "𐄂"}'
+        )
+
+
 # --[ Public API ]-----------------------------------------------------
 
 
@@ -126,47 +354,146 @@ def find_urls_by_pattern(site, pattern, use_regex=False):
     yield from site.search(pattern, use_regex)
 
 
-def check_page(page) -> Union[Success, Failure]:
+def check_page(page, sink=None) -> Union[Success, Failure]:
+    """Comprueba una página.
+
+    Además del tiempo total de la comprobación (``check_time``), se
+    almacena en ``timings`` el tiempo empleado en cada fase, en
+    milisegundos (Ver módulo ``timings``). El tiempo de la última
+    escritura en la base de datos, la que guarda los propios tiempos,
+    no se incluye.
+
+    Si se indica ``sink``, una instancia de ``sink.ResultSink``, los
+    cambios en la página, sus enlaces y sus valores no se escriben en
+    el momento, sino en el siguiente lote. Las páginas nuevas sí se
+    añaden a la frontera en el momento.
+
+    Al terminar, incluso si falla, la página vuelve a la frontera, con
+    una prioridad que depende del resultado, y se libera su
+    arrendamiento (Ver ``FrontierEntry.complete``). Si se indica
+    ``sink``, esto se escribe junto con el resto de resultados.
+    """
+    try:
+        return _check_page(page, sink)
+    finally:
+        if sink is None:
+            FrontierEntry.complete(page)
+        else:
+            sink.complete(page)
+
+
+def _check_page(page, sink=None) -> Union[Success, Failure]:
     page.checked_at = just_now()
     page.is_checked = True
+    site = page.site
     url = page.get_full_url()
+    timings = Timings()
+
+    def is_not_alias(response):
+        # El contenido de las páginas que redirigen a otra ya lo
+        # procesamos al comprobar la página final.
+        return not response.redirects or response.url == url
+
+    parser = None
+    if site.stream_links:
+        # Los enlaces se van añadiendo a la frontera mientras se
+        # descarga la página, y el análisis no se repite al terminar.
+        parser = IncrementalParser(functools.partial(_add_pages, page))
+    options = dict(
+        single_request=site.single_request,
+        is_local=site.is_local,
+        client=site.get_http_client(),
+        validators=page.get_conditional_headers(),
+        max_bytes=site.max_body_size,
+        controller=site.get_rate_controller(),
+        timings=timings,
+        want_body=is_not_alias,
+        on_text=parser.feed if parser else None,
+        )
     start_time = time.time()
-    result = page.is_valid()
+    result = None
+    if page.is_alias() and page.redirects:
+        # Si la página ya era un alias, basta con la primera respuesta:
+        # si redirige al mismo sitio que la vez anterior, no hace falta
+        # seguir la cadena hasta la página final.
+        result = fetch_page(url, follow_redirects=False, **options)
+        if result.is_success() and result.value.redirects:
+            location = result.value.redirects[0]['location']
+            if location == page.redirects[0]['location']:
+                page.check_time = time.time() - start_time
+                page.timings = timings.as_dict()
+                _save(page, sink, ['checked_at', 'is_checked', 'check_time', 'timings'])
+                return Success(
+                    f'Comprobando {url} Sin cambios.'
+                    f' Redirige a {page.alias_of.get_full_url()}'
+                    )
+            result = None
+    if result is None:
+        result = fetch_page(url, **options)
     if result.is_failure():
         page.status = int(result.code)
         page.error_message = result.error_message
         page.check_time = time.time() - start_time
-        page.save()
+        page.timings = timings.as_dict()
+        _save(page, sink)
         return Failure(f'Error al comprobar {url}: {result}')
 
     response = result.value
-    page.status = response.status_code
-    page.content_type = get_content_type(response.headers)
-    page.size_bytes = get_content_length(response.headers)
+    if response.is_not_modified():
+        page.check_time = time.time() - start_time
+        page.timings = timings.as_dict()
+        _save(page, sink, ['checked_at', 'is_checked', 'check_time', 'timings'])
+        return Success(f'Comprobando {url} Sin cambios')
+
+    page.status = response.status
+    page.content_type = response.content_type
+    page.size_bytes = response.size_bytes
+    page.wire_bytes = response.wire_bytes
+    page.is_truncated = response.is_truncated
+    page.etag = response.etag
+    page.last_modified = response.last_modified
     page.check_time = time.time() - start_time
-    page.save()
-    is_html = content_is_html(response.headers)
-    if is_html:
-        is_local = page.site.is_local(response.url)
-        if is_local:
-            headers, body = get_text_from_url(url)
-            if is_valid_html(body):
-                deleted_links, added_links = _update_links(page, body)
-                plugins_phase = _run_plugins(page, headers, body)
-                return Success(
-                    f'Comprobando {url}'
-                    f' Enlaces nuevos: {len(added_links)}'
-                    f' Enlaces Borrados: {len(deleted_links)}'
-                    f' Plugins: {"✓" if plugins_phase else "𐄂"}'
-                    )
-            else:
-                page.status = 418 # I'm a TeaPot
-                msg = f'La URL {url} debería ser HTML, pero no lo parece'
-                page.error_message = msg
-                page.save()
-                return Failure(msg)
+    previous_hash, page.content_hash = page.content_hash, ''
+    with timings.phase('db'):
+        page.update_alias(response.url, response.redirects)
+    page.timings = timings.as_dict()
+    with timings.phase('db'):
+        _save(page, sink)
+    if page.is_alias():
+        _clear_links(page, sink)
+        return Success(
+            f'Comprobando {url}'
+            f' Redirige a {page.alias_of.get_full_url()}'
+            )
+    if response.rejected:
+        page.status = 418 # I'm a TeaPot
+        msg = f'La URL {url}: {response.rejected}'
+        page.error_message = msg
+        page.timings = timings.as_dict()
+        _save(page, sink)
+        return Failure(msg)
+    if response.is_html():
+        if response.body is not None:
+            if site.archive_dir:
+                with timings.phase('archive'):
+                    _archive_response(page, response)
+            document = None
+            if parser is not None and response.is_streamed:
+                with timings.phase('parse'):
+                    document = parser.close()
+            return _process_body(
+                page,
+                response.headers,
+                response.body,
+                response.is_truncated,
+                timings,
+                html_check=response.html_check,
+                document=document,
+                previous_hash=previous_hash,
+                sink=sink,
+                )
         else:
-            page.outgoing_links.all().delete()
+            _clear_links(page, sink)
     return Success(f'Comprobando {url}')
 
 
@@ -224,7 +551,7 @@ def reset_site(name):
     return site
 
 
-def check_site(site, num=1):
+def check_site(site, num=1, gap=2.0):
     """Generador de paginas analizadas.
 
     Devuelve una secuencia de tuplas de tres valores:
@@ -240,12 +567,165 @@ def check_site(site, num=1):
     El parámetro `num` indica el número máximo de enlaces a
     comprobar. Por defecto vale uno.
 
-    Nota: Para no sobrecargar al servidor, es responsabilidad del llamador
-    el establecer una pausa entre las distintas solicitudes. Se sugiere esperar
-    al menos 2 segundos entre cada petición.
+    El parámetro `gap` indica la pausa inicial, en segundos, entre
+    peticiones. Para no sobrecargar al servidor, el ritmo de peticiones
+    lo regula el controlador adaptativo del *site* (Ver módulo
+    ``politeness``), que empieza con esa pausa y la ajusta según la
+    respuesta del servidor. El llamador ya no tiene que establecer
+    ninguna pausa entre las distintas solicitudes. Si ``gap`` es cero
+    o negativo, se empieza directamente al ritmo máximo del *site*.
+    La pausa se aplica en cada llamada, aunque el regulador ya exista.
     """
+    rate = 1.0 / gap if gap > 0 else site.max_rate
+    site.get_rate_controller(rate=rate).configure(rate=rate, max_rate=site.max_rate)
     page = site.next_page_to_check()
     while page and num > 0:
         yield check_page(page)
         num -= 1
         page = site.next_page_to_check()
+
+
+def check_external_urls(num=100, ttl=EXTERNAL_TTL):
+    """Generador de enlaces externos comprobados.
+
+    Se comprueban, empezando por los que hace más tiempo que no se
+    comprueban, los enlaces externos cuya última comprobación tenga
+    más antigüedad que ``ttl``, y que sigan enlazados desde alguna
+    página. El resultado se comparte entre todos los *sites* y páginas
+    que los enlazan, de forma que cada URL externa se comprueba como
+    mucho una vez en ese plazo.
+
+    Params:
+
+        - num (int): Número máximo de enlaces a comprobar.
+
+        - ttl (timedelta): Antigüedad mínima de la última comprobación.
+
+    Returns:
+
+        Una secuencia de resultados, instancias de ``Success`` o
+        ``Failure``.
+    """
+    client = get_pool('external')
+    queryset = (
+        ExternalUrl.objects
+        .filter(checked_at__lt=just_now() - ttl)
+        .filter(links__isnull=False)
+        .distinct()
+        .order_by('checked_at', 'pk')
+        )
+    for external_url in queryset[:num]:
+        result = external_url.check(client=client)
+        if result.is_success():
+            yield Success(f'Comprobando {external_url} {result.value.status}')
+        else:
+            yield Failure(f'Error al comprobar {external_url}: {result}')
+
+
+def replay_page(page) -> Union[Success, Failure]:
+    """Vuelve a procesar el contenido archivado de una página.
+
+    Se usa la última respuesta archivada de la página (Ver módulo
+    ``archive``), que pasa por el mismo proceso que en una comprobación
+    normal (enlaces y *plugins*), pero sin realizar ninguna petición
+    a la red.
+
+    Params:
+
+        - page (Page): La página a procesar.
+
+    Returns:
+
+        Una instancia de ``Success`` o de ``Failure``.
+    """
+    archived = page.archived.order_by('-fetched_at').first()
+    if archived is None:
+        return Failure(f'La página {page.get_full_url()} no tiene contenido archivado')
+    try:
+        header, headers, body = archived.load()
+    except (OSError, ArchiveError) as err:
+        return Failure(f'Imposible leer el archivo de {page.get_full_url()}: {err}')
+    return _process_body(
+        page,
+        headers,
+        body,
+        header.get('is_truncated', False),
+        Timings(),
+        offline=True,
+        action='Reprocesando',
+        )
+
+
+def replay_site(site, num=None):
+    """Generador de páginas reprocesadas a partir del archivo.
+
+    Params:
+
+        - site (Site): El *site* a reprocesar.
+
+        - num (int): Opcional. Número máximo de páginas a reprocesar.
+          Si no se indica, se reprocesan todas las páginas archivadas.
+
+    Returns:
+
+        Una secuencia de resultados, instancias de ``Success`` o
+        ``Failure``.
+    """
+    pages = (
+        site.pages
+        .filter(archived__isnull=False)
+        .distinct()
+        .order_by('pk')
+        )
+    if num:
+        pages = pages[:num]
+    for page in pages:
+        yield replay_page(page)
+
+
+def dedup_site(site, dry_run=False):
+    """Generador de páginas duplicadas fusionadas.
+
+    Se agrupan las páginas del *site* por su URL normalizada (Ver
+    ``Site.canonicalize``). En cada grupo con más de una página se
+    conserva la que ya tiene la URL normalizada o, si no hay ninguna,
+    la más antigua, que pasa a tenerla. El resto se fusionan con ella
+    (Ver ``Page.merge``), de forma que sus enlaces no se pierden.
+
+    Params:
+
+        - site (Site): El *site* a depurar.
+
+        - dry_run (bool): Opcional. Si es verdadero, solo se informa de
+          los duplicados, sin modificar nada.
+
+    Returns:
+
+        Una secuencia de instancias de ``Success``, una por cada grupo
+        de páginas duplicadas.
+    """
+    groups = {}
+    for page in site.pages.order_by('pk'):
+        parts = urlsplit(site.canonicalize(page.get_relative_url()))
+        groups.setdefault((parts.path, parts.query), []).append(page)
+    for (subpath, params), pages in groups.items():
+        if len(pages) < 2:
+            continue
+        survivor = first(
+            pages,
+            lambda page: (page.subpath, page.params or '') == (subpath, params),
+            default=pages[0],
+            )
+        duplicates = [page for page in pages if page is not survivor]
+        if not dry_run:
+            for duplicate in duplicates:
+                survivor.merge(duplicate)
+            if (survivor.subpath, survivor.params or '') != (subpath, params):
+                survivor.subpath = subpath
+                survivor.params = params
+                survivor.save(update_fields=['subpath', 'params'])
+        yield Success(
+            f'{survivor.get_relative_url()}:'
+            f' {len(duplicates)} duplicados'
+            f' ({", ".join(page.get_relative_url() for page in duplicates)})'
+            )
@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+
+"""
+Módulo ``crawler``
+------------------------------------------------------------------------
+
+Motor de rastreo concurrente basado en ``asyncio``.
+
+A diferencia de ``core.check_site``, que comprueba las páginas de una
+en una, el motor mantiene hasta ``concurrency`` comprobaciones en
+curso al mismo tiempo. Para no sobrecargar a los servidores, se
+limita el número de peticiones simultáneas a un mismo servidor
+(``per_host``). El ritmo de peticiones por segundo lo marca, igual que
+en el modo secuencial, el regulador del servidor (Ver el módulo
+``politeness``), ante el que espera cada petición.
+
+Cada comprobación se realiza con ``core.check_page`` en un hilo
+aparte, de forma que los resultados se siguen almacenando a través de
+los modelos ``Page``, ``Link`` y ``Value``, igual que en el modo
+secuencial. Si se indica un ``sink.ResultSink``, los resultados de
+muchas comprobaciones se escriben juntos, por lotes.
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+from typing import AsyncIterator, Union
+import asyncio
+import functools
+
+from django.db import close_old_connections
+
+from .results import Success, Failure
+
+
+def _check_page(page, sink=None):
+    from .core import check_page
+    close_old_connections()
+    return check_page(page, sink=sink)
+
+
+class HostLimiter:
+    """Limita la concurrencia de peticiones a un servidor.
+
+    El ritmo de peticiones no se limita aquí, sino en el regulador del
+    servidor (``politeness.RateController``).
+
+    Params:
+
+        - max_concurrency (int): Número máximo de peticiones
+          simultáneas al servidor.
+    """
+
+    def __init__(self, max_concurrency: int = 2):
+        self.semaphore = asyncio.Semaphore(max_concurrency)
+
+    async def __aenter__(self):
+        await self.semaphore.acquire()
+        return self
+
+    async def __aexit__(self, *args):
+        self.semaphore.release()
+
+
+class AsyncCrawler:
+    """Rastreador concurrente para un *site*.
+
+    Params:
+
+        - site (Site): El *site* a rastrear.
+
+        - concurrency (int): Número máximo de comprobaciones en curso.
+
+        - per_host (int): Número máximo de peticiones simultáneas a un
+          mismo servidor (*netloc*).
+
+        - check (callable): La función que comprueba una página. Por
+          defecto, ``core.check_page``, cerrando antes las conexiones a
+          la base de datos caducadas del hilo.
+
+        - limiters (dict): Opcional. Limitadores por servidor, para
+          compartirlos entre varios rastreadores que trabajen sobre
+          *sites* alojados en el mismo servidor.
+
+        - sink (ResultSink): Opcional. Escribir los resultados por
+          lotes (Ver el módulo ``sink``). Solo se usa con la función
+          de comprobación por defecto. Las páginas con resultados
+          pendientes de escribir no se vuelven a comprobar, y al
+          terminar se escriben todos los pendientes.
+    """
+
+    def __init__(
+            self,
+            site,
+            concurrency: int = 8,
+            per_host: int = 2,
+            check=None,
+            limiters=None,
+            sink=None,
+            ):
+        if check is None:
+            check = functools.partial(_check_page, sink=sink)
+        self.site = site
+        self.concurrency = max(1, concurrency)
+        self.per_host = max(1, per_host)
+        self.check = check
+        self.limiters = {} if limiters is None else limiters
+        self.sink = sink
+        self.executor = None
+
+    def get_limiter(self, netloc: str) -> HostLimiter:
+        if netloc not in self.limiters:
+            self.limiters[netloc] = HostLimiter(self.per_host)
+        return self.limiters[netloc]
+
+    async def _in_thread(self, func, *args, **kwargs):
+        loop = asyncio.get_running_loop()
+
+        return await loop.run_in_executor(
+            self.executor,
+            functools.partial(func, *args, **kwargs),
+            )
+
+    async def _check(self, page) -> Union[Success, Failure]:
+        async with self.get_limiter(self.site.netloc):
+            try:
+                return await self._in_thread(self.check, page)
+            except Exception as err:
+                return Failure(f'Error al comprobar {page}: {err}')
+
+    async def crawl(self, num: int = 1) -> AsyncIterator[Union[Success, Failure]]:
+        """Generador asíncrono de páginas analizadas.
+
+        Params:
+
+            - num (int): Número máximo de páginas a comprobar.
+
+        Returns:
+
+            Un iterador asíncrono con el resultado de cada comprobación,
+            en el orden en que van terminando.
+        """
+        in_flight = {}
+        launched = 0
+        self.executor = ThreadPoolExecutor(max_workers=self.concurrency + 1)
+        try:
+            while True:
+                while launched < num and len(in_flight) < self.concurrency:
+                    exclude = set(in_flight.values())
+                    if self.sink is not None:
+                        exclude |= self.sink.pending()
+                    page = await self._in_thread(
+                        self.site.next_page_to_check,
+                        exclude=exclude,
+                        )
+                    if page is None:
+                        break
+                    task = asyncio.create_task(self._check(page))
+                    in_flight[task] = page.pk
+                    launched += 1
+                if not in_flight:
+                    break
+                done, _ = await asyncio.wait(
+                    in_flight,
+                    return_when=asyncio.FIRST_COMPLETED,
+                    )
+                for task in done:
+                    del in_flight[task]
+                    yield task.result()
+        finally:
+            for task in in_flight:
+                task.cancel()
+            self.executor.shutdown(wait=True)
+            self.executor = None
+            if self.sink is not None:
+                # Fuera del bucle de eventos, como el resto de consultas
+                with ThreadPoolExecutor(max_workers=1) as executor:
+                    executor.submit(self.sink.flush).result()
+
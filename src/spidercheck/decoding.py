@@ -0,0 +1,369 @@
+#!/usr/bin/env python3
+
+"""
+Módulo ``decoding``
+------------------------------------------------------------------------
+
+Descompresión y decodificación del contenido de las respuestas HTTP.
+
+Se soportan las codificaciones de transferencia ``gzip`` y ``deflate``
+y, si está instalado el paquete ``brotli``, también ``br``. La
+descompresión se realiza por fragmentos, a medida que se van leyendo
+del servidor.
+
+El juego de caracteres se determina, por este orden, a partir de:
+
+- La marca BOM al principio del contenido.
+
+- El parámetro ``charset`` de la cabecera ``Content-Type``.
+
+- Las etiquetas ``<meta charset="...">`` o ``<meta http-equiv="Content-Type"
+  content="...; charset=...">`` al principio del documento.
+
+Si no se puede determinar, se intenta con ``utf-8`` y, si falla, se
+usa ``windows-1252``, que es un superconjunto de ``latin-1``.
+"""
+
+from typing import Optional
+import codecs
+import re
+import zlib
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+#: Número de bytes del principio del documento en los que se buscan
+#: las etiquetas ``meta`` que declaran el juego de caracteres.
+META_SNIFF_SIZE = 4096
+
+#: Juego de caracteres a usar si no se declara ninguno y el contenido
+#: no es ``utf-8`` válido.
+FALLBACK_ENCODING = 'windows-1252'
+
+PAT_META_CHARSET = re.compile(
+    rb'<meta[^>]+charset\s*=\s*["\']?\s*([-\w.:]+)',
+    re.IGNORECASE,
+    )
+
+BOMS = (
+    (codecs.BOM_UTF8, 'utf-8'),
+    (codecs.BOM_UTF16_LE, 'utf-16'),
+    (codecs.BOM_UTF16_BE, 'utf-16'),
+    )
+
+
+def get_accept_encoding() -> str:
+    """Valor de la cabecera ``Accept-Encoding`` a enviar.
+
+    Returns:
+
+        Las codificaciones soportadas, separadas por comas.
+    """
+    if brotli is not None:
+        return 'gzip, deflate, br'
+    return 'gzip, deflate'
+
+
+class IdentityDecompressor:
+
+    def decompress(self, data: bytes, max_length: int = 0) -> bytes:
+        return data
+
+    def flush(self) -> bytes:
+        return b''
+
+
+class ZlibDecompressor:
+    """Descompresor basado en ``zlib``, con límite de salida.
+
+    Si se indica ``max_length``, cada llamada a ``decompress`` devuelve
+    como mucho esos bytes, y los datos comprimidos que no se han
+    procesado se guardan para la siguiente llamada. Así, una bomba de
+    compresión nunca ocupa en memoria más de lo que se pide.
+    """
+
+    wbits = zlib.MAX_WBITS
+
+    def __init__(self):
+        self.decompressor = zlib.decompressobj(self.wbits)
+
+    def decompress(self, data: bytes, max_length: int = 0) -> bytes:
+        data = self.decompressor.unconsumed_tail + data
+        return self.decompressor.decompress(data, max_length)
+
+    def flush(self) -> bytes:
+        if self.decompressor.unconsumed_tail:
+            # Quedan datos por descomprimir: no se pidieron
+            return b''
+        return self.decompressor.flush()
+
+
+class DeflateDecompressor(ZlibDecompressor):
+    """Descompresor para ``deflate``.
+
+    Según la norma, ``deflate`` debería usar el formato ``zlib``, pero
+    algunos servidores envían el flujo ``deflate`` sin cabecera. Se
+    detecta con el primer fragmento.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.is_detected = False
+
+    def decompress(self, data: bytes, max_length: int = 0) -> bytes:
+        if not self.is_detected:
+            self.is_detected = True
+            try:
+                return super().decompress(data, max_length)
+            except zlib.error:
+                self.decompressor = zlib.decompressobj(-zlib.MAX_WBITS)
+        return super().decompress(data, max_length)
+
+
+class GzipDecompressor(ZlibDecompressor):
+
+    wbits = 16 + zlib.MAX_WBITS
+
+
+class BrotliDecompressor:
+
+    def __init__(self):
+        self.decompressor = brotli.Decompressor()
+        self.pending = b''
+
+    def _can_accept_more_data(self) -> bool:
+        can_accept = getattr(self.decompressor, 'can_accept_more_data', None)
+        return can_accept is None or can_accept()
+
+    def decompress(self, data: bytes, max_length: int = 0) -> bytes:
+        self.pending += data
+        data = b''
+        if self.pending and self._can_accept_more_data():
+            data, self.pending = self.pending, b''
+        if not max_length:
+            return self.decompressor.process(data)
+        try:
+            return self.decompressor.process(data, output_buffer_limit=max_length)
+        except TypeError:
+            # Versiones de brotli sin límite de salida
+            return self.decompressor.process(data)
+
+    def flush(self) -> bytes:
+        return b''
+
+
+def get_decompressor(content_encoding: str = ''):
+    """Devuelve un descompresor para la codificación indicada.
+
+    Params:
+
+        - content_encoding (str): El valor de la cabecera
+          ``Content-Encoding``.
+
+    Returns:
+
+        Un objeto con los métodos ``decompress(data, max_length=0)`` y
+        ``flush()``.
+        Puede elevar ``ValueError`` si la codificación no está
+        soportada.
+
+    Examples:
+
+        >>> import gzip
+        >>> d = get_decompressor('gzip')
+        >>> d.decompress(gzip.compress(b'hola')) + d.flush()
+        b'hola'
+    """
+    encoding = content_encoding.strip().lower()
+    if encoding in ('', 'identity'):
+        return IdentityDecompressor()
+    if encoding in ('gzip', 'x-gzip'):
+        return GzipDecompressor()
+    if encoding == 'deflate':
+        return DeflateDecompressor()
+    if encoding == 'br' and brotli is not None:
+        return BrotliDecompressor()
+    raise ValueError(f'Codificación de contenido no soportada: {content_encoding}')
+
+
+def normalize_charset(name: Optional[str]) -> Optional[str]:
+    """Normaliza el nombre de un juego de caracteres.
+
+    Returns:
+
+        El nombre normalizado, o ``None`` si el juego de caracteres no
+        es conocido.
+
+    Examples:
+
+        >>> normalize_charset('UTF8')
+        'utf-8'
+        >>> normalize_charset('ISO-8859-1')
+        'iso8859-1'
+        >>> normalize_charset('no-existe') is None
+        True
+    """
+    if not name:
+        return None
+    try:
+        return codecs.lookup(name.strip().strip('"\'')).name
+    except LookupError:
+        return None
+
+
+def get_header_charset(headers) -> Optional[str]:
+    """Juego de caracteres declarado en la cabecera ``Content-Type``.
+    """
+    value = headers.get('content-type', '')
+    for param in value.split(';')[1:]:
+        key, _, charset = param.partition('=')
+        if key.strip().lower() == 'charset':
+            return normalize_charset(charset)
+    return None
+
+
+def get_meta_charset(head: bytes) -> Optional[str]:
+    """Juego de caracteres declarado en las etiquetas ``meta``.
+
+    Params:
+
+        - head (bytes): El principio del documento.
+
+    Examples:
+
+        >>> get_meta_charset(b'<head><meta charset="iso-8859-15">')
+        'iso8859-15'
+        >>> get_meta_charset(b'<meta http-equiv="Content-Type"'
+        ...     b' content="text/html; charset=windows-1252">')
+        'cp1252'
+    """
+    match = PAT_META_CHARSET.search(head[:META_SNIFF_SIZE])
+    if match:
+        return normalize_charset(match.group(1).decode('ascii', 'ignore'))
+    return None
+
+
+def get_bom_charset(head: bytes) -> Optional[str]:
+    for bom, charset in BOMS:
+        if head.startswith(bom):
+            return charset
+    return None
+
+
+def detect_charset(headers, head: bytes) -> Optional[str]:
+    """Determina el juego de caracteres del documento.
+
+    Params:
+
+        - headers: Las cabeceras de la respuesta.
+
+        - head (bytes): El principio del documento.
+
+    Returns:
+
+        El nombre del juego de caracteres, o ``None`` si no se ha
+        podido determinar.
+    """
+    return (
+        get_bom_charset(head)
+        or get_header_charset(headers)
+        or get_meta_charset(head)
+        )
+
+
+def decode_body(data: bytes, charset: Optional[str] = None) -> tuple[str, str]:
+    """Decodifica el contenido de una página.
+
+    Params:
+
+        - data (bytes): El contenido, ya descomprimido.
+
+        - charset (str): El juego de caracteres, si se conoce.
+
+    Returns:
+
+        Una tupla con el texto y el juego de caracteres usado.
+
+    Examples:
+
+        >>> decode_body('canción'.encode('latin-1'))
+        ('canción', 'windows-1252')
+        >>> decode_body('canción'.encode('utf-8'))
+        ('canción', 'utf-8')
+        >>> decode_body('canción'.encode('utf-8')[:6])
+        ('canci\ufffd', 'utf-8')
+    """
+    if charset:
+        if charset == 'utf-8' and data.startswith(codecs.BOM_UTF8):
+            charset = 'utf-8-sig'
+        return data.decode(charset, errors='replace'), charset
+    try:
+        return data.decode('utf-8'), 'utf-8'
+    except UnicodeDecodeError as err:
+        if err.reason == 'unexpected end of data':
+            # Contenido truncado a mitad de un carácter
+            return data.decode('utf-8', errors='replace'), 'utf-8'
+        return data.decode(FALLBACK_ENCODING, errors='replace'), FALLBACK_ENCODING
+
+
+class TextStream:
+    """Decodifica el contenido de una página según se va recibiendo.
+
+    El juego de caracteres se determina igual que en ``decode_body``,
+    en cuanto se tienen los primeros ``META_SNIFF_SIZE`` bytes. Si no se
+    puede determinar, se supone ``utf-8``; como ``decode_body`` puede
+    acabar usando ``FALLBACK_ENCODING``, el llamador debe comparar el
+    atributo ``encoding`` con el del texto completo.
+
+    Params:
+
+        - headers: Las cabeceras de la respuesta.
+
+    Examples:
+
+        >>> stream = TextStream({})
+        >>> data = bytearray('<p>canción</p>'.encode('utf-8'))
+        >>> stream.decode(data[:10])
+        ''
+        >>> stream.decode(data, final=True)
+        '<p>canción</p>'
+        >>> stream.encoding
+        'utf-8'
+    """
+
+    def __init__(self, headers):
+        self.headers = headers
+        self.encoding = None
+        self._decoder = None
+        self._offset = 0
+
+    def decode(self, data: bytearray, final: bool = False) -> str:
+        """Decodifica la parte del contenido que aún no se ha decodificado.
+
+        Params:
+
+            - data (bytearray): Todo el contenido recibido hasta ahora,
+              ya descomprimido.
+
+            - final (bool): Verdadero si no se va a recibir más
+              contenido.
+
+        Returns:
+
+            El texto nuevo, que puede estar vacío.
+        """
+        if self._decoder is None:
+            if len(data) < META_SNIFF_SIZE and not final:
+                return ''
+            head = bytes(data[:META_SNIFF_SIZE])
+            charset = detect_charset(self.headers, head) or 'utf-8'
+            if charset == 'utf-8' and head.startswith(codecs.BOM_UTF8):
+                charset = 'utf-8-sig'
+            self.encoding = charset
+            self._decoder = codecs.getincrementaldecoder(charset)(errors='replace')
+        text = self._decoder.decode(bytes(data[self._offset:]), final)
+        self._offset = len(data)
+        return text
@@ -0,0 +1,622 @@
+#!/usr/bin/env python3
+
+"""
+Módulo ``document``
+------------------------------------------------------------------------
+
+Análisis único del contenido HTML de una página.
+
+El contenido de cada página se analiza **una sola vez**, y el resultado
+(Una instancia de ``HtmlDocument``) se comparte entre la extracción de
+enlaces y todos los *plugins*. El documento contiene:
+
+- Los enlaces, separados igual que en ``parser.LinkExtractor``: hojas
+  de estilo, *scripts*, imágenes y enlaces ``<a>``.
+
+- El título de la página.
+
+- Las etiquetas ``<meta>`` con atributo ``name``.
+
+- Los encabezados (``h1`` a ``h6``) y el texto de la página, sin
+  etiquetas, ni *scripts* ni estilos. Si la página tiene una etiqueta
+  ``<main>``, solo se tiene en cuenta su contenido.
+
+El análisis se puede hacer con distintos **motores** (*backends*):
+
+- ``html.parser``: El analizador de la librería estándar, escrito en
+  Python. Siempre está disponible.
+
+- ``lxml``: Si está instalado el paquete ``lxml`` (``libxml2``).
+
+- ``selectolax``: Si está instalado el paquete ``selectolax``
+  (``lexbor``).
+
+Los motores en C solo recorren en Python las etiquetas con enlaces, el
+título y las etiquetas ``<meta>``; los encabezados y el texto, que solo
+usan algunos *plugins*, se calculan la primera vez que se piden.
+
+Todos siguen la especificación de HTML, como los navegadores, así que
+obtienen los mismos resultados (Ver ``parser.LinkExtractor``).
+
+El motor se elige la primera vez que se analiza una página: el indicado
+en la variable ``SPIDERCHECK_HTML_PARSER`` de la configuración de
+Django o, si no está definida, ``html.parser``. Si el motor indicado no
+está instalado, también se usa ``html.parser``.
+"""
+
+from typing import Callable
+from typing import Optional
+import html
+import itertools
+import logging
+import threading
+
+from spidercheck.parser import LinkExtractor
+
+try:
+    from lxml import etree
+    import lxml.html as lxml_html
+except ImportError:
+    lxml_html = None
+
+try:
+    from selectolax.lexbor import LexborHTMLParser
+except ImportError:
+    LexborHTMLParser = None
+
+
+_logger = logging.getLogger(__name__)
+
+#: Motores de análisis, por orden de preferencia
+PREFERRED_BACKENDS = ('html.parser', 'selectolax', 'lxml')
+
+#: Motor que se usa si no se puede usar el indicado
+FALLBACK_BACKEND = 'html.parser'
+
+
+HEADINGS = ('h1', 'h2', 'h3', 'h4', 'h5', 'h6')
+
+#: Etiquetas cuyo contenido no forma parte del texto de la página
+SKIP_TAGS = frozenset(['script', 'style', 'template', 'noscript'])
+
+#: Etiquetas de texto en las que se sustituyen las entidades HTML
+ESCAPABLE_RAW_TEXT_TAGS = frozenset(['title', 'textarea'])
+
+#: Etiquetas de bloque, que separan palabras en el texto de la página
+BLOCK_TAGS = frozenset([
+    'address', 'article', 'aside', 'blockquote', 'br', 'dd', 'div',
+    'dl', 'dt', 'fieldset', 'figcaption', 'figure', 'footer', 'form',
+    'h1', 'h2', 'h3', 'h4', 'h5', 'h6', 'header', 'hr', 'li', 'main',
+    'nav', 'ol', 'p', 'pre', 'section', 'table', 'td', 'th', 'tr', 'ul',
+    ])
+
+
+def _normalize(text: str) -> str:
+    return ' '.join(text.split())
+
+
+class HtmlDocument:
+    """Resultado del análisis de una página HTML.
+
+    Params:
+
+        - links (set): Enlaces de las etiquetas ``<a>``.
+
+        - styles (set): Enlaces de las etiquetas ``<link>``.
+
+        - scripts (set): Enlaces de las etiquetas ``<script>``.
+
+        - images (set): Enlaces de las etiquetas ``<img>``.
+
+        - title (str): El título de la página, o ``None`` si no
+          tiene etiqueta ``<title>``.
+
+        - meta (dict): El contenido de las etiquetas ``<meta>``,
+          indexado por el atributo ``name``, en minúsculas.
+
+        - headings (dict): Los textos de los encabezados, indexados
+          por el nombre de la etiqueta (``h1`` a ``h6``).
+
+        - text (str): El texto de la página.
+
+        - loader (Callable): Opcional. Función sin parámetros que
+          devuelve los encabezados y el texto, si no se indican. Se
+          llama la primera vez que se accede a alguno de ellos.
+    """
+
+    def __init__(
+            self,
+            links=None,
+            styles=None,
+            scripts=None,
+            images=None,
+            title: Optional[str] = None,
+            meta: Optional[dict] = None,
+            headings: Optional[dict] = None,
+            text: Optional[str] = None,
+            loader: Optional[Callable] = None,
+            ):
+        self.links = links or set()
+        self.styles = styles or set()
+        self.scripts = scripts or set()
+        self.images = images or set()
+        self.title = title
+        self.meta = meta or {}
+        self._headings = None
+        self._text = None
+        self._loader = loader
+        if loader is None:
+            self._set_text(headings, text)
+
+    def __repr__(self):
+        return f'HtmlDocument(title={self.title!r})'
+
+    def _set_text(self, headings, text):
+        self._headings = {name: [] for name in HEADINGS}
+        if headings:
+            self._headings.update(headings)
+        self._text = text or ''
+
+    def _load(self):
+        loader, self._loader = self._loader, None
+        self._set_text(*loader())
+
+    @property
+    def headings(self) -> dict:
+        if self._loader is not None:
+            self._load()
+        return self._headings
+
+    @property
+    def text(self) -> str:
+        if self._loader is not None:
+            self._load()
+        return self._text
+
+    def all_links(self):
+        """Todos los enlaces del documento, en el mismo orden que
+        ``LinkExtractor.all_links``.
+        """
+        return itertools.chain(
+            self.styles,
+            self.scripts,
+            self.images,
+            self.links,
+        )
+
+
+class DocumentBuilder(LinkExtractor):
+    """Analizador que construye un ``HtmlDocument`` en una sola pasada.
+
+    Extiende ``LinkExtractor``, así que los enlaces que se obtienen
+    son exactamente los mismos.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.title = None
+        self.meta = {}
+        self._title = None
+        self._skip = 0
+        self._head = False
+        self._main = 0
+        self._has_main = False
+        self._heading = None
+        self._heading_text = []
+        self._body_headings = []
+        self._main_headings = []
+        self._body_text = []
+        self._main_text = []
+
+    def _add_meta(self, attrs):
+        parameters = dict(attrs)
+        name = parameters.get('name')
+        if name:
+            self.meta[name.lower()] = parameters.get('content') or ''
+
+    def _break(self):
+        self._body_text.append(' ')
+        if self._main:
+            self._main_text.append(' ')
+
+    def handle_starttag(self, tag, attrs):
+        super().handle_starttag(tag, attrs)
+        if tag in BLOCK_TAGS:
+            self._break()
+        if tag in SKIP_TAGS:
+            self._skip += 1
+        elif tag == 'head':
+            self._head = True
+        elif tag == 'body':
+            self._head = False
+        elif tag == 'title':
+            self._title = []
+        elif tag == 'main':
+            self._main += 1
+            self._has_main = True
+        elif tag in HEADINGS:
+            self._heading = tag
+            self._heading_text = []
+        elif tag == 'meta':
+            self._add_meta(attrs)
+
+    def handle_startendtag(self, tag, attrs):
+        # Las etiquetas autocerradas (``<meta/>``, ``<br/>``) no tienen
+        # contenido, así que no cambian el estado del analizador.
+        LinkExtractor.handle_starttag(self, tag, attrs)
+        LinkExtractor.handle_endtag(self, tag)
+        if tag in BLOCK_TAGS:
+            self._break()
+        if tag == 'meta':
+            self._add_meta(attrs)
+
+    def handle_endtag(self, tag):
+        super().handle_endtag(tag)
+        if tag in BLOCK_TAGS:
+            self._break()
+        if tag in SKIP_TAGS:
+            self._skip = max(0, self._skip - 1)
+        elif tag == 'head':
+            self._head = False
+        elif tag == 'title' and self._title is not None:
+            self.title = _normalize(''.join(self._title))
+            self._title = None
+        elif tag == 'main':
+            self._main = max(0, self._main - 1)
+        elif tag == self._heading:
+            text = _normalize(''.join(self._heading_text))
+            self._body_headings.append((tag, text))
+            if self._main:
+                self._main_headings.append((tag, text))
+            self._heading = None
+
+    def handle_data(self, data):
+        if self._skip:
+            return
+        if self.cdata_elem in ESCAPABLE_RAW_TEXT_TAGS:
+            # El analizador no sustituye las entidades en el contenido
+            # de las etiquetas de texto, pero en estas sí son válidas.
+            data = html.unescape(data)
+        if self._title is not None:
+            self._title.append(data)
+            return
+        if self._head:
+            return
+        if self._heading:
+            self._heading_text.append(data)
+        self._body_text.append(data)
+        if self._main:
+            self._main_text.append(data)
+
+    def get_document(self) -> HtmlDocument:
+        if self._has_main:
+            headings, text = self._main_headings, self._main_text
+        else:
+            headings, text = self._body_headings, self._body_text
+        by_name = {name: [] for name in HEADINGS}
+        for name, heading in headings:
+            by_name[name].append(heading)
+        return HtmlDocument(
+            links=self.links,
+            styles=self.styles,
+            scripts=self.scripts,
+            images=self.images,
+            title=self.title,
+            meta=self.meta,
+            headings=by_name,
+            text=_normalize(''.join(text)),
+            )
+
+
+#: Número de enlaces nuevos que se acumulan antes de notificarlos
+LINK_BATCH_SIZE = 50
+
+
+class _RecordingSet(set):
+    """Conjunto que registra, en orden, los elementos que se añaden.
+    """
+
+    def __init__(self, added: list):
+        super().__init__()
+        self.added = added
+
+    def add(self, item):
+        if item not in self:
+            super().add(item)
+            self.added.append(item)
+
+
+class IncrementalParser:
+    """Analiza una página HTML según se va descargando.
+
+    El texto se pasa por fragmentos al método ``feed``, según se
+    recibe (Ver ``fetcher.read_body``). Cada vez que se acumulan
+    ``batch_size`` enlaces nuevos, se notifican a la función
+    ``on_links``, de forma que se pueden añadir a la frontera antes de
+    que termine la descarga. Al terminar, el método ``close`` devuelve
+    el documento completo, igual que ``parse_document`` con el motor
+    ``html.parser``.
+
+    Params:
+
+        - on_links (callable): Opcional. Recibe una lista con los
+          enlaces nuevos.
+
+        - batch_size (int): Número de enlaces nuevos que se acumulan
+          antes de notificarlos.
+
+    Examples:
+
+        >>> batches = []
+        >>> parser = IncrementalParser(batches.append, batch_size=2)
+        >>> parser.feed('<html><body><a href="/a/">A</a><a hr')
+        >>> batches
+        []
+        >>> parser.feed('ef="/b/">B</a><a href="/a/">A</a>')
+        >>> batches
+        [['/a/', '/b/']]
+        >>> parser.feed('<img src="/c.png"></body></html>')
+        >>> sorted(parser.close().all_links())
+        ['/a/', '/b/', '/c.png']
+        >>> batches
+        [['/a/', '/b/'], ['/c.png']]
+    """
+
+    def __init__(self, on_links: Optional[Callable] = None, batch_size: int = LINK_BATCH_SIZE):
+        self.on_links = on_links
+        self.batch_size = max(1, batch_size)
+        self._added = []
+        self.builder = DocumentBuilder()
+        self.builder.links = _RecordingSet(self._added)
+        self.builder.styles = _RecordingSet(self._added)
+        self.builder.scripts = _RecordingSet(self._added)
+        self.builder.images = _RecordingSet(self._added)
+
+    def _notify(self):
+        if self._added:
+            batch = self._added[:]
+            del self._added[:]
+            if self.on_links is not None:
+                self.on_links(batch)
+
+    def feed(self, text: str):
+        self.builder.feed(text)
+        if len(self._added) >= self.batch_size:
+            self._notify()
+
+    def close(self) -> HtmlDocument:
+        self.builder.close()
+        self._notify()
+        return self.builder.get_document()
+
+
+# --[ Motores de análisis ]--------------------------------------------
+
+
+def _parse_html_parser(html_text: str) -> HtmlDocument:
+    builder = DocumentBuilder()
+    builder.feed(html_text)
+    builder.close()
+    return builder.get_document()
+
+
+def _get_text(walk, root):
+    builder = DocumentBuilder()
+    walk(root, builder)
+    document = builder.get_document()
+    return document.headings, document.text
+
+
+def _walk_lxml(root, builder):
+    for event, element in etree.iterwalk(root, events=('start', 'end')):
+        tag = element.tag
+        if not isinstance(tag, str):
+            # Comentarios e instrucciones de proceso
+            if event == 'end' and element.tail:
+                builder.handle_data(element.tail)
+            continue
+        if event == 'start':
+            builder.handle_starttag(tag, element.items())
+            if element.text:
+                builder.handle_data(element.text)
+        else:
+            builder.handle_endtag(tag)
+            if element.tail:
+                builder.handle_data(element.tail)
+
+
+_lxml_local = threading.local()
+
+
+def _parse_lxml(html_text: str) -> HtmlDocument:
+    # Los analizadores de lxml no se pueden compartir entre hilos
+    parser = getattr(_lxml_local, 'parser', None)
+    if parser is None:
+        parser = _lxml_local.parser = lxml_html.HTMLParser(encoding='utf-8')
+    try:
+        root = lxml_html.document_fromstring(
+            html_text.encode('utf-8', 'replace'),
+            parser=parser,
+            )
+    except etree.ParserError:
+        # Documento vacío
+        return HtmlDocument()
+    extractor = LinkExtractor()
+    title = None
+    meta = {}
+    # libxml2 no trata de forma especial el contenido de las plantillas,
+    # que no forma parte del documento.
+    inert = set()
+    for template in root.iter('template'):
+        inert.update(template.iterdescendants())
+    for element in root.iter('a', 'link', 'img', 'script', 'title', 'meta'):
+        if element in inert:
+            continue
+        tag = element.tag
+        if tag == 'title':
+            title = _normalize(element.text_content())
+        elif tag == 'meta':
+            name = element.get('name')
+            if name:
+                meta[name.lower()] = element.get('content') or ''
+        else:
+            extractor.handle_starttag(tag, element.items())
+    return HtmlDocument(
+        links=extractor.links,
+        styles=extractor.styles,
+        scripts=extractor.scripts,
+        images=extractor.images,
+        title=title,
+        meta=meta,
+        loader=lambda: _get_text(_walk_lxml, root),
+        )
+
+
+def _walk_selectolax(root, builder):
+    stack = [(root, False)]
+    while stack:
+        node, is_end = stack.pop()
+        tag = node.tag
+        if is_end:
+            builder.handle_endtag(tag)
+        elif tag == '-text':
+            builder.handle_data(node.text_content)
+        elif not tag.startswith(('-', '_', '!')):
+            builder.handle_starttag(tag, list(node.attributes.items()))
+            stack.append((node, True))
+            children = list(node.iter(include_text=True))
+            stack.extend((child, False) for child in reversed(children))
+
+
+def _parse_selectolax(html_text: str) -> HtmlDocument:
+    tree = LexborHTMLParser(html_text)
+    extractor = LinkExtractor()
+    title = None
+    meta = {}
+    for node in tree.css('a, link, img, script, title, meta'):
+        tag = node.tag
+        if tag == 'title':
+            title = _normalize(node.text(deep=True))
+        elif tag == 'meta':
+            attributes = node.attributes
+            name = attributes.get('name')
+            if name:
+                meta[name.lower()] = attributes.get('content') or ''
+        else:
+            extractor.handle_starttag(tag, list(node.attributes.items()))
+    root = tree.root
+    return HtmlDocument(
+        links=extractor.links,
+        styles=extractor.styles,
+        scripts=extractor.scripts,
+        images=extractor.images,
+        title=title,
+        meta=meta,
+        loader=(lambda: _get_text(_walk_selectolax, root)) if root else None,
+        )
+
+
+#: Motores disponibles, por nombre
+BACKENDS = {'html.parser': _parse_html_parser}
+if lxml_html is not None:
+    BACKENDS['lxml'] = _parse_lxml
+if LexborHTMLParser is not None:
+    BACKENDS['selectolax'] = _parse_selectolax
+
+_default_backend = None
+
+
+def available_backends() -> list[str]:
+    """Nombres de los motores de análisis instalados, por orden de
+    preferencia.
+    """
+    return [name for name in PREFERRED_BACKENDS if name in BACKENDS]
+
+
+def select_backend(name: Optional[str] = None) -> str:
+    """Elige el motor de análisis que se usa por defecto.
+
+    Params:
+
+        - name (str): Opcional. El nombre del motor. Si no se indica,
+          se usa el de la variable ``SPIDERCHECK_HTML_PARSER`` de la
+          configuración, o ``html.parser``.
+
+    Returns:
+
+        El nombre del motor elegido. Si el indicado no está instalado,
+        ``FALLBACK_BACKEND``.
+
+    Examples:
+
+        >>> select_backend('html.parser')
+        'html.parser'
+        >>> select_backend('no-existe')
+        'html.parser'
+    """
+    global _default_backend
+    if name is None:
+        name = _get_configured_backend()
+    if name is None:
+        name = available_backends()[0]
+    elif name not in BACKENDS:
+        _logger.warning(
+            "El motor de análisis %s no está disponible, se usa %s",
+            name,
+            FALLBACK_BACKEND,
+            )
+        name = FALLBACK_BACKEND
+    _default_backend = name
+    return name
+
+
+def _get_configured_backend() -> Optional[str]:
+    try:
+        from django.conf import settings
+        if settings.configured:
+            return getattr(settings, 'SPIDERCHECK_HTML_PARSER', None)
+    except ImportError:
+        pass
+    return None
+
+
+def parse_document(html_text: str, backend: Optional[str] = None) -> HtmlDocument:
+    """Analiza el contenido de una página HTML.
+
+    Params:
+
+        - html_text (str): Texto completo de la página.
+
+        - backend (str): Opcional. El motor de análisis. Si no se
+          indica, se usa el elegido por defecto (Ver
+          ``select_backend``).
+
+    Returns:
+
+        Una instancia de ``HtmlDocument``.
+
+    Examples:
+
+        >>> doc = parse_document(
+        ...     '<html><head><title> Inicio </title>'
+        ...     '<meta name="Version" content="12"></head>'
+        ...     '<body><nav><a href="/a/">A</a></nav>'
+        ...     '<main><h1>Hola</h1><p>Mundo <b>cruel</b></p></main>'
+        ...     '</body></html>'
+        ...     )
+        >>> doc.title
+        'Inicio'
+        >>> doc.meta
+        {'version': '12'}
+        >>> doc.headings['h1']
+        ['Hola']
+        >>> doc.text
+        'Hola Mundo cruel'
+        >>> parse_document('<p>Sin main</p><h2>Dos</h2>').text
+        'Sin main Dos'
+        >>> sorted(doc.all_links())
+        ['/a/']
+    """
+    if backend is None:
+        backend = _default_backend or select_backend()
+    return BACKENDS[backend](html_text)
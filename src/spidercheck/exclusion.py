@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+
+"""
+Módulo ``exclusion``
+------------------------------------------------------------------------
+
+Reglas de exclusión de URL de cada *site*.
+
+Las URL excluidas nunca se añaden a la frontera, ni se almacenan como
+páginas. Cada regla es de uno de estos tipos:
+
+- ``prefix``: La ruta empieza por el patrón (``/api/``).
+
+- ``glob``: La ruta completa, con los parámetros, encaja con el patrón,
+  con comodines al estilo de la *shell* (``/agenda/*?mes=*``). El
+  comodín ``*`` también abarca la barra ``/``.
+
+- ``regex``: La expresión regular encaja desde el principio de la ruta
+  (``/calendario/\\d{4}/``).
+
+En ningún caso se distingue entre mayúsculas y minúsculas.
+
+Las reglas se compilan una sola vez (Ver ``get_excluder``): los
+prefijos, en un árbol de prefijos (*trie*), que se recorre carácter a
+carácter, como mucho hasta la longitud del prefijo más largo; los
+comodines y las expresiones regulares, en una única expresión regular.
+Así, comprobar una URL tiene un coste que apenas depende del número de
+reglas.
+
+Además de las reglas de cada *site*, siempre se aplican las de
+``DEFAULT_EXCLUDES``.
+"""
+
+from typing import Iterable
+from typing import NamedTuple
+import fnmatch
+import functools
+import re
+
+
+PREFIX = 'prefix'
+GLOB = 'glob'
+REGEX = 'regex'
+
+#: Tipos de regla
+KINDS = (PREFIX, GLOB, REGEX)
+
+
+class Rule(NamedTuple):
+    """Una regla de exclusión: tipo (``KINDS``) y patrón.
+    """
+    kind: str
+    pattern: str
+
+
+#: Reglas que se aplican a todos los *sites*
+DEFAULT_EXCLUDES = (
+    Rule(PREFIX, '/api/'),
+    Rule(PREFIX, '/api2/'),
+    Rule(PREFIX, '/__debug__/'),
+    )
+
+_END = ''
+
+
+def _as_regex(rule: Rule) -> str:
+    if rule.kind == GLOB:
+        return fnmatch.translate(rule.pattern.lower())
+    return rule.pattern
+
+
+class Excluder:
+    """Comprueba si una URL está excluida por alguna de las reglas.
+
+    Params:
+
+        - rules (Iterable[Rule]): Las reglas. Un patrón de tipo
+          ``regex`` no válido eleva ``re.error``.
+
+    Examples:
+
+        >>> is_excluded = Excluder([
+        ...     Rule('prefix', '/privado/'),
+        ...     Rule('glob', '/agenda/*?mes=*'),
+        ...     Rule('regex', r'/calendario/\\d{4}/'),
+        ...     ])
+        >>> is_excluded('/Privado/datos.html')
+        True
+        >>> is_excluded('/agenda/cultura/?mes=10')
+        True
+        >>> is_excluded('/agenda/cultura/')
+        False
+        >>> is_excluded('/calendario/2024/05/')
+        True
+        >>> is_excluded('/noticias/calendario/2024/')
+        False
+        >>> bool(Excluder([]))
+        False
+    """
+
+    def __init__(self, rules: Iterable[Rule]):
+        self.rules = tuple(Rule(*rule) for rule in rules)
+        self.trie = {}
+        for rule in self.rules:
+            if rule.kind == PREFIX and rule.pattern:
+                node = self.trie
+                for char in rule.pattern.lower():
+                    node = node.setdefault(char, {})
+                node[_END] = True
+        patterns = [
+            f'(?:{_as_regex(rule)})'
+            for rule in self.rules
+            if rule.kind in (GLOB, REGEX) and rule.pattern
+            ]
+        self.pat_rules = re.compile('|'.join(patterns), re.IGNORECASE) if patterns else None
+
+    def __bool__(self):
+        return bool(self.trie) or self.pat_rules is not None
+
+    def match_prefix(self, url: str) -> bool:
+        node = self.trie
+        for char in url.lower():
+            node = node.get(char)
+            if node is None:
+                return False
+            if _END in node:
+                return True
+        return False
+
+    def __call__(self, url: str) -> bool:
+        """Verdadero si la URL, relativa al servidor, está excluida.
+        """
+        if self.trie and self.match_prefix(url):
+            return True
+        return self.pat_rules is not None and self.pat_rules.match(url) is not None
+
+
+@functools.lru_cache(maxsize=64)
+def get_excluder(rules: tuple = ()) -> Excluder:
+    """Devuelve un ``Excluder`` con las reglas indicadas y las de
+    ``DEFAULT_EXCLUDES``.
+
+    Las reglas se compilan una sola vez para cada conjunto de reglas,
+    que normalmente es el de un *site*.
+
+    Params:
+
+        - rules (tuple): Tupla de reglas (``Rule``, o tuplas de tipo y
+          patrón).
+
+    Examples:
+
+        >>> get_excluder()('/api/v1/')
+        True
+        >>> get_excluder((('prefix', '/tmp/'),))('/tmp/x')
+        True
+    """
+    return Excluder(DEFAULT_EXCLUDES + tuple(rules))
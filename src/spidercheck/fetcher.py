@@ -0,0 +1,607 @@
+#!/usr/bin/env python3
+
+"""
+Módulo ``fetcher``
+------------------------------------------------------------------------
+
+Funciones para realizar las peticiones HTTP necesarias para comprobar
+una página.
+
+Hay dos estrategias posibles:
+
+- **Petición única** (``single_request=True``): Se realiza una única
+  petición ``GET``, de la que se obtienen el código de estado, las
+  cabeceras y, si es una página HTML, el cuerpo. Si la respuesta no es
+  HTML, se cierra la conexión sin leer el contenido. Para los recursos
+  que, por su extensión, sabemos que no son HTML (imágenes, hojas de
+  estilo, PDF, etc.) se sigue usando una petición ``HEAD``.
+
+- **Dos peticiones** (``single_request=False``): El comportamiento
+  clásico. Primero una petición ``HEAD`` para comprobar la página, y
+  luego, si es HTML, una segunda petición ``GET`` para obtener el
+  contenido.
+"""
+
+from pathlib import PurePosixPath
+from typing import Union, Optional, Callable
+from urllib.parse import urlparse, urljoin
+import time
+
+from .decoding import decode_body
+from .decoding import detect_charset
+from .decoding import get_accept_encoding
+from .decoding import get_decompressor
+from .decoding import META_SNIFF_SIZE
+from .decoding import TextStream
+from .politeness import RateController
+from .pool import ConnectionPool
+from .results import Success, Failure
+from .timings import Timings
+from .webparser import check_html
+from .webparser import HtmlSniffer
+from .webparser import looks_like_html
+from .webparser import SNIFF_SIZE
+
+
+#: Extensiones de recursos que sabemos que no son HTML. Para estos
+#: recursos basta con una petición ``HEAD``.
+ASSET_EXTENSIONS = frozenset([
+    '.css', '.js', '.mjs', '.map', '.json', '.xml', '.txt', '.csv',
+    '.png', '.jpg', '.jpeg', '.gif', '.svg', '.ico', '.webp', '.avif',
+    '.bmp', '.tif', '.tiff',
+    '.woff', '.woff2', '.ttf', '.otf', '.eot',
+    '.pdf', '.doc', '.docx', '.xls', '.xlsx', '.ppt', '.pptx',
+    '.odt', '.ods', '.odp', '.rtf', '.epub',
+    '.zip', '.gz', '.tgz', '.bz2', '.xz', '.7z', '.rar', '.tar',
+    '.mp3', '.mp4', '.m4a', '.ogg', '.oga', '.ogv', '.wav', '.webm',
+    '.avi', '.mov', '.mkv', '.flac',
+    ])
+
+#: Códigos de estado HTTP que indican una redirección
+REDIRECT_CODES = frozenset([301, 302, 303, 307, 308])
+
+#: Número máximo de redirecciones que se siguen
+MAX_REDIRECTS = 10
+
+#: Tamaño de los fragmentos en los que se lee el contenido
+CHUNK_SIZE = 64 * 1024
+
+#: Tamaño máximo, por defecto, del contenido a descargar (10 MiB)
+MAX_BODY_SIZE = 10 * 1024 * 1024
+
+#: Reserva de conexiones usada si no se especifica otra
+default_pool = ConnectionPool()
+
+
+def get_content_type(headers) -> str:
+    value = headers.get('content-type', '')
+    if value and ';' in value:
+        value, _ = value.split(';', 1)
+    return value.strip().lower()
+
+
+def get_content_length(headers) -> int:
+    value = headers.get('content-length', '0')
+    try:
+        return int(value)
+    except ValueError:
+        return 0
+
+
+def content_is_html(headers) -> bool:
+    content_type = get_content_type(headers)
+    return content_type == 'text/html'
+
+
+def get_conditional_headers(etag: str = '', last_modified: str = '') -> dict:
+    """Cabeceras para una petición condicional.
+
+    Params:
+
+        - etag (str): El valor de la cabecera ``ETag`` de la última
+          respuesta.
+
+        - last_modified (str): El valor de la cabecera
+          ``Last-Modified`` de la última respuesta.
+
+    Returns:
+
+        Un diccionario con las cabeceras ``If-None-Match`` y/o
+        ``If-Modified-Since``. Puede estar vacío.
+
+    Examples:
+
+        >>> get_conditional_headers('"abc"')
+        {'If-None-Match': '"abc"'}
+        >>> get_conditional_headers()
+        {}
+    """
+    headers = {}
+    if etag:
+        headers['If-None-Match'] = etag
+    if last_modified:
+        headers['If-Modified-Since'] = last_modified
+    return headers
+
+
+def is_asset_url(url: str) -> bool:
+    """Verdadero si, por la extensión, la URL no es una página HTML.
+
+    Params:
+
+        - url (str): La URL a comprobar.
+
+    Returns:
+
+        `True` si la extensión de la ruta corresponde a un recurso
+        que no es HTML (Imagen, hoja de estilos, documento, etc.)
+
+    Examples:
+
+        >>> is_asset_url('https://example.com/static/logo.png')
+        True
+        >>> is_asset_url('https://example.com/noticias/')
+        False
+        >>> is_asset_url('https://example.com/index.html')
+        False
+    """
+    suffix = PurePosixPath(urlparse(url).path).suffix.lower()
+    return suffix in ASSET_EXTENSIONS
+
+
+class Response:
+    """Resultado de una comprobación HTTP.
+
+    Atributos:
+
+        url (str): La URL final, después de seguir las redirecciones.
+
+        status (int): El código de estado HTTP.
+
+        headers: Las cabeceras de la respuesta.
+
+        body (str): El cuerpo de la respuesta, si se ha leído, o
+            ``None`` en caso contrario.
+
+        num_requests (int): Número de peticiones HTTP realizadas para
+            obtener esta respuesta.
+
+        wire_bytes (int): Número de bytes del cuerpo recibidos del
+            servidor, es decir, comprimidos, si el servidor usó
+            compresión.
+
+        decoded_bytes (int): Número de bytes del cuerpo, una vez
+            descomprimido.
+
+        encoding (str): El juego de caracteres usado para decodificar
+            el cuerpo.
+
+        is_truncated (bool): Verdadero si se dejó de leer el cuerpo por
+            superar el tamaño máximo permitido.
+
+        rejected (str): Si se abortó la descarga porque el contenido no
+            parece HTML, el motivo. En caso contrario, ``None``.
+
+        html_check: Si la respuesta se declara como HTML y se ha leído
+            el cuerpo completo, el resultado de comprobar si lo parece
+            (Ver ``webparser.HtmlSniffer``): una instancia de
+            ``Success`` o de ``Failure``. En caso contrario, ``None``.
+
+        redirects (list): Las redirecciones seguidas hasta llegar a la
+            URL final. Cada una es un diccionario con la URL
+            solicitada (``url``), el código de estado (``status``) y la
+            URL a la que redirige (``location``).
+
+        is_streamed (bool): Verdadero si el cuerpo se ha ido pasando
+            completo a la función ``on_text`` (Ver ``read_body``), y
+            decodificado igual que ``body``.
+    """
+
+    def __init__(self, url, status, headers, body=None, num_requests=1):
+        self.url = url
+        self.status = status
+        self.headers = headers
+        self.body = body
+        self.num_requests = num_requests
+        self.wire_bytes = 0
+        self.decoded_bytes = 0
+        self.encoding = None
+        self.is_truncated = False
+        self.rejected = None
+        self.html_check = None
+        self.redirects = []
+        self.is_streamed = False
+
+    def __repr__(self):
+        return f'Response({self.url!r}, status={self.status!r})'
+
+    @property
+    def content_type(self) -> str:
+        return get_content_type(self.headers)
+
+    @property
+    def size_bytes(self) -> int:
+        if self.body is not None:
+            return self.decoded_bytes
+        if self.content_encoding in ('', 'identity'):
+            return get_content_length(self.headers)
+        return 0
+
+    @property
+    def content_encoding(self) -> str:
+        return self.headers.get('content-encoding', '').strip().lower()
+
+    def is_html(self) -> bool:
+        return content_is_html(self.headers)
+
+    def is_not_modified(self) -> bool:
+        """Verdadero si el servidor responde que no hay cambios (304).
+        """
+        return self.status == 304
+
+    @property
+    def etag(self) -> str:
+        return self.headers.get('etag', '')
+
+    @property
+    def last_modified(self) -> str:
+        return self.headers.get('last-modified', '')
+
+
+def read_body(
+        req,
+        response: Response,
+        max_bytes: int = MAX_BODY_SIZE,
+        on_text: Optional[Callable[[str], None]] = None,
+        ) -> Optional[str]:
+    """Lee, descomprime y decodifica el cuerpo de una respuesta.
+
+    El contenido se lee del servidor por fragmentos, que se van
+    descomprimiendo según se reciben, de forma que el consumo de
+    memoria está acotado por ``max_bytes``, sea cual sea el tamaño real
+    del recurso:
+
+    - Si el contenido descomprimido supera ``max_bytes``, se deja de
+      leer y se marca la respuesta como truncada (``is_truncated``).
+
+    - Si la respuesta se declara como HTML, pero los primeros bytes no
+      lo parecen, se aborta la descarga y se indica el motivo en el
+      atributo ``rejected`` de la respuesta.
+
+    - Si la respuesta se declara como HTML, los fragmentos se van
+      pasando a un ``HtmlSniffer`` según se reciben. Al terminar, si el
+      contenido no parece un documento HTML completo, se rechaza
+      también, indicando el motivo.
+
+    - Si se indica la función ``on_text``, se le va pasando el texto
+      según se recibe y decodifica (Ver ``decoding.TextStream``), por
+      ejemplo, para analizarlo mientras se sigue descargando.
+
+    Actualiza también los atributos ``wire_bytes``, ``decoded_bytes``,
+    ``encoding`` e ``is_streamed`` de la respuesta.
+
+    Params:
+
+        - req: La respuesta HTTP de la que leer.
+
+        - response (Response): La respuesta a actualizar.
+
+        - max_bytes (int): Número máximo de bytes a leer, una vez
+          descomprimidos.
+
+        - on_text (callable): Opcional. Recibe cada fragmento del texto
+          según se decodifica.
+
+    Returns:
+
+        El cuerpo de la respuesta, como texto, o ``None`` si se abortó
+        la descarga.
+    """
+    decompressor = get_decompressor(response.content_encoding)
+    sniff = response.is_html()
+    sniffer = HtmlSniffer() if sniff else None
+    stream = None
+    read = req.read
+    if on_text is not None:
+        stream = TextStream(response.headers)
+        # Se procesa lo que vaya llegando, sin esperar a tener un
+        # fragmento completo
+        read = req.read1
+    data = bytearray()
+    while True:
+        chunk = read(CHUNK_SIZE)
+        # Nunca se descomprime más de lo necesario para saber que se
+        # supera ``max_bytes``
+        limit = max_bytes - len(data) + 1
+        if chunk:
+            response.wire_bytes += len(chunk)
+            piece = decompressor.decompress(chunk, limit)
+        else:
+            piece = decompressor.decompress(b'', limit) + decompressor.flush()
+        data += piece
+        if sniffer is not None:
+            sniffer.feed(piece)
+        if sniff and (len(data) >= SNIFF_SIZE or not chunk):
+            sniff = False
+            if not looks_like_html(bytes(data[:SNIFF_SIZE])):
+                response.rejected = (
+                    'El contenido se declara como HTML, pero no lo parece'
+                    )
+                response.decoded_bytes = len(data)
+                return None
+        is_last = not chunk
+        if len(data) > max_bytes:
+            del data[max_bytes:]
+            response.is_truncated = True
+            is_last = True
+        if stream is not None:
+            if fresh := stream.decode(data, final=is_last):
+                on_text(fresh)
+        if is_last:
+            break
+    response.decoded_bytes = len(data)
+    charset = detect_charset(response.headers, bytes(data[:META_SNIFF_SIZE]))
+    text, response.encoding = decode_body(bytes(data), charset)
+    response.is_streamed = stream is not None and stream.encoding == response.encoding
+    if sniffer is not None and not response.is_truncated:
+        html_check = sniffer.result()
+        if not html_check and response.encoding.lower().startswith(('utf-16', 'utf-32')):
+            # Los bytes no son compatibles con ASCII; se comprueba el texto
+            html_check = check_html(text)
+        response.html_check = html_check
+        if not html_check:
+            response.rejected = (
+                'El contenido se declara como HTML, pero no lo parece: '
+                + html_check.error_message
+                )
+            return None
+    return text
+
+
+def fetch(
+        url: str,
+        method: str = 'GET',
+        want_body: Optional[Callable[[Response], bool]] = None,
+        client: Optional[ConnectionPool] = None,
+        headers: Optional[dict] = None,
+        max_bytes: int = MAX_BODY_SIZE,
+        controller: Optional[RateController] = None,
+        timings: Optional[Timings] = None,
+        follow_redirects: bool = True,
+        on_text: Optional[Callable[[str], None]] = None,
+        ) -> Union[Success, Failure]:
+    """Realiza una petición HTTP, siguiendo las redirecciones.
+
+    Params:
+
+        - url (str): La URL a solicitar.
+
+        - method (str): El método HTTP, normalmente ``GET`` o ``HEAD``.
+
+        - want_body (callable): Opcional. Recibe la respuesta, con las
+          cabeceras ya leídas, y devuelve si se debe leer o no el
+          cuerpo. Si no se indica, se lee siempre el cuerpo de las
+          peticiones ``GET``.
+
+        - client (ConnectionPool): Opcional. La reserva de conexiones a
+          usar. Si no se indica, se usa una reserva compartida por
+          todo el proceso.
+
+        - headers (dict): Opcional. Cabeceras adicionales a incluir en
+          la petición, por ejemplo, las cabeceras condicionales
+          ``If-None-Match`` o ``If-Modified-Since``.
+
+        - max_bytes (int): Tamaño máximo del cuerpo a leer. Ver
+          ``read_body``.
+
+        - controller (RateController): Opcional. El regulador del ritmo
+          de peticiones al servidor. Antes de cada petición se espera
+          el turno, y después se le informa del resultado.
+
+        - timings (Timings): Opcional. Si se indica, se acumulan en él
+          los tiempos de las fases ``wait``, ``connect``, ``ttfb`` y
+          ``download``.
+
+        - follow_redirects (bool): Si es falso, no se siguen las
+          redirecciones: se devuelve la propia respuesta de
+          redirección, sin cuerpo, con el salto en ``redirects``.
+
+        - on_text (callable): Opcional. Recibe el texto del cuerpo
+          según se descarga. Ver ``read_body``.
+
+    Returns:
+
+        Una instancia de `Success`, cuyo valor es un objeto `Response`, o
+        una instancia de `Failure` con el código de estado como ``code``
+        (``-1`` si ni siquiera se pudo obtener una respuesta).
+    """
+    client = client or default_pool
+    timings = timings if timings is not None else Timings()
+    headers = {'Accept-Encoding': get_accept_encoding(), **(headers or {})}
+    num_requests = 0
+    redirects = []
+    try:
+        while True:
+            num_requests += 1
+            if controller:
+                with timings.phase('wait'):
+                    controller.acquire()
+            start_time = time.monotonic()
+            try:
+                pooled = client.request(method, url, headers=headers, timings=timings)
+            except Exception:
+                if controller:
+                    controller.feedback(-1, time.monotonic() - start_time)
+                raise
+            with pooled as req:
+                status = req.status
+                if controller:
+                    controller.feedback(
+                        status,
+                        time.monotonic() - start_time,
+                        req.headers.get('retry-after'),
+                        )
+                location = req.headers.get('location')
+                if status in REDIRECT_CODES and location:
+                    if num_requests > MAX_REDIRECTS:
+                        return Failure(
+                            f'Demasiadas redirecciones desde {url}',
+                            code=status,
+                            )
+                    location = urljoin(url, location)
+                    redirects.append({
+                        'url': url,
+                        'status': status,
+                        'location': location,
+                        })
+                    if not follow_redirects:
+                        response = Response(
+                            url,
+                            status,
+                            req.headers,
+                            num_requests=num_requests,
+                            )
+                        response.redirects = redirects
+                        return Success(response)
+                    url = location
+                    if status == 303 and method != 'HEAD':
+                        method = 'GET'
+                    continue
+                if status >= 400:
+                    return Failure(
+                        f'El servidor devuelve un código de error {status}',
+                        code=status,
+                        )
+                response = Response(
+                    url,
+                    status,
+                    req.headers,
+                    num_requests=num_requests,
+                    )
+                response.redirects = redirects
+                if method != 'HEAD' and not response.is_not_modified():
+                    if want_body is None or want_body(response):
+                        with timings.phase('download'):
+                            response.body = read_body(req, response, max_bytes, on_text)
+                return Success(response)
+    except Exception as err:
+        return Failure(str(err), code=-1)
+
+
+def fetch_page(
+        url: str,
+        single_request: bool = True,
+        is_local: Optional[Callable[[str], bool]] = None,
+        client: Optional[ConnectionPool] = None,
+        validators: Optional[dict] = None,
+        max_bytes: int = MAX_BODY_SIZE,
+        controller: Optional[RateController] = None,
+        timings: Optional[Timings] = None,
+        want_body: Optional[Callable[[Response], bool]] = None,
+        follow_redirects: bool = True,
+        on_text: Optional[Callable[[str], None]] = None,
+        ) -> Union[Success, Failure]:
+    """Obtiene el estado y, si procede, el contenido de una página.
+
+    El cuerpo solo se descarga si la respuesta es HTML, la URL final
+    (después de las redirecciones) es local, según el parámetro
+    ``is_local``, y se cumple la condición adicional ``want_body``, si
+    se indica.
+
+    Si se indican validadores de una comprobación anterior, la
+    petición es condicional. Si el servidor responde con un código
+    ``304``, la respuesta no tiene cuerpo y su método
+    ``is_not_modified`` devuelve ``True``.
+
+    Params:
+
+        - url (str): La URL de la página.
+
+        - single_request (bool): Usar una única petición ``GET`` en
+          vez de ``HEAD`` + ``GET``. Ver la documentación del módulo.
+
+        - is_local (callable): Opcional. Recibe una URL y devuelve si
+          es local al *site*. Si no se indica, todas las URL se
+          consideran locales.
+
+        - client (ConnectionPool): Opcional. La reserva de conexiones a
+          usar.
+
+        - validators (dict): Opcional. Cabeceras condicionales, tal y
+          como las devuelve ``get_conditional_headers``.
+
+        - max_bytes (int): Tamaño máximo del cuerpo a leer. Ver
+          ``read_body``.
+
+        - controller (RateController): Opcional. El regulador del ritmo
+          de peticiones al servidor.
+
+        - timings (Timings): Opcional. Acumulador de los tiempos de
+          cada fase. Ver ``fetch``.
+
+        - want_body (callable): Opcional. Condición adicional para
+          descargar el cuerpo. Recibe la respuesta, con las cabeceras
+          ya leídas, y devuelve si se debe leer o no el cuerpo.
+
+        - follow_redirects (bool): Seguir o no las redirecciones. Ver
+          ``fetch``.
+
+        - on_text (callable): Opcional. Recibe el texto del cuerpo
+          según se descarga. Ver ``read_body``.
+
+    Returns:
+
+        Una instancia de `Success`, con un objeto `Response`, o una
+        instancia de `Failure`.
+    """
+
+    def should_read_body(response):
+        if not response.is_html():
+            return False
+        if is_local is not None and not is_local(response.url):
+            return False
+        return want_body is None or want_body(response)
+
+    if single_request and not is_asset_url(url):
+        return fetch(
+            url,
+            'GET',
+            want_body=should_read_body,
+            client=client,
+            headers=validators,
+            max_bytes=max_bytes,
+            controller=controller,
+            timings=timings,
+            follow_redirects=follow_redirects,
+            on_text=on_text,
+            )
+    result = fetch(
+        url,
+        'HEAD',
+        client=client,
+        headers=validators,
+        controller=controller,
+        timings=timings,
+        follow_redirects=follow_redirects,
+        )
+    if result.is_failure():
+        return result
+    response = result.value
+    if response.is_not_modified() or not should_read_body(response):
+        return result
+    if response.redirects and not follow_redirects:
+        return result
+    second = fetch(
+        url,
+        'GET',
+        want_body=should_read_body,
+        client=client,
+        headers=validators,
+        max_bytes=max_bytes,
+        controller=controller,
+        timings=timings,
+        on_text=on_text,
+        )
+    if second.is_success():
+        second.value.num_requests += response.num_requests
+    return second
@@ -0,0 +1,186 @@
+#!/usr/bin/env python3
+
+"""
+Módulo ``fingerprint``
+------------------------------------------------------------------------
+
+Huellas (*fingerprints*) del contenido de las páginas, que permiten
+saber si el contenido ha cambiado desde la última comprobación.
+
+Hay dos tipos de huellas:
+
+- ``content_hash``: Huella SHA-256 del contenido completo. Si coincide
+  con la de la comprobación anterior, el contenido no ha cambiado.
+
+- ``simhash``: Huella de 64 bits del texto de la página, que cambia
+  poco si el texto cambia poco. El número de bits distintos entre dos
+  huellas (Distancia de Hamming) mide lo parecidas que son dos
+  páginas, lo que permite detectar páginas casi duplicadas, como las
+  distintas páginas de un listado o las versiones para imprimir (Ver
+  ``near_duplicates``).
+"""
+
+import hashlib
+import re
+
+
+def content_hash(text: str) -> str:
+    """Huella SHA-256 del contenido de una página.
+
+    Params:
+
+        - text (str): El contenido de la página.
+
+    Returns:
+
+        La huella, en forma de cadena de texto hexadecimal de 64
+        caracteres.
+
+    Examples:
+
+        >>> len(content_hash('<html></html>'))
+        64
+        >>> content_hash('a') == content_hash('a')
+        True
+    """
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+#: Número de bits de la huella ``simhash``
+SIMHASH_BITS = 64
+
+#: Número de palabras de cada fragmento (*shingle*) del texto
+SHINGLE_SIZE = 3
+
+#: Distancia máxima, en bits, entre huellas de páginas casi duplicadas
+MAX_DISTANCE = 3
+
+_MASK = (1 << SIMHASH_BITS) - 1
+
+_pat_word = re.compile(r'\w+')
+
+
+def simhash(text: str, shingle_size: int = SHINGLE_SIZE) -> int:
+    """Huella ``simhash`` del texto de una página.
+
+    Cada fragmento de ``shingle_size`` palabras consecutivas aporta su
+    propia huella, y cada bit del resultado es el que más se repite en
+    esa posición. Los textos parecidos comparten la mayoría de los
+    fragmentos, así que sus huellas se diferencian en pocos bits.
+
+    Params:
+
+        - text (str): El texto de la página, sin etiquetas.
+
+        - shingle_size (int): Número de palabras de cada fragmento.
+
+    Returns:
+
+        La huella, como entero de 64 bits **con signo**, para que se
+        pueda almacenar en un ``BigIntegerField``.
+
+    Examples:
+
+        >>> a = simhash('Listado de noticias, página 1 de 20: ' + 'texto ' * 20)
+        >>> b = simhash('Listado de noticias, página 2 de 20: ' + 'texto ' * 20)
+        >>> distance(a, b) <= MAX_DISTANCE
+        True
+        >>> distance(a, simhash('Otra página sin nada que ver con la primera')) > MAX_DISTANCE
+        True
+    """
+    words = _pat_word.findall(text.lower())
+    shingles = {}
+    for start in range(max(1, len(words) - shingle_size + 1)):
+        shingle = ' '.join(words[start:start + shingle_size])
+        shingles[shingle] = shingles.get(shingle, 0) + 1
+    # Se acumula el peso de cada valor de cada byte, y solo después el
+    # de cada bit, para no recorrer los 64 bits de cada fragmento.
+    nbytes = SIMHASH_BITS // 8
+    tables = [{} for _ in range(nbytes)]
+    total = 0
+    for shingle, weight in shingles.items():
+        digest = hashlib.blake2b(shingle.encode('utf-8'), digest_size=nbytes).digest()
+        for table, byte in zip(tables, digest):
+            table[byte] = table.get(byte, 0) + weight
+        total += weight
+    result = 0
+    for position, table in enumerate(tables):
+        for bit in range(8):
+            ones = sum(weight for byte, weight in table.items() if byte >> bit & 1)
+            if 2 * ones > total:
+                result |= 1 << (position * 8 + bit)
+    if result >> (SIMHASH_BITS - 1):
+        result -= 1 << SIMHASH_BITS
+    return result
+
+
+def distance(a: int, b: int) -> int:
+    """Número de bits distintos entre dos huellas ``simhash``.
+
+    Examples:
+
+        >>> distance(0b1011, 0b0001)
+        2
+        >>> distance(-1, 0)
+        64
+    """
+    return ((a ^ b) & _MASK).bit_count()
+
+
+def near_duplicates(fingerprints: dict, max_distance: int = MAX_DISTANCE) -> list[list]:
+    """Agrupa las claves cuyas huellas ``simhash`` son casi iguales.
+
+    Si dos huellas se diferencian en ``max_distance`` bits o menos, y
+    se dividen en ``max_distance + 1`` bloques, al menos un bloque es
+    idéntico en las dos. Así que solo se comparan las huellas que
+    comparten algún bloque, en vez de todas con todas.
+
+    Params:
+
+        - fingerprints (dict): Las huellas, indexadas por una clave,
+          por ejemplo, la clave primaria de la página.
+
+        - max_distance (int): Número máximo de bits distintos.
+
+    Returns:
+
+        Una lista de grupos (listas de claves) de dos o más
+        elementos, de mayor a menor tamaño.
+
+    Examples:
+
+        >>> near_duplicates({'a': 0b1111, 'b': 0b0111, 'c': 0, 'd': -1}, 1)
+        [['a', 'b']]
+    """
+    by_value = {}
+    for key, value in fingerprints.items():
+        by_value.setdefault(value & _MASK, []).append(key)
+    values = list(by_value)
+    num_blocks = max_distance + 1
+    width = -(-SIMHASH_BITS // num_blocks)
+    buckets = {}
+    for index, value in enumerate(values):
+        for block in range(num_blocks):
+            part = (value >> (block * width)) & ((1 << width) - 1)
+            buckets.setdefault((block, part), []).append(index)
+    parent = list(range(len(values)))
+
+    def find(index):
+        while parent[index] != index:
+            parent[index] = parent[parent[index]]
+            index = parent[index]
+        return index
+
+    for indexes in buckets.values():
+        for i, first in enumerate(indexes):
+            for second in indexes[i + 1:]:
+                if distance(values[first], values[second]) <= max_distance:
+                    parent[find(first)] = find(second)
+    groups = {}
+    for index, value in enumerate(values):
+        groups.setdefault(find(index), []).extend(by_value[value])
+    return sorted(
+        (keys for keys in groups.values() if len(keys) > 1),
+        key=len,
+        reverse=True,
+        )
@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+
+"""
+Módulo ``frontier``
+------------------------------------------------------------------------
+
+Prioridad y arrendamiento (*leasing*) de las páginas de la frontera.
+
+Cada página del *site* tiene una entrada en la frontera (Modelo
+``FrontierEntry``) con una prioridad: el momento, en segundos desde el
+*epoch*, en que le toca volver a comprobarse. Cuanto menor, antes se
+comprueba, así que elegir la siguiente página es recorrer un índice por
+*site* y prioridad, sin recuentos ni ordenaciones.
+
+- Una página nueva tiene como prioridad el momento en que se añade a la
+  frontera: las páginas nuevas se comprueban en orden de llegada.
+
+- Una página comprobada correctamente vuelve a la frontera con una
+  prioridad ``RECHECK_AFTER`` más tarde; una con errores, solo
+  ``RETRY_AFTER`` más tarde. Si la página está programada (Modelo
+  ``ScheduledPage``), nunca más tarde que su rotación.
+
+Solo se entregan las páginas cuya prioridad ya ha pasado: si todas se
+han comprobado hace poco, la frontera está vacía hasta que le toque a
+la primera, y el rastreo termina.
+
+Para que varios procesos puedan rastrear el mismo *site* a la vez,
+cada uno arrienda las páginas que va a comprobar (``lease``) durante
+``LEASE_TIME``: mientras tanto, ningún otro proceso las recibe. La
+selección usa ``SELECT ... FOR UPDATE SKIP LOCKED``, de forma que los
+procesos no se esperan unos a otros. Al terminar la comprobación, la
+página se devuelve a la frontera con su nueva prioridad
+(``complete``). Si el proceso muere antes, el arrendamiento caduca y
+la página vuelve a estar disponible (Ver ``expire``).
+"""
+
+from datetime import datetime
+from datetime import timedelta as TimeDelta
+from typing import Optional
+import os
+import socket
+import threading
+
+
+#: Duración del arrendamiento de una página
+LEASE_TIME = TimeDelta(minutes=10)
+
+#: Tiempo tras el que se vuelve a comprobar una página correcta
+RECHECK_AFTER = TimeDelta(days=1)
+
+#: Tiempo tras el que se vuelve a comprobar una página con errores
+RETRY_AFTER = TimeDelta(hours=1)
+
+
+def worker_id() -> str:
+    """Identificador del proceso e hilo que arrienda las páginas.
+
+    Examples:
+
+        >>> worker_id().count(':')
+        2
+    """
+    return f'{socket.gethostname()}:{os.getpid()}:{threading.get_ident()}'
+
+
+def next_priority(
+        now: datetime,
+        status: int,
+        rotation: Optional[TimeDelta] = None,
+        ) -> float:
+    """Prioridad de una página recién comprobada.
+
+    Params:
+
+        - now (datetime): El momento de la comprobación.
+
+        - status (int): El código de estado de la comprobación.
+
+        - rotation (timedelta): Opcional. La rotación, si la página
+          está programada.
+
+    Returns:
+
+        El momento, en segundos desde el *epoch*, en que le toca
+        volver a comprobarse.
+
+    Examples:
+
+        >>> now = datetime(2024, 1, 1)
+        >>> next_priority(now, 200) - now.timestamp()
+        86400.0
+        >>> next_priority(now, 500) - now.timestamp()
+        3600.0
+        >>> next_priority(now, 200, TimeDelta(minutes=5)) - now.timestamp()
+        300.0
+    """
+    delay = RECHECK_AFTER if 200 <= status < 400 else RETRY_AFTER
+    if rotation is not None:
+        delay = min(delay, rotation)
+    return (now + delay).timestamp()
@@ -1,7 +1,10 @@
 #!/usr/bin/env python3
 
-import time
+from datetime import timedelta as TimeDelta
+import asyncio
+import contextlib
 import logging
+import re
 
 from rich.console import Console
 from rich.panel import Panel
@@ -11,15 +14,29 @@ from django.core.management.base import BaseCommand
 from django.core.management.base import CommandError
 
 from utils.heartbeats import heartbeat
+from spidercheck.bench import LATENCY_DISTRIBUTIONS
+from spidercheck.bench import run_benchmark
+from spidercheck.bench import SyntheticSite
+from spidercheck.crawler import AsyncCrawler
+from spidercheck.fechas import just_now
+from spidercheck.fingerprint import MAX_DISTANCE
+from spidercheck.models import FrontierEntry
 from spidercheck.models import Site
 from spidercheck.plugins import registry
+from spidercheck.sink import MAX_DELAY
+from spidercheck.sink import MAX_PAGES
+from spidercheck.sink import ResultSink
 from spidercheck.core import (
     load_site,
+    check_external_urls,
     check_site,
     check_page,
+    dedup_site,
     find_urls_by_pattern,
     load_page,
     init_site,
+    replay_page,
+    replay_site,
     reset_site,
 )
 
@@ -63,10 +80,16 @@ class Command(BaseCommand):
         '            de un site\n'
         ' - status:  Mostrar el estado general de un site\n'
         ' - check:   Analizar y procesar la siguiente URL\n'
+        ' - crawl:   Analizar y procesar varias URL de forma concurrente\n'
         ' - delete:  Borrar una página de la base de datos\n'
         ' - find:    Buscar en las URLs procesadas por expresión regular\n'
         ' - show:    Mostrar información sobre una página\n'
         ' - recheck: Analizar y procesar el siguiente enlace roto\n'
+        ' - dedup:   Fusionar las páginas cuya URL normalizada coincide\n'
+        ' - similar: Mostrar las páginas con un texto casi idéntico\n'
+        ' - exclude: Gestionar las reglas de exclusión de URL de un site\n'
+        ' - traps:   Mostrar los grupos de URL con variantes descartadas\n'
+        ' - frontier: Mostrar el estado de la frontera y sus arrendamientos\n'
         '\n'
     )
 
@@ -170,12 +193,272 @@ class Command(BaseCommand):
         )
         check_parser.add_argument(
             '--gap',
-            type=int,
-            help='Número de segundos entre comprobaciones',
+            type=float,
+            help=(
+                'Pausa inicial, en segundos, entre comprobaciones. Se'
+                ' ajusta automáticamente según la respuesta del servidor'
+                ),
             default='2',
         )
         check_parser.set_defaults(func=self.cmd_check)
 
+        # crawl
+        crawl_parser = subparsers.add_parser("crawl")
+        crawl_parser.add_argument(
+            '--name',
+            help='Nombre del site a comprobar (Si no se especifica, default)',
+            default='default',
+        )
+        crawl_parser.add_argument(
+            '--num',
+            type=int,
+            help='Número de enlaces a comprobar',
+            default='100',
+        )
+        crawl_parser.add_argument(
+            '--concurrency',
+            type=int,
+            help='Número máximo de comprobaciones simultáneas (por defecto 8)',
+            default='8',
+        )
+        crawl_parser.add_argument(
+            '--per-host',
+            type=int,
+            help='Número máximo de peticiones simultáneas por servidor (por defecto 2)',
+            default='2',
+        )
+        crawl_parser.add_argument(
+            '--rate',
+            type=float,
+            help=(
+                'Número máximo de peticiones por segundo y servidor. Sustituye,'
+                ' solo durante este rastreo, al ritmo máximo (max_rate) del'
+                ' site, y es también el ritmo inicial del regulador'
+                ),
+            default=None,
+        )
+        crawl_parser.add_argument(
+            '--batch',
+            type=int,
+            help=(
+                f'Escribir los resultados por lotes de este número de páginas'
+                f' (por defecto {MAX_PAGES}). 0 para escribir cada página al'
+                f' terminar de comprobarla'
+                ),
+            default=MAX_PAGES,
+        )
+        crawl_parser.add_argument(
+            '--batch-delay',
+            type=float,
+            help=f'Segundos máximos que un resultado espera a escribirse (por defecto {MAX_DELAY})',
+            default=MAX_DELAY,
+        )
+        crawl_parser.set_defaults(func=self.cmd_crawl)
+
+        # bench
+        bench_parser = subparsers.add_parser(
+            "bench",
+            help="Medir el rendimiento del rastreo contra un site sintético local",
+        )
+        bench_parser.add_argument(
+            '--engine',
+            choices=['check', 'crawl', 'all'],
+            help='Motor de rastreo a medir (por defecto, check)',
+            default='check',
+        )
+        bench_parser.add_argument('--pages', type=int, help='Número de páginas', default='200')
+        bench_parser.add_argument('--fan-out', type=int, help='Enlaces por página', default='10')
+        bench_parser.add_argument(
+            '--assets',
+            type=float,
+            help='Proporción de enlaces a recursos (imágenes, css, js)',
+            default='0.2',
+        )
+        bench_parser.add_argument(
+            '--errors',
+            type=float,
+            help='Proporción de páginas con errores',
+            default='0.02',
+        )
+        bench_parser.add_argument(
+            '--redirects',
+            type=float,
+            help='Proporción de enlaces con redirección',
+            default='0.05',
+        )
+        bench_parser.add_argument(
+            '--latency',
+            type=float,
+            help='Latencia media del servidor, en segundos',
+            default='0',
+        )
+        bench_parser.add_argument(
+            '--latency-dist',
+            choices=LATENCY_DISTRIBUTIONS,
+            help='Distribución de la latencia',
+            default='exponential',
+        )
+        bench_parser.add_argument(
+            '--concurrency',
+            type=int,
+            help='Comprobaciones simultáneas, para el motor crawl',
+            default='8',
+        )
+        bench_parser.add_argument('--seed', type=int, help='Semilla', default='1')
+        bench_parser.set_defaults(func=self.cmd_bench)
+
+        # replay
+        replay_parser = subparsers.add_parser(
+            "replay",
+            help="Reprocesar el contenido archivado, sin acceder a la red",
+        )
+        replay_parser.add_argument(
+            '--name',
+            help='Nombre del site a reprocesar (Si no se especifica, default)',
+            default='default',
+        )
+        replay_parser.add_argument(
+            '--num',
+            type=int,
+            help='Número máximo de páginas a reprocesar (por defecto, todas)',
+            default='0',
+        )
+        replay_parser.add_argument(
+            '--id',
+            type=int,
+            help='Reprocesar solo la página indicada',
+            default='0',
+        )
+        replay_parser.set_defaults(func=self.cmd_replay)
+
+        # external
+        external_parser = subparsers.add_parser(
+            "external",
+            help="Comprobar los enlaces externos, compartidos por todos los sites",
+        )
+        external_parser.add_argument(
+            '--num',
+            type=int,
+            help='Número de enlaces externos a comprobar',
+            default='100',
+        )
+        external_parser.add_argument(
+            '--ttl',
+            type=float,
+            help='Horas que debe pasar antes de volver a comprobar un enlace (por defecto 24)',
+            default='24',
+        )
+        external_parser.add_argument(
+            '--errors',
+            help='Mostrar los enlaces externos con errores de un site, en vez de comprobar',
+            action='store_true',
+        )
+        external_parser.add_argument(
+            '--name',
+            help='Nombre del site, para la opción --errors',
+            default='default',
+        )
+        external_parser.set_defaults(func=self.cmd_external)
+
+        # dedup
+        dedup_parser = subparsers.add_parser(
+            "dedup",
+            help="Fusionar las páginas duplicadas, cuya URL normalizada coincide",
+        )
+        dedup_parser.add_argument(
+            '--name',
+            help='Nombre del site a depurar (Si no se especifica, default)',
+            default='default',
+        )
+        dedup_parser.add_argument(
+            '--dry-run',
+            help='Mostrar los duplicados, sin modificar nada',
+            action='store_true',
+        )
+        dedup_parser.set_defaults(func=self.cmd_dedup)
+
+        # similar
+        similar_parser = subparsers.add_parser(
+            "similar",
+            help="Mostrar las páginas casi duplicadas, con un texto casi idéntico",
+        )
+        similar_parser.add_argument(
+            '--name',
+            help='Nombre del site (Si no se especifica, default)',
+            default='default',
+        )
+        similar_parser.add_argument(
+            '--distance',
+            help=f'Número máximo de bits distintos entre las huellas (Por defecto, {MAX_DISTANCE})',
+            type=int,
+            default=MAX_DISTANCE,
+        )
+        similar_parser.set_defaults(func=self.cmd_similar)
+
+        # exclude
+        exclude_parser = subparsers.add_parser(
+            "exclude",
+            help="Gestionar las reglas de exclusión de URL (Sin opciones, las muestra)",
+        )
+        exclude_parser.add_argument(
+            '--name',
+            help='Nombre del site (Si no se especifica, default)',
+            default='default',
+        )
+        exclude_group = exclude_parser.add_mutually_exclusive_group()
+        exclude_group.add_argument(
+            '--prefix',
+            help='Añadir una regla: excluir las rutas que empiezan por el prefijo',
+        )
+        exclude_group.add_argument(
+            '--glob',
+            help='Añadir una regla: excluir las URL que encajan con el patrón (Comodines * y ?)',
+        )
+        exclude_group.add_argument(
+            '--regex',
+            help='Añadir una regla: excluir las URL que encajan con la expresión regular',
+        )
+        exclude_group.add_argument(
+            '--remove',
+            help='Borrar la regla con el identificador indicado',
+            type=int,
+        )
+        exclude_parser.set_defaults(func=self.cmd_exclude)
+
+        # traps
+        traps_parser = subparsers.add_parser(
+            "traps",
+            help="Mostrar los grupos de URL con variantes descartadas (Posibles trampas)",
+        )
+        traps_parser.add_argument(
+            '--name',
+            help='Nombre del site (Si no se especifica, default)',
+            default='default',
+        )
+        traps_parser.set_defaults(func=self.cmd_traps)
+
+        # frontier
+        frontier_parser = subparsers.add_parser(
+            "frontier",
+            help="Mostrar el estado de la frontera y sus arrendamientos",
+        )
+        frontier_parser.add_argument(
+            '--name',
+            help='Nombre del site (Si no se especifica, default)',
+            default='default',
+        )
+        frontier_parser.add_argument(
+            '--expire',
+            help='Liberar los arrendamientos caducados',
+            action='store_true',
+        )
+        frontier_parser.add_argument(
+            '--rebuild',
+            help='Añadir a la frontera las páginas que no tengan entrada',
+            action='store_true',
+        )
+        frontier_parser.set_defaults(func=self.cmd_frontier)
+
         # Recheck
         recheck_parser = subparsers.add_parser("recheck")
         recheck_parser.add_argument(
@@ -226,6 +509,13 @@ class Command(BaseCommand):
     def failure(self, msg):
         self.out(f"{ERROR} [red bold]{msg}[/]")
 
+    def show_pool_stats(self, site):
+        stats = site.get_http_client().stats()
+        self.out(
+            f"Conexiones HTTP: {stats['handshakes']} establecidas,"
+            f" {stats['reused']} reutilizadas"
+            )
+
     def cmd_init(self, options):
         name = options['name']
         url = options['url']
@@ -252,7 +542,9 @@ class Command(BaseCommand):
         table.add_column("En cola", justify="right")
         table.add_column("Errores", justify="right")
         table.add_column("Progreso", justify="right")
+        table.add_column("Compresión", justify="right")
         for site in sites:
+            bandwidth = site.get_bandwidth()
             table.add_row(
                 site.name,
                 site.url(),
@@ -260,6 +552,7 @@ class Command(BaseCommand):
                 str(site.all_queued_pages().count()),
                 str(site.pages_with_errors().count()),
                 f'{site.progress():.2f}%',
+                f"{bandwidth['saved']:.2f}%",
                 )
         self.console.print(table)
 
@@ -293,7 +586,15 @@ class Command(BaseCommand):
             self.out(f"Id. page        : {page.pk}")
             self.out(f"URL             : {page.get_full_url()}")
             self.out(f"Tamaño (bytes)  : {page.size_bytes}")
+            self.out(f"Transferidos    : {page.wire_bytes}")
             self.out(f"Check           : {OK if page.is_checked else WAITING}")
+            if page.is_alias():
+                self.out(f"Alias de        : {page.alias_of.pk}: {page.alias_of.get_relative_url()}")
+            for hop in page.redirects:
+                self.out(f" - {hop['status']} {hop['url']} → {hop['location']}")
+            self.out(f"Tiempo (s)      : {page.check_time:.3f}")
+            for label, msecs in page.get_timings():
+                self.out(f" - {label:<13} : {msecs:>9.1f} ms")
             for value in page.values.all():
                 self.out(f"{value.name:<15} : {value.value}")
             outgoing_links = list(page.outgoing_links.all())
@@ -409,13 +710,273 @@ class Command(BaseCommand):
             return
         num = options['num']
         gap = options['gap']
-        for result in check_site(site, num):
+        for result in check_site(site, num, gap):
             if self.is_verbose:
                 self.out(str(result))
-            if num > 1:
-                time.sleep(gap)
+        if self.is_verbose:
+            self.show_pool_stats(site)
+            self.out(f'Ritmo de peticiones: {site.get_rate_controller()}')
         heartbeat()
 
+    async def _crawl(self, crawler, num):
+        async for result in crawler.crawl(num):
+            if self.is_verbose:
+                self.out(str(result))
+
+    def cmd_crawl(self, options):
+        name = options['name']
+        site = load_site(name)
+        if not site:
+            self.failure(f'No existe el site [bold]{name}[/]')
+            return
+        if options['rate']:
+            site.max_rate = options['rate']
+            site.get_rate_controller(rate=site.max_rate).configure(
+                rate=site.max_rate,
+                max_rate=site.max_rate,
+                )
+        sink = None
+        if options['batch'] > 0:
+            sink = ResultSink(max_pages=options['batch'], max_delay=options['batch_delay'])
+        crawler = AsyncCrawler(
+            site,
+            concurrency=options['concurrency'],
+            per_host=options['per_host'],
+            sink=sink,
+            )
+        with sink if sink is not None else contextlib.nullcontext():
+            asyncio.run(self._crawl(crawler, options['num']))
+        if sink is not None:
+            stats = sink.stats()
+            self.out(
+                f'Escritos {stats["pages"]} resultados en {stats["flushes"]} lotes.'
+                f' Latencia media: {stats["mean_ms"]} ms, máxima: {stats["max_ms"]} ms'
+                )
+        if self.is_verbose:
+            self.show_pool_stats(site)
+        heartbeat()
+
+    def cmd_bench(self, options):
+        synthetic = SyntheticSite(
+            num_pages=options['pages'],
+            fan_out=options['fan_out'],
+            asset_ratio=options['assets'],
+            error_rate=options['errors'],
+            redirect_rate=options['redirects'],
+            seed=options['seed'],
+            )
+        engines = ['check', 'crawl'] if options['engine'] == 'all' else [options['engine']]
+        table = Table(show_header=True, header_style="bold", title='Benchmark')
+        table.add_column("Motor")
+        table.add_column("Páginas", justify="right")
+        table.add_column("Errores", justify="right")
+        table.add_column("Páginas/s", justify="right")
+        table.add_column("Peticiones/página", justify="right")
+        table.add_column("Consultas/página", justify="right")
+        table.add_column("Peak RSS (MiB)", justify="right")
+        for engine in engines:
+            result = run_benchmark(
+                synthetic,
+                engine=engine,
+                latency=options['latency'],
+                latency_dist=options['latency_dist'],
+                concurrency=options['concurrency'],
+                )
+            table.add_row(
+                engine,
+                str(result.num_pages),
+                str(result.num_errors),
+                f'{result.pages_per_second:.1f}',
+                f'{result.requests_per_page:.2f}',
+                f'{result.queries_per_page:.1f}',
+                f'{result.peak_rss:.1f}',
+                )
+        self.console.print(table)
+
+    def cmd_replay(self, options):
+        name = options['name']
+        site = load_site(name)
+        if not site:
+            self.failure(f'No existe el site [bold]{name}[/]')
+            return
+        if not site.archive_dir:
+            self.failure(f'El site [bold]{name}[/] no tiene archivo de respuestas')
+            return
+        if options['id']:
+            page = site.load_page(options['id'])
+            if not page:
+                self.failure('La página indicada no existe')
+                return
+            results = [replay_page(page)]
+        else:
+            results = replay_site(site, options['num'])
+        num_ok = num_errors = 0
+        for result in results:
+            if result:
+                num_ok += 1
+            else:
+                num_errors += 1
+            if self.is_verbose:
+                self.out(str(result))
+        self.out(f'Páginas reprocesadas: {num_ok} {OK}  Errores: {num_errors} {ERROR}')
+
+    def cmd_external(self, options):
+        if options['errors']:
+            self.show_external_errors(options['name'])
+            return
+        ttl = TimeDelta(hours=options['ttl'])
+        for result in check_external_urls(options['num'], ttl):
+            if self.is_verbose:
+                self.out(str(result))
+        heartbeat()
+
+    def show_external_errors(self, name):
+        site = load_site(name)
+        if not site:
+            self.failure(f'No existe el site [bold]{name}[/]')
+            return
+        all_errors = site.external_urls_with_errors()
+        if not all_errors:
+            self.out(f"Este site no contiene por ahora ningún enlace externo roto {OK}")
+            return
+        title = f"Hay {len(all_errors)} enlaces externos con errores"
+        table = Table(show_header=True, header_style="bold", title=title)
+        table.add_column("URL")
+        table.add_column("Enlazada desde")
+        table.add_column("Checked at", justify="right")
+        table.add_column("Status code", justify="right")
+        for external_url in all_errors:
+            pages = site.pages.filter(external_links__to_url=external_url)
+            table.add_row(
+                external_url.url,
+                '\n'.join(page.get_relative_url() for page in pages[:5]),
+                str(external_url.checked_at),
+                as_status_code(external_url.status),
+            )
+        self.console.print(table)
+
+    def cmd_dedup(self, options):
+        name = options['name']
+        site = load_site(name)
+        if not site:
+            self.failure(f'No existe el site [bold]{name}[/]')
+            return
+        num_groups = 0
+        for result in dedup_site(site, dry_run=options['dry_run']):
+            num_groups += 1
+            if self.is_verbose or options['dry_run']:
+                self.out(str(result))
+        self.out(f'Páginas con duplicados: {num_groups} {OK}')
+
+    def cmd_similar(self, options):
+        name = options['name']
+        site = load_site(name)
+        if not site:
+            self.failure(f'No existe el site [bold]{name}[/]')
+            return
+        if not site.detect_near_duplicates:
+            self.out(
+                f'El site [bold]{name}[/] no calcula las huellas simhash'
+                ' (Ver el campo detect_near_duplicates)'
+                )
+        groups = site.near_duplicate_pages(options['distance'])
+        for num, group in enumerate(groups, start=1):
+            table = Table(title=f'Grupo {num}: {len(group)} páginas')
+            table.add_column("Id", justify="right")
+            table.add_column("URL")
+            for page in group:
+                table.add_row(str(page.pk), page.get_relative_url())
+            self.console.print(table)
+        if groups:
+            self.out('Candidatas a excluir del rastreo, o a normalizar su URL')
+        self.out(f'Grupos de páginas casi duplicadas: {len(groups)} {OK}')
+
+    def cmd_exclude(self, options):
+        name = options['name']
+        site = load_site(name)
+        if not site:
+            self.failure(f'No existe el site [bold]{name}[/]')
+            return
+        if options['remove']:
+            deleted, _ = site.excludes.filter(pk=options['remove']).delete()
+            if not deleted:
+                self.failure(f'No existe la regla {options["remove"]}')
+                return
+            self.out(f'Regla {options["remove"]} borrada {OK}')
+        for kind in ('prefix', 'glob', 'regex'):
+            pattern = options[kind]
+            if pattern:
+                try:
+                    rule, removed = site.add_exclude_rule(kind, pattern)
+                except re.error as err:
+                    self.failure(f'Expresión regular no válida: {err}')
+                    return
+                self.out(
+                    f'Regla {rule.pk} ({rule}): {removed} páginas'
+                    f' pendientes sacadas de la frontera {OK}'
+                    )
+        table = Table(title=f'Reglas de exclusión de {site.name}')
+        table.add_column("Id", justify="right")
+        table.add_column("Tipo")
+        table.add_column("Patrón")
+        table.add_column("Sacadas de la frontera", justify="right")
+        for rule in site.excludes.all():
+            table.add_row(str(rule.pk), rule.kind, rule.pattern, str(rule.removed))
+        self.console.print(table)
+
+    def cmd_traps(self, options):
+        name = options['name']
+        site = load_site(name)
+        if not site:
+            self.failure(f'No existe el site [bold]{name}[/]')
+            return
+        groups = site.throttled_groups()
+        table = Table(title=f'Posibles trampas en {site.name} (Máximo de variantes: {site.max_variants})')
+        table.add_column("Plantilla")
+        table.add_column("Motivo")
+        table.add_column("Admitidas", justify="right")
+        table.add_column("Descartadas", justify="right")
+        table.add_column("Ejemplo")
+        for group in groups:
+            table.add_row(
+                group.template,
+                group.reason,
+                str(group.admitted),
+                str(group.throttled),
+                group.example,
+                )
+        self.console.print(table)
+        self.out(f'Grupos con variantes descartadas: {len(groups)} {OK}')
+
+    def cmd_frontier(self, options):
+        name = options['name']
+        site = load_site(name)
+        if not site:
+            self.failure(f'No existe el site [bold]{name}[/]')
+            return
+        if options.get('rebuild'):
+            created = FrontierEntry.rebuild(site)
+            self.out(f'Entradas añadidas a la frontera: {created} {OK}')
+        if options.get('expire'):
+            expired = FrontierEntry.expire(site)
+            self.out(f'Arrendamientos caducados liberados: {expired} {OK}')
+        now = just_now()
+        entries = site.frontier.all()
+        table = Table(title=f'Frontera de {site.name}')
+        table.add_column("Entradas", justify="right")
+        table.add_column("Pendientes ahora", justify="right")
+        table.add_column("Arrendadas", justify="right")
+        table.add_column("Caducadas", justify="right")
+        table.add_column("Sin entrada", justify="right")
+        table.add_row(
+            str(entries.count()),
+            str(entries.filter(priority__lte=now.timestamp()).count()),
+            str(entries.filter(leased_until__gte=now).count()),
+            str(entries.filter(leased_until__lt=now).count()),
+            str(site.pages.filter(frontier_entry=None).count()),
+            )
+        self.console.print(table)
+
     def cmd_recheck(self, options):
         name = options['name']
         site = load_site(name)
@@ -425,6 +986,9 @@ class Command(BaseCommand):
         id_page = int(options.get('id', 0))
         if id_page == 0:
             page = site.next_page_to_check()
+            if not page:
+                self.failure('No hay ninguna página pendiente de comprobar')
+                return
         else:
             page = load_page(site, id_page)
             if not page:
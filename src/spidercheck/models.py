@@ -1,29 +1,67 @@
 #!/usr/bin/env python3
 
 from datetime import timedelta as TimeDelta
+from http.client import HTTPMessage
 from typing import Union, Self, Optional, Iterator, Iterable
-from urllib.parse import urlunparse, urlparse, urljoin
+from urllib.parse import urlunparse, urlparse, urljoin, urldefrag
 from urllib.robotparser import RobotFileParser
-from urllib.request import Request, urlopen
 
 import functools
 import logging
-import random
+import operator
 import re
+import time
 
 from django.core.exceptions import ObjectDoesNotExist
+from django.db import connection
 from django.db import models
+from django.db import transaction
 from django.db.models import Count
+from django.db.models import Sum
 from django.db.models.functions import Now
 
 import fechas
 from results import Success, Failure
 from seqtools import first
+from spidercheck.archive import Archive
+from spidercheck.archive import ArchiveError
+from spidercheck.archive import get_archive
+from spidercheck.canonical import DEFAULT_DOCUMENTS
+from spidercheck.canonical import DEFAULT_DROP_PARAMS
+from spidercheck.canonical import get_canonicalizer
+from spidercheck.exclusion import Excluder
+from spidercheck.exclusion import get_excluder
+from spidercheck.exclusion import KINDS as EXCLUDE_KINDS
+from spidercheck.exclusion import Rule
+from spidercheck.fetcher import fetch
+from spidercheck.fetcher import get_conditional_headers
+from spidercheck.fingerprint import content_hash as get_content_hash
+from spidercheck.fingerprint import MAX_DISTANCE
+from spidercheck.fingerprint import near_duplicates
+from spidercheck.frontier import LEASE_TIME
+from spidercheck.frontier import next_priority
+from spidercheck.frontier import worker_id
 from spidercheck.parser import LinkExtractor
+from spidercheck.politeness import find_controller
+from spidercheck.politeness import get_controller
+from spidercheck.pool import get_pool
+from spidercheck.robots import find_rules
+from spidercheck.robots import get_rules
+from spidercheck.robots import MAX_ROBOTS_SIZE
+from spidercheck.robots import ROBOTS_ERROR_TTL
+from spidercheck.robots import ROBOTS_TTL
+from spidercheck.timings import as_table as timings_as_table
+from spidercheck.traps import MAX_VARIANTS
+from spidercheck.traps import TOO_MANY
+from spidercheck.traps import trap_reason
+from spidercheck.traps import url_template
 
 
 TABLESPACE = 'spidercheck'
 
+#: Número máximo de elementos de cada consulta o inserción por lotes
+BULK_SIZE = 500
+
 _logger = logging.getLogger(__name__)
 _logger.setLevel(logging.DEBUG)
 
@@ -48,6 +86,102 @@ class Site(models.Model):
     netloc = models.CharField(max_length=128)
     path = models.CharField(max_length=280)
     created_at = models.DateTimeField(auto_now_add=True)
+    #: Comprobar las páginas con una única petición `GET`
+    single_request = models.BooleanField(
+        default=True,
+        help_text=(
+            'Comprobar las páginas con una única petición GET,'
+            ' en vez de HEAD + GET'
+            ),
+        )
+    #: Tamaño máximo del contenido a descargar de cada página
+    max_body_size = models.PositiveIntegerField(
+        default=10 * 1024 * 1024,
+        help_text='Tamaño máximo, en bytes, del contenido a descargar',
+        )
+    #: Ritmo máximo de peticiones por segundo al servidor
+    max_rate = models.FloatField(
+        default=5.0,
+        help_text='Número máximo de peticiones por segundo al servidor',
+        )
+    #: Registrar los enlaces a URL externas para comprobarlos
+    check_external_links = models.BooleanField(
+        default=True,
+        help_text='Registrar los enlaces externos para comprobarlos',
+        )
+    #: Directorio donde archivar el contenido descargado (Vacío: no se archiva)
+    archive_dir = models.CharField(
+        max_length=255,
+        default='',
+        blank=True,
+        help_text='Directorio donde archivar el contenido de las páginas descargadas',
+        )
+    #: Número máximo de conexiones persistentes por servidor
+    pool_size = models.PositiveSmallIntegerField(
+        default=4,
+        help_text='Número máximo de conexiones persistentes por servidor',
+        )
+    #: Segundos que una conexión persistente puede estar inactiva
+    pool_idle_timeout = models.FloatField(
+        default=30.0,
+        help_text='Segundos que una conexión persistente puede estar inactiva',
+        )
+    #: Añadir los enlaces a la frontera según se descarga cada página
+    stream_links = models.BooleanField(
+        default=False,
+        help_text=(
+            'Analizar el contenido de las páginas según se descarga, añadiendo'
+            ' los enlaces nuevos a la frontera sin esperar a que termine'
+            ),
+        )
+    #: Número máximo de variantes de cada plantilla de URL con
+    #: parámetros (Ver módulo ``traps``)
+    max_variants = models.PositiveIntegerField(
+        default=MAX_VARIANTS,
+        help_text=(
+            'Número máximo de páginas con la misma plantilla de URL (Ruta sin'
+            ' números y nombres de los parámetros). Solo se aplica a las URL'
+            ' con parámetros. 0 si no hay límite'
+            ),
+        )
+    #: Calcular la huella ``simhash`` del texto de las páginas
+    detect_near_duplicates = models.BooleanField(
+        default=False,
+        help_text=(
+            'Calcular la huella simhash del texto de las páginas, para'
+            ' detectar las páginas casi duplicadas'
+            ),
+        )
+    #: Parámetros que se descartan al normalizar las URL (Ver módulo ``canonical``)
+    canonical_drop_params = models.CharField(
+        max_length=512,
+        default=' '.join(DEFAULT_DROP_PARAMS),
+        blank=True,
+        help_text=(
+            'Parámetros de las URL que se descartan, separados por espacios.'
+            ' Se admiten comodines, como utm_*'
+            ),
+        )
+    #: Ordenar los parámetros al normalizar las URL
+    canonical_sort_params = models.BooleanField(
+        default=True,
+        help_text='Ordenar los parámetros de las URL por su nombre',
+        )
+    #: Pasar a minúsculas las rutas al normalizar las URL
+    canonical_lowercase = models.BooleanField(
+        default=False,
+        help_text='Pasar las rutas de las URL a minúsculas',
+        )
+    #: Documentos por defecto que se eliminan al normalizar las URL
+    canonical_default_documents = models.CharField(
+        max_length=256,
+        default=' '.join(DEFAULT_DOCUMENTS),
+        blank=True,
+        help_text=(
+            'Documentos por defecto, separados por espacios, que se eliminan'
+            ' del final de las rutas (p.ej. index.html)'
+            ),
+        )
 
     @classmethod
     def load_site_by_name(cls, name: str) -> Optional[Self]:
@@ -107,12 +241,159 @@ class Site(models.Model):
             '',
         ])
 
-    def get_robots_txt(self):
-        url = self.url('robots.txt')
-        robot_parser = RobotFileParser()
-        robot_parser.set_url(url)
-        robot_parser.read()
-        return robot_parser
+    def get_http_client(self):
+        """Devuelve la reserva de conexiones HTTP de este *site*.
+
+        La reserva se mantiene durante toda la vida del proceso, de
+        forma que las conexiones persistentes se reutilizan entre las
+        distintas comprobaciones de páginas del *site*.
+
+        Returns:
+
+            Una instancia de ``pool.ConnectionPool``.
+        """
+        return get_pool(
+            self.pk,
+            max_size=self.pool_size,
+            idle_timeout=self.pool_idle_timeout,
+            )
+
+    def get_archive(self) -> Optional[Archive]:
+        """Devuelve el archivo de respuestas del *site*, si tiene.
+
+        Returns:
+
+            Una instancia de ``archive.Archive``, o ``None`` si el
+            *site* no tiene definido el directorio ``archive_dir``.
+        """
+        return get_archive(self.archive_dir)
+
+    def canonicalize(self, url: str) -> str:
+        """Normaliza una URL según la configuración del *site*.
+
+        Ver el módulo ``canonical``.
+
+        Params:
+
+            - url (str): Una URL, absoluta o relativa.
+
+        Returns:
+
+            La URL normalizada, sin fragmento.
+        """
+        canonicalizer = get_canonicalizer(
+            tuple(self.canonical_drop_params.split()),
+            self.canonical_sort_params,
+            self.canonical_lowercase,
+            tuple(self.canonical_default_documents.split()),
+            )
+        return canonicalizer(url)
+
+    def get_rate_controller(self, rate=0.5):
+        """Devuelve el regulador del ritmo de peticiones al servidor.
+
+        El regulador se comparte entre todos los *sites* alojados en el
+        mismo servidor, y se mantiene durante toda la vida del proceso.
+        Al crearlo se consulta la directiva ``Crawl-delay`` del fichero
+        ``robots.txt``, si existe, y se vuelve a aplicar cada vez que
+        se renueva el fichero (Ver ``get_robots_txt``).
+
+        Params:
+
+            - rate (float): Ritmo inicial, en peticiones por segundo,
+              si hay que crear el regulador. Para cambiar el ritmo de
+              un regulador ya creado, ver ``RateController.configure``.
+
+        Returns:
+
+            Una instancia de ``politeness.RateController``.
+        """
+        key = (self.scheme, self.netloc)
+        controller = find_controller(key)
+        if controller is not None:
+            return controller
+        return get_controller(
+            key,
+            rate=rate,
+            max_rate=self.max_rate,
+            crawl_delay=self.get_crawl_delay(),
+            )
+
+    def get_crawl_delay(self) -> Optional[float]:
+        """Valor de la directiva ``Crawl-delay`` del ``robots.txt``.
+
+        Returns:
+
+            El número de segundos a esperar entre peticiones, o
+            ``None`` si no se especifica o no se puede obtener.
+        """
+        try:
+            delay = self.get_robots_txt().crawl_delay('*')
+        except Exception as err:
+            _logger.warning("Imposible leer robots.txt de %s: %s", self, err)
+            return None
+        return float(delay) if delay else None
+
+    def get_robots_txt(self, offline: bool = False) -> RobotFileParser:
+        """Devuelve las reglas del fichero ``robots.txt`` del *site*.
+
+        Las reglas se mantienen en memoria y en la base de datos
+        (Modelo ``RobotsTxt``) hasta que caducan; solo entonces se
+        vuelve a pedir el fichero al servidor. Ver el módulo ``robots``.
+        Al cargar de nuevo las reglas, se actualiza el ``Crawl-delay``
+        del regulador del ritmo de peticiones, si ya existe.
+
+        Params:
+
+            - offline (bool): Opcional. Si es verdadero, nunca se pide
+              el fichero al servidor; se usa la última copia
+              almacenada, aunque haya caducado.
+
+        Returns:
+
+            Una instancia de ``RobotFileParser``, ya interpretada.
+        """
+        rules = find_rules(self.pk, fechas.just_now())
+        if rules is None:
+            robots_txt, _ = RobotsTxt.objects.get_or_create(site=self)
+            if robots_txt.is_expired() and not offline:
+                robots_txt.refresh()
+            rules = robots_txt.get_rules()
+            controller = find_controller((self.scheme, self.netloc))
+            if controller is not None:
+                controller.configure(crawl_delay=float(rules.crawl_delay('*') or 0))
+        return rules
+
+    def get_bandwidth(self) -> dict:
+        """Ahorro de ancho de banda conseguido gracias a la compresión.
+
+        Solo se tienen en cuenta las páginas cuyo contenido se ha
+        descargado.
+
+        Returns:
+
+            Un diccionario con los bytes transferidos (``wire_bytes``),
+            los bytes una vez descomprimidos (``size_bytes``) y el
+            porcentaje ahorrado (``saved``).
+        """
+        totals = (
+            self.pages
+            .filter(wire_bytes__gt=0)
+            .aggregate(
+                wire_bytes=Sum('wire_bytes'),
+                size_bytes=Sum('size_bytes'),
+                )
+            )
+        wire_bytes = totals['wire_bytes'] or 0
+        size_bytes = totals['size_bytes'] or 0
+        saved = 0.0
+        if size_bytes > 0:
+            saved = round((size_bytes - wire_bytes) * 100.0 / size_bytes, 2)
+        return {
+            'wire_bytes': wire_bytes,
+            'size_bytes': size_bytes,
+            'saved': saved,
+            }
 
     def progress(self):
         total = self.pages.count()
@@ -158,40 +439,75 @@ class Site(models.Model):
             .order_by('-checked_at')
         )
 
+    def external_urls_with_errors(self) -> list:
+        """Enlaces externos rotos enlazados desde alguna página del *site*.
+
+        Returns:
+
+            Una lista de instancias de ``ExternalUrl``, ya comprobadas y
+            cuyo código de estado no está en el rango 2xx.
+        """
+        return list(
+            ExternalUrl.objects
+            .filter(links__from_page__site=self)
+            .exclude(status=0)
+            .exclude(status__range=(200, 299))
+            .distinct()
+            .order_by('url')
+            )
+
     def all_scheduled_pages(self):
         return ScheduledPage.objects.filter(page__site_id=self.pk).all()
 
     def first_page_with_errors(self):
         return first(self.pages_with_errors())
 
-    def next_page_to_check(self):
-        """Devuelve la siguiente dirección en la forntera a comprobar,
+    def next_page_to_check(self, exclude=()):
+        """Devuelve la siguiente dirección en la frontera a comprobar,
+        y la arrienda para este proceso (Ver el módulo ``frontier``).
+
+        - Si hay páginas programadas (Ver modelo `ScheduledPage`) y ya se
+          ha llegado el momento de procesarlas de nuevo, se devuelve la
+          primera de ellas.
 
-        - Si hay páginas programadas (Vér modelo `ScheduledPage`) y ya se ha llegado
-        el momento de procesarlas de nuevo, se devuelve la primera de ellas
+        - Si no, se devuelve la página con menor prioridad de la
+          frontera (Modelo ``FrontierEntry``) que no esté arrendada por
+          otro proceso: las páginas nuevas por orden de llegada, y las
+          ya comprobadas cuando les toca volver a comprobarse, antes si
+          tenían errores.
 
-        - Si hay páginas con errores, con una probabilidad del 50%, se intenta
-        volver a procesar la página que más tiempo llava en la lista de páginas
-        con errores.
+        Si no queda ninguna disponible, pero hay páginas del *site* sin
+        entrada en la frontera (Por ejemplo, en una base de datos
+        anterior a la frontera), se crean sus entradas y se vuelve a
+        intentar (Ver ``FrontierEntry.rebuild``).
 
-        - Si no hay errores, o si, habiendolos, se decidió no volver a procesarlos,
-        se devuelve la siguiente página en la forntera propiamente dicha.
+        Params:
+
+            - exclude (set): Opcional. Claves primarias de páginas que no
+              se deben devolver, por ejemplo, porque ya se están
+              comprobando en este momento.
 
         Returns:
 
-            La siguiente página a ser procesada.
+            La siguiente página a ser procesada, o ``None`` si no hay
+            ninguna disponible a la que ya le toque comprobarse.
         """
-        scheduled = first(
+        scheduled = list(
             self.all_scheduled_pages()
             .filter(watermark__lt=Now())
+            .exclude(page_id__in=exclude)
+            .values_list('page_id', flat=True)
             )
         if scheduled:
-            return scheduled.page
-        if self.pages_with_errors().count() > 0 and random.random() <= 0.50:
-            return self.pages_with_errors().last()
-        if self.all_queued_pages().count() > 0:
-            return self.all_queued_pages().first()
-        return self.pages.all().order_by('checked_at').first()
+            # El momento de comprobarlas lo decide su rotación
+            pages = FrontierEntry.lease(self, 1, exclude=exclude, only=scheduled, due=False)
+            if pages:
+                return pages[0]
+        pages = FrontierEntry.lease(self, 1, exclude=exclude)
+        if not pages and self.pages.filter(frontier_entry=None).exists():
+            FrontierEntry.rebuild(self)
+            pages = FrontierEntry.lease(self, 1, exclude=exclude)
+        return first(pages)
 
     def is_local(self, url) -> bool:
         """Verdadero si la ruta pasada es local al *site*.
@@ -226,6 +542,14 @@ class Site(models.Model):
         devuelve. El objetivo es nunca crear la misma página dos veces en la
         base de datos.
 
+        Si otro proceso, o hilo, crea la misma página a la vez, la
+        restricción ``unique_full_path`` lo impide; en ese caso se
+        devuelve la página creada por el otro.
+
+        Antes de crear una página se comprueba que no sea una trampa
+        para rastreadores (Ver ``admit_new_pages``). Si lo es, no se
+        crea.
+
         Params:
 
             subpath (str) : Ruta de la página.
@@ -235,7 +559,8 @@ class Site(models.Model):
 
         Returns:
 
-            Una instancia de la clase `Page`.
+            Una tupla con la página, o ``None`` si se ha descartado por
+            ser una posible trampa, y un indicador de si se ha creado.
         """
         found = first(self.pages.extra(
             where=["subpath = %s AND params = %s"],
@@ -243,13 +568,8 @@ class Site(models.Model):
             ))
         if found:
             return found, False
-        new_page = Page(
-            site=self,
-            subpath=subpath,
-            params=params,
-            )
-        new_page.save()
-        return new_page, True
+        pages, inserted = self.admit_new_pages([(subpath, params)])
+        return pages.get((subpath, params)), (subpath, params) in inserted
 
     def add_page(self, url):
         info = urlparse(url)
@@ -259,8 +579,159 @@ class Site(models.Model):
         )
         if created:
             _logger.info("added new_url to check: %s", url)
+        elif page is None:
+            _logger.info("throttled new_url: %s", url)
         return page, created
 
+    def load_or_create_many(self, paths: Iterable[tuple[str, str]]) -> dict:
+        """Devuelve varias páginas del site, creando las que no existan.
+
+        Es la versión por lotes de ``load_or_create``: las páginas que
+        ya existen se buscan con una sola consulta (Por cada
+        ``BULK_SIZE`` rutas), y las nuevas se crean a la vez, si no son
+        posibles trampas (Ver ``admit_new_pages``). Si otro proceso
+        crea alguna de las páginas a la vez, se usa la suya.
+
+        Params:
+
+            - paths (Iterable[tuple]): Tuplas con la ruta y los
+              parámetros de cada página.
+
+        Returns:
+
+            Un diccionario, cuyas claves son las tuplas de ruta y
+            parámetros, y los valores las páginas. Las páginas
+            descartadas no se incluyen.
+        """
+        paths = set(paths)
+        found = self._load_many(paths)
+        missing = paths - found.keys()
+        if missing:
+            created, _ = self.admit_new_pages(sorted(missing))
+            found.update(created)
+        return found
+
+    def _load_many(self, paths: set) -> dict:
+        subpaths = sorted({subpath for subpath, _ in paths})
+        found = {}
+        for start in range(0, len(subpaths), BULK_SIZE):
+            queryset = (
+                self.pages
+                .filter(subpath__in=subpaths[start:start + BULK_SIZE])
+                .only('pk', 'site', 'subpath', 'params', 'is_linkable')
+                )
+            for page in queryset:
+                key = (page.subpath, page.params)
+                if key in paths:
+                    found[key] = page
+        return found
+
+    def admit_new_pages(self, paths: Iterable[tuple[str, str]]) -> tuple[dict, set]:
+        """Crea las páginas nuevas que pueden entrar en la frontera.
+
+        Se descartan las rutas sospechosas y, de cada plantilla de URL
+        con parámetros, las variantes que superen el máximo del *site*
+        (Campo ``max_variants``). Cada descarte se contabiliza en el
+        grupo de su plantilla (Modelo ``TrapGroup``). Ver el módulo
+        ``traps``.
+
+        Las páginas admitidas se crean y se añaden a la frontera en la
+        misma transacción que bloquea los grupos, de forma que el
+        contador de variantes admitidas de cada grupo solo incluye las
+        páginas realmente creadas, y no las que otro proceso haya
+        creado a la vez.
+
+        Params:
+
+            - paths (Iterable[tuple]): Tuplas con la ruta y los
+              parámetros de cada página nueva, que todavía no existe.
+
+        Returns:
+
+            Una tupla con un diccionario de las páginas admitidas, cuyas
+            claves son las tuplas de ruta y parámetros, y el conjunto
+            de tuplas de las páginas creadas por esta llamada.
+        """
+        by_template = {}
+        for subpath, params in paths:
+            template = url_template(subpath, params)
+            by_template.setdefault(template, []).append((subpath, params))
+        admitted = set()
+        rejected = {}
+        for template, candidates in list(by_template.items()):
+            valid = []
+            for subpath, params in candidates:
+                reason = trap_reason(subpath)
+                if reason:
+                    rejected.setdefault(template, []).append(((subpath, params), reason))
+                else:
+                    valid.append((subpath, params))
+            if self.max_variants and '?' in template:
+                by_template[template] = valid
+            else:
+                admitted.update(valid)
+                del by_template[template]
+        templates = sorted(set(by_template) | set(rejected))
+        with transaction.atomic():
+            groups = []
+            if templates:
+                TrapGroup.objects.bulk_create(
+                    [TrapGroup(site=self, template=template) for template in templates],
+                    batch_size=BULK_SIZE,
+                    ignore_conflicts=True,
+                    )
+                for start in range(0, len(templates), BULK_SIZE):
+                    groups.extend(
+                        self.trap_groups
+                        .select_for_update()
+                        .filter(template__in=templates[start:start + BULK_SIZE])
+                        )
+            for group in groups:
+                valid = by_template.get(group.template, [])
+                free = max(0, self.max_variants - group.admitted)
+                admitted.update(valid[:free])
+                by_template[group.template] = valid[:free]
+                throttled = rejected.get(group.template, [])
+                throttled += [(path, TOO_MANY) for path in valid[free:]]
+                if throttled:
+                    (subpath, params), group.reason = throttled[-1]
+                    group.example = f'{subpath}?{params}' if params else subpath
+                    group.throttled += len(throttled)
+            pages, inserted = self._create_pages(admitted)
+            for group in groups:
+                group.admitted += len(inserted.intersection(by_template.get(group.template, [])))
+            TrapGroup.objects.bulk_update(
+                groups,
+                ['admitted', 'throttled', 'reason', 'example'],
+                batch_size=BULK_SIZE,
+                )
+        return pages, inserted
+
+    def _create_pages(self, paths: set) -> tuple[dict, set]:
+        # Si otro proceso crea alguna de las páginas a la vez, se usa la
+        # suya, pero no cuenta como creada aquí
+        if not paths:
+            return {}, set()
+        before = self._load_many(paths)
+        Page.objects.bulk_create(
+            [
+                Page(site=self, subpath=subpath, params=params)
+                for subpath, params in sorted(paths - before.keys())
+                ],
+            batch_size=BULK_SIZE,
+            ignore_conflicts=True,
+            )
+        pages = self._load_many(paths)
+        inserted = pages.keys() - before.keys()
+        FrontierEntry.enqueue(self, [pages[key] for key in sorted(inserted)])
+        return pages, inserted
+
+    def throttled_groups(self):
+        """Grupos de URL con variantes descartadas, de más a menos
+        descartes. Ver el modelo ``TrapGroup``.
+        """
+        return self.trap_groups.filter(throttled__gt=0).order_by('-throttled', 'template')
+
     def search(self, query, use_regex=False):
         if use_regex:
             pat_re = re.compile(query, re.IGNORECASE)
@@ -272,9 +743,87 @@ class Site(models.Model):
             for page in self.pages.filter(subpath__icontains=query).order_by('-status', 'pk'):
                 yield page
 
-    @functools.lru_cache
-    def get_excluded_subpaths(self):
-        return {_.subpath for _ in self.excludes.all()}
+    def get_excluder(self) -> Excluder:
+        """Devuelve las reglas de exclusión del *site*, ya compiladas.
+
+        Incluye las reglas por defecto. Ver el modelo ``ExcludeRule`` y
+        el módulo ``exclusion``.
+
+        Returns:
+
+            Una instancia de ``exclusion.Excluder``, que se puede usar
+            como una función: devuelve verdadero si la URL relativa que
+            se le pasa está excluida.
+        """
+        rules = self.excludes.order_by('pk').values_list('kind', 'pattern')
+        return get_excluder(tuple(rules))
+
+    def add_exclude_rule(self, kind: str, pattern: str) -> tuple:
+        """Añade una regla de exclusión, y saca de la frontera las
+        páginas pendientes de comprobar que excluye.
+
+        Params:
+
+            - kind (str): Tipo de regla: ``prefix``, ``glob`` o
+              ``regex`` (Ver el módulo ``exclusion``).
+
+            - pattern (str): El patrón.
+
+        Returns:
+
+            Una tupla con la regla (``ExcludeRule``) y el número de
+            páginas pendientes borradas. Si el patrón es una
+            expresión regular no válida, se eleva ``re.error``.
+        """
+        if kind not in EXCLUDE_KINDS:
+            raise ValueError(f'Tipo de regla de exclusión desconocido: {kind}')
+        is_excluded = Excluder([Rule(kind, pattern)])
+        with transaction.atomic():
+            rule, _ = ExcludeRule.objects.get_or_create(
+                site=self,
+                kind=kind,
+                pattern=pattern,
+                )
+            pending = self.pages.filter(is_checked=False).values_list('pk', 'subpath', 'params')
+            removed = [
+                pk
+                for pk, subpath, params in pending
+                if is_excluded(urlunparse(['', '', urljoin(self.path, subpath), '', params, '']))
+                ]
+            if removed:
+                self.pages.filter(pk__in=removed).delete()
+                rule.removed += len(removed)
+                rule.save(update_fields=['removed'])
+        return rule, len(removed)
+
+    def near_duplicate_pages(self, max_distance: int = MAX_DISTANCE) -> list[list]:
+        """Grupos de páginas del *site* con un texto casi idéntico.
+
+        Solo se tienen en cuenta las páginas con huella ``simhash``
+        (Ver el campo ``detect_near_duplicates``). Ver
+        ``fingerprint.near_duplicates``.
+
+        Params:
+
+            - max_distance (int): Número máximo de bits distintos entre
+              las huellas de dos páginas casi duplicadas.
+
+        Returns:
+
+            Una lista de grupos (listas de páginas), de mayor a menor
+            tamaño.
+        """
+        fingerprints = dict(
+            self.pages
+            .exclude(simhash=None)
+            .values_list('pk', 'simhash')
+            )
+        groups = near_duplicates(fingerprints, max_distance)
+        pages = self.pages.in_bulk([pk for group in groups for pk in group])
+        return [
+            sorted((pages[pk] for pk in group), key=lambda page: page.get_relative_url())
+            for group in groups
+            ]
 
     def count_values(self, name):
         queryset = (
@@ -292,6 +841,83 @@ class Site(models.Model):
             }
 
 
+class RobotsTxt(models.Model):
+    """Copia del fichero ``robots.txt`` de un *site*.
+
+    Se comparte entre todos los procesos que rastrean el *site*, y se
+    vuelve a pedir al servidor, con una petición condicional, cuando
+    caduca. Ver el módulo ``robots``.
+    """
+
+    class Meta:
+        db_table = f'"{TABLESPACE}"."robots_txt"'
+        verbose_name = 'Fichero robots.txt'
+        verbose_name_plural = 'Ficheros robots.txt'
+
+    site = models.OneToOneField(
+        Site,
+        related_name='robots_txt',
+        on_delete=models.CASCADE,
+        primary_key=True,
+        )
+    #: Código de estado con el que respondió el servidor (0 si nunca)
+    status = models.IntegerField(default=0)
+    body = models.TextField(default='', blank=True)
+    etag = models.CharField(max_length=256, default='', blank=True)
+    last_modified = models.CharField(max_length=64, default='', blank=True)
+    fetched_at = models.DateTimeField(default=fechas.EPOCH)
+    expires_at = models.DateTimeField(default=fechas.EPOCH)
+
+    def __str__(self):
+        return f'robots.txt de {self.site}'
+
+    def is_expired(self) -> bool:
+        """Verdadero si hay que volver a pedir el fichero al servidor.
+        """
+        return self.status == 0 or self.expires_at <= fechas.just_now()
+
+    def refresh(self):
+        """Vuelve a pedir el fichero al servidor y guarda el resultado.
+
+        Si tenemos una copia válida, la petición es condicional, y si
+        el servidor responde que no ha cambiado, solo se amplía el
+        plazo de caducidad.
+        """
+        validators = {}
+        if 200 <= self.status < 300:
+            validators = get_conditional_headers(self.etag, self.last_modified)
+        result = fetch(
+            self.site.url('robots.txt'),
+            client=self.site.get_http_client(),
+            headers=validators,
+            max_bytes=MAX_ROBOTS_SIZE,
+            )
+        now = fechas.just_now()
+        self.fetched_at = now
+        self.expires_at = now + ROBOTS_TTL
+        if result.is_success():
+            response = result.value
+            if not response.is_not_modified():
+                self.status = response.status
+                self.body = response.body or ''
+                self.etag = response.etag
+                self.last_modified = response.last_modified
+        elif 400 <= int(result.code) < 500:
+            self.status = int(result.code)
+            self.body = self.etag = self.last_modified = ''
+        else:
+            # Error temporal: se mantiene la copia anterior, si existe
+            if self.status == 0:
+                self.status = int(result.code)
+            self.expires_at = now + ROBOTS_ERROR_TTL
+        self.save()
+
+    def get_rules(self) -> RobotFileParser:
+        """Devuelve las reglas interpretadas, usando la caché en memoria.
+        """
+        return get_rules(self.site_id, self.body, self.status, self.expires_at)
+
+
 class Page(models.Model):
 
     class Meta:
@@ -339,9 +965,35 @@ class Page(models.Model):
     status = models.IntegerField(default=0)
     created_at = models.DateTimeField(auto_now_add=True)
     size_bytes = models.BigIntegerField(default=0)
+    #: Bytes transferidos, que pueden ser menos que `size_bytes` si
+    #: el servidor comprime el contenido
+    wire_bytes = models.BigIntegerField(default=0)
+    #: El contenido superaba el tamaño máximo y se procesó solo en parte
+    is_truncated = models.BooleanField(default=False)
     content_type = models.CharField(max_length=32, default='')
     error_message = models.CharField(max_length=512, default='')
     is_linkable = models.BooleanField(default=True)
+    #: Validadores de la última respuesta, para peticiones condicionales
+    etag = models.CharField(max_length=256, default='', blank=True)
+    last_modified = models.CharField(max_length=64, default='', blank=True)
+    #: Huella SHA-256 del último contenido procesado
+    content_hash = models.CharField(max_length=64, default='', blank=True)
+    #: Huella SHA-256 del conjunto de enlaces internos del último contenido
+    links_hash = models.CharField(max_length=64, default='', blank=True)
+    #: Huella ``simhash`` del texto del último contenido procesado
+    simhash = models.BigIntegerField(null=True, blank=True)
+    #: Milisegundos empleados en cada fase de la última comprobación
+    timings = models.JSONField(default=dict, blank=True)
+    #: Si la página redirige a otra página del *site*, la página final
+    alias_of = models.ForeignKey(
+        'self',
+        related_name='aliases',
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        )
+    #: Redirecciones seguidas en la última comprobación
+    redirects = models.JSONField(default=list, blank=True)
 
     @classmethod
     def load_page(cls, pk: int) -> Optional[Self]:
@@ -352,11 +1004,83 @@ class Page(models.Model):
         except cls.DoesNotExist:
             return None
 
+    def is_alias(self) -> bool:
+        """Verdadero si la página redirige a otra página del *site*.
+        """
+        return self.alias_of_id is not None
+
+    def update_alias(self, final_url: str, redirects: list):
+        """Actualiza las redirecciones de la página.
+
+        Si la página redirige a otra URL local, se marca como alias de
+        la página final, que se añade a la frontera si no existía.
+
+        Params:
+
+            - final_url (str): La URL final, después de seguir las
+              redirecciones.
+
+            - redirects (list): Las redirecciones seguidas. Ver
+              ``fetcher.Response``.
+        """
+        self.redirects = redirects
+        self.alias_of = None
+        if redirects and final_url != self.get_full_url() and self.site.is_local(final_url):
+            target, _ = self.site.add_page(final_url)
+            if target is not None and target.pk != self.pk:
+                self.alias_of = target
+
+    def merge(self, duplicate: Self):
+        """Fusiona en esta página otra que es un duplicado suyo.
+
+        Los enlaces, entrantes y salientes, y los alias del duplicado
+        pasan a esta página, sin repetir los que ya tenga, y a
+        continuación se borra el duplicado. Ver ``core.dedup_site``.
+
+        Params:
+
+            - duplicate (Page): La página duplicada, que se borra.
+        """
+        with transaction.atomic():
+            incoming = duplicate.incoming_links.all()
+            incoming.filter(from_page=self).delete()
+            incoming.filter(
+                from_page__in=self.incoming_links.values('from_page'),
+                ).delete()
+            incoming.update(to_page=self)
+            outgoing = duplicate.outgoing_links.all()
+            outgoing.filter(to_page=self).delete()
+            outgoing.filter(
+                to_page__in=self.outgoing_links.values('to_page'),
+                ).delete()
+            outgoing.update(from_page=self)
+            duplicate.aliases.exclude(pk=self.pk).update(alias_of=self)
+            if self.alias_of_id == duplicate.pk:
+                self.alias_of = None
+            # Los enlaces salientes ya no son los de su contenido
+            self.links_hash = ''
+            self.save(update_fields=['alias_of', 'links_hash'])
+            duplicate.delete()
+
+    def get_timings(self) -> list[tuple[str, float]]:
+        """Tiempos de cada fase de la última comprobación.
+
+        Returns:
+
+            Una lista de tuplas con la descripción de la fase y los
+            milisegundos empleados, en el orden en que se ejecutan las
+            fases. Ver el módulo ``timings``.
+        """
+        return timings_as_table(self.timings or {})
+
     def get_all_valid_links(self, html_text: str) -> Iterable[str]:
         """Lista todos los enlaces encontrados en una página HTML.
 
         Si son enlaces externos, o están excluidos en el `robots.txt`,
-        no se consideran válidas y no se incluyen den el resultado.
+        no se consideran válidas y no se incluyen den el resultado. Los
+        enlaces se normalizan según la configuración del *site* (Ver
+        ``Site.canonicalize``), así que las distintas variantes de una
+        misma URL solo aparecen una vez como página.
 
         Params:
 
@@ -367,16 +1091,85 @@ class Page(models.Model):
             Un iterador que va devolviendo todos los enlaces internos válidos
             encontrados en el texto de la página.
         """
-        parser = LinkExtractor()
-        parser.feed(html_text)
-        robot_parser = self.site.get_robots_txt()
-        for link in parser.all_links():
-            url = urljoin(self.get_full_url(), link)
-            if url == self.get_full_url():
+        local_links, _ = self.classify_links(html_text)
+        yield from local_links
+
+    def classify_links(
+            self,
+            html_text: str,
+            offline: bool = False,
+            document=None,
+            ) -> tuple[list[str], list[str]]:
+        """Separa los enlaces de una página HTML en internos y externos.
+
+        Params:
+
+            - html_text (str): Texto completo de la página.
+
+            - offline (bool): Opcional. No pedir el ``robots.txt`` al
+              servidor, aunque haya caducado.
+
+            - document (HtmlDocument): Opcional. El contenido de la
+              página ya analizado (Ver el módulo ``document``). Si se
+              indica, no se vuelve a analizar el texto.
+
+        Returns:
+
+            Una tupla con dos listas. La primera, los enlaces internos
+            válidos, como rutas relativas normalizadas (Ver
+            ``get_all_valid_links`` y ``Site.canonicalize``).
+            La segunda, los enlaces externos ``http`` o ``https``, como
+            URL absolutas.
+        """
+        if document is None:
+            parser = LinkExtractor()
+            parser.feed(html_text)
+        else:
+            parser = document
+        return self.classify_urls(parser.all_links(), offline=offline)
+
+    def classify_urls(
+            self,
+            links: Iterable[str],
+            offline: bool = False,
+            ) -> tuple[list[str], list[str]]:
+        """Separa una lista de enlaces de la página en internos y externos.
+
+        Params:
+
+            - links (Iterable[str]): Los enlaces, tal y como aparecen en
+              la página.
+
+            - offline (bool): Opcional. No pedir el ``robots.txt`` al
+              servidor, aunque haya caducado.
+
+        Returns:
+
+            Una tupla con dos listas, igual que ``classify_links``.
+        """
+        robot_parser = self.site.get_robots_txt(offline=offline)
+        is_excluded = self.site.get_excluder()
+        full_url = self.get_full_url()
+        relative_url = self.get_relative_url()
+        local_links = []
+        external_links = []
+        for link in links:
+            if link.startswith('/') and not link.startswith('//') and is_excluded(link):
+                # Enlace relativo al servidor excluido: se descarta
+                # sin ni siquiera resolverlo
+                continue
+            url = urljoin(full_url, link)
+            if url == full_url:
                 continue
-            if self.site.is_local(url) and robot_parser.can_fetch("*", link):
-                link = urljoin(self.get_relative_url(), link)
-                yield link
+            if self.site.is_local(url):
+                if robot_parser.can_fetch("*", link):
+                    local_url = self.site.canonicalize(urljoin(relative_url, link))
+                    local_path = urlparse(local_url)._replace(scheme='', netloc='').geturl()
+                    if local_url != relative_url and not is_excluded(local_path):
+                        local_links.append(local_url)
+            elif urlparse(url).scheme in ('http', 'https'):
+                external_links.append(urldefrag(url).url)
+        return local_links, external_links
 
     def is_ok(self) -> bool:
         """verdadero si y solo si el código de respuesta está en el rango 2xx.
@@ -440,21 +1233,40 @@ class Page(models.Model):
             Una instancia de `Success` si es correcta, o una instancia
             de `Failure` en caso contrario.
         """
-        url = self.get_full_url()
-        status_code = -1
-        headers={'Accept-Encoding': 'identity'}
-        request = Request(method='HEAD', url=url, headers=headers)
-        try:
-            with urlopen(request) as req:
-                if 200 <= req.status < 300:
-                    return Success()
-                return Failure('El servidor devuelve un código de error {req.status}')
-        except Exception as err:
-            return Failure(str(err), code=status_code)
+        result = fetch(
+            self.get_full_url(),
+            'HEAD',
+            client=self.site.get_http_client(),
+            )
+        if result.is_failure():
+            return result
+        if 200 <= result.value.status < 300:
+            return result
+        return Failure(
+            f'El servidor devuelve un código de error {result.value.status}',
+            code=result.value.status,
+            )
 
     def __str__(self) -> str:
         return self.get_full_url()
 
+    def get_conditional_headers(self) -> dict:
+        """Cabeceras para revalidar la página con una petición condicional.
+
+        Solo se usan si el contenido de la página se procesó
+        correctamente en la última comprobación, ya que una respuesta
+        ``304`` implica que no se vuelven a procesar ni los enlaces ni
+        los *plugins*.
+
+        Returns:
+
+            Un diccionario con las cabeceras ``If-None-Match`` y/o
+            ``If-Modified-Since``. Puede estar vacío.
+        """
+        if not self.content_hash or not self.is_ok():
+            return {}
+        return get_conditional_headers(self.etag, self.last_modified)
+
     def waiting_time(self) -> TimeDelta:
         """Devuelve el lapso de tiempo desde la última comprobación.
         
@@ -502,6 +1314,288 @@ class Page(models.Model):
 
 
 
+class FrontierEntry(models.Model):
+    """Entrada de una página en la frontera.
+
+    Guarda la prioridad de la página (Cuanto menor, antes se comprueba)
+    y, si algún proceso la está comprobando, hasta cuándo y quién la
+    tiene arrendada. Ver el módulo ``frontier``.
+    """
+
+    class Meta:
+        db_table = f'"{TABLESPACE}"."frontier_entry"'
+        verbose_name = 'Entrada de la frontera'
+        verbose_name_plural = 'Frontera'
+        indexes = [
+            models.Index(fields=['site', 'priority'], name='frontier_site_priority'),
+        ]
+
+    page = models.OneToOneField(
+        Page,
+        related_name='frontier_entry',
+        on_delete=models.CASCADE,
+        primary_key=True,
+        )
+    site = models.ForeignKey(
+        Site,
+        related_name='frontier',
+        on_delete=models.CASCADE,
+        )
+    #: Momento, en segundos desde el *epoch*, en que toca comprobarla
+    priority = models.FloatField(default=0.0)
+    #: Fin del arrendamiento, si algún proceso la está comprobando
+    leased_until = models.DateTimeField(null=True, blank=True, default=None)
+    #: Proceso que la tiene arrendada (Ver ``frontier.worker_id``)
+    leased_by = models.CharField(max_length=128, default='', blank=True)
+
+    def __str__(self):
+        return f'{self.page_id} ({self.priority})'
+
+    @classmethod
+    def enqueue(cls, site, pages: Iterable):
+        """Añade a la frontera páginas nuevas, por orden de llegada.
+
+        Las páginas que ya tengan entrada no se modifican.
+        """
+        priority = fechas.just_now().timestamp()
+        cls.objects.bulk_create(
+            [cls(page=page, site=site, priority=priority) for page in pages],
+            batch_size=BULK_SIZE,
+            ignore_conflicts=True,
+            )
+
+    @classmethod
+    def lease(
+            cls,
+            site,
+            num: int = 1,
+            worker: Optional[str] = None,
+            exclude: Iterable[int] = (),
+            only: Optional[Iterable[int]] = None,
+            duration: TimeDelta = LEASE_TIME,
+            due: bool = True,
+            ) -> list:
+        """Arrienda las siguientes páginas de la frontera de un *site*.
+
+        Las entradas se eligen por prioridad, saltándose las arrendadas
+        por otros procesos, con ``SELECT ... FOR UPDATE SKIP LOCKED``
+        en las bases de datos que lo admiten: los procesos que
+        arriendan a la vez no se esperan, y nunca reciben la misma
+        página. Solo se eligen las entradas a las que ya les toca
+        comprobarse (Prioridad anterior al momento actual), salvo que
+        se indique lo contrario con ``due``.
+
+        Params:
+
+            - site (Site): El *site*.
+
+            - num (int): Número máximo de páginas.
+
+            - worker (str): Opcional. Identificador del proceso (Por
+              defecto, ``frontier.worker_id()``).
+
+            - exclude (Iterable[int]): Opcional. Claves primarias de
+              páginas que no se deben devolver.
+
+            - only (Iterable[int]): Opcional. Elegir solo entre estas
+              páginas.
+
+            - duration (timedelta): Duración del arrendamiento.
+
+            - due (bool): Opcional. Si es falso, se eligen también las
+              entradas a las que todavía no les toca comprobarse.
+
+        Returns:
+
+            Una lista de páginas, por orden de prioridad.
+        """
+        now = fechas.just_now()
+        with transaction.atomic():
+            queryset = (
+                cls.objects
+                .select_for_update(skip_locked=True)
+                .filter(site=site)
+                .filter(models.Q(leased_until=None) | models.Q(leased_until__lt=now))
+                .exclude(page_id__in=list(exclude))
+                )
+            if only is not None:
+                queryset = queryset.filter(page_id__in=list(only))
+            if due:
+                queryset = queryset.filter(priority__lte=now.timestamp())
+            page_ids = list(queryset.order_by('priority').values_list('page_id', flat=True)[:num])
+            if not page_ids:
+                return []
+            cls.objects.filter(page_id__in=page_ids).update(
+                leased_until=now + duration,
+                leased_by=worker or worker_id(),
+                )
+        pages = Page.objects.in_bulk(page_ids)
+        return [pages[pk] for pk in page_ids if pk in pages]
+
+    @classmethod
+    def complete(cls, page):
+        """Devuelve una página comprobada a la frontera.
+
+        La nueva prioridad depende del resultado de la comprobación, y
+        de si está programada (Ver ``frontier.next_priority``).
+        """
+        cls.complete_many([page])
+
+    @classmethod
+    def complete_many(cls, pages: Iterable):
+        """Devuelve varias páginas comprobadas a la frontera, a la vez.
+
+        Es la versión por lotes de ``complete``; la usa
+        ``sink.ResultSink`` para escribirlas en la misma transacción
+        que sus resultados.
+        """
+        pages = list(pages)
+        if not pages:
+            return
+        rotations = dict(
+            ScheduledPage.objects
+            .filter(page__in=pages)
+            .values_list('page_id', 'rotation')
+            )
+        now = fechas.just_now()
+        cls.objects.bulk_create(
+            [
+                cls(
+                    page=page,
+                    site_id=page.site_id,
+                    priority=next_priority(now, page.status, rotations.get(page.pk)),
+                    leased_until=None,
+                    leased_by='',
+                    )
+                for page in pages
+                ],
+            batch_size=BULK_SIZE,
+            update_conflicts=True,
+            unique_fields=['page'],
+            update_fields=['priority', 'leased_until', 'leased_by'],
+            )
+
+    @classmethod
+    def expire(cls, site=None) -> int:
+        """Libera los arrendamientos caducados.
+
+        Las páginas con el arrendamiento caducado ya se pueden volver
+        a arrendar; esto solo borra la marca.
+
+        Params:
+
+            - site (Site): Opcional. Solo las páginas de este *site*.
+
+        Returns:
+
+            El número de arrendamientos liberados.
+        """
+        queryset = cls.objects.filter(leased_until__lt=fechas.just_now())
+        if site is not None:
+            queryset = queryset.filter(site=site)
+        return queryset.update(leased_until=None, leased_by='')
+
+    @classmethod
+    def rebuild(cls, site) -> int:
+        """Crea las entradas de las páginas del *site* que no la tengan.
+
+        Las páginas sin comprobar toman como prioridad su fecha de
+        creación; las comprobadas, la que les correspondería según su
+        última comprobación.
+
+        Returns:
+
+            El número de entradas creadas.
+        """
+        entries = []
+        for page in site.pages.filter(frontier_entry=None).iterator():
+            if page.is_checked and page.checked_at:
+                priority = next_priority(page.checked_at, page.status)
+            else:
+                priority = page.created_at.timestamp()
+            entries.append(cls(page=page, site=site, priority=priority))
+        cls.objects.bulk_create(entries, batch_size=BULK_SIZE, ignore_conflicts=True)
+        return len(entries)
+
+
+class ExcludeRule(models.Model):
+    """Regla de exclusión de URL de un *site*.
+
+    Las páginas cuya URL cumple alguna regla no se añaden a la
+    frontera. Ver el módulo ``exclusion`` y ``Site.get_excluder``.
+    """
+
+    class Meta:
+        db_table = f'"{TABLESPACE}"."exclude_rule"'
+        verbose_name = 'Regla de exclusión'
+        verbose_name_plural = 'Reglas de exclusión'
+        ordering = ['site', 'pk']
+        constraints = [
+            models.UniqueConstraint(
+                fields=['site', 'kind', 'pattern'],
+                name='unique_exclude_rule'
+            ),
+        ]
+
+    KIND_CHOICES = [(kind, kind) for kind in EXCLUDE_KINDS]
+
+    id_exclude_rule = models.BigAutoField(primary_key=True)
+    site = models.ForeignKey(
+        Site,
+        related_name='excludes',
+        on_delete=models.CASCADE,
+        )
+    #: Tipo de regla: ``prefix``, ``glob`` o ``regex``
+    kind = models.CharField(max_length=8, choices=KIND_CHOICES, default='prefix')
+    pattern = models.CharField(max_length=512)
+    #: Número de páginas pendientes que se sacaron de la frontera
+    removed = models.IntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f'{self.kind} {self.pattern}'
+
+
+class TrapGroup(models.Model):
+    """Grupo de URL de un *site* con la misma plantilla.
+
+    Lleva la cuenta de las páginas admitidas en la frontera y de las
+    descartadas por ser posibles trampas para rastreadores. Ver el
+    módulo ``traps`` y ``Site.admit_new_pages``.
+    """
+
+    class Meta:
+        db_table = f'"{TABLESPACE}"."trap_group"'
+        verbose_name = 'Grupo de URL'
+        verbose_name_plural = 'Grupos de URL'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['site', 'template'],
+                name='unique_trap_template'
+            ),
+        ]
+
+    id_trap_group = models.BigAutoField(primary_key=True)
+    site = models.ForeignKey(
+        Site,
+        related_name='trap_groups',
+        on_delete=models.CASCADE,
+        )
+    #: Plantilla de las URL (Ver ``traps.url_template``)
+    template = models.CharField(max_length=2048)
+    #: Número de páginas admitidas en la frontera
+    admitted = models.IntegerField(default=0)
+    #: Número de páginas descartadas
+    throttled = models.IntegerField(default=0)
+    #: Motivo del último descarte: ``variants``, ``depth`` o ``repeat``
+    reason = models.CharField(max_length=16, default='', blank=True)
+    #: Última URL descartada
+    example = models.CharField(max_length=2048, default='', blank=True)
+
+    def __str__(self):
+        return self.template
+
+
 class Link(models.Model):
     """
     El modelo Link (Enlace).
@@ -554,6 +1648,239 @@ class Link(models.Model):
     )
 
 
+class ExternalUrl(models.Model):
+    """Enlace externo, compartido por todos los *sites*.
+
+    Cada URL externa se almacena una única vez, aunque la enlacen miles
+    de páginas de distintos *sites*, y se comprueba como mucho una vez
+    en el plazo indicado (Ver ``core.check_external_urls``). Las
+    páginas que la enlazan se guardan en el modelo ``ExternalLink``.
+    """
+
+    class Meta:
+        db_table = f'"{TABLESPACE}"."external_url"'
+        verbose_name = 'Enlace externo'
+        verbose_name_plural = 'Enlaces externos'
+        ordering = ['checked_at']
+
+    id_external_url = models.BigAutoField(primary_key=True)
+    url = models.CharField(max_length=1024, unique=True)
+    #: Código de estado de la última comprobación (0 si nunca)
+    status = models.IntegerField(default=0)
+    error_message = models.CharField(max_length=512, default='')
+    checked_at = models.DateTimeField(default=fechas.EPOCH)
+    #: Segundos empleados en la última comprobación
+    check_time = models.FloatField(default=0.0)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return self.url
+
+    def is_ok(self) -> bool:
+        return 200 <= self.status < 300
+
+    def is_checked(self) -> bool:
+        return self.status != 0
+
+    @classmethod
+    def load_or_create_many(cls, urls: Iterable[str]) -> dict:
+        """Devuelve varias URL externas, creando las que no existan.
+
+        Las que ya existen se buscan con una sola consulta (Por cada
+        ``BULK_SIZE`` URL), y las nuevas se crean a la vez. Si otro
+        proceso crea alguna de ellas a la vez, se usa la suya.
+
+        Params:
+
+            - urls (Iterable[str]): Las URL.
+
+        Returns:
+
+            Un diccionario, cuyas claves son las URL y los valores las
+            instancias de ``ExternalUrl``.
+        """
+        urls = sorted(set(urls))
+        found = cls._load_many(urls)
+        missing = [url for url in urls if url not in found]
+        if missing:
+            cls.objects.bulk_create(
+                [cls(url=url) for url in missing],
+                batch_size=BULK_SIZE,
+                ignore_conflicts=True,
+                )
+            found.update(cls._load_many(missing))
+        return found
+
+    @classmethod
+    def _load_many(cls, urls: list) -> dict:
+        found = {}
+        for start in range(0, len(urls), BULK_SIZE):
+            queryset = (
+                cls.objects
+                .filter(url__in=urls[start:start + BULK_SIZE])
+                .only('pk', 'url')
+                )
+            found.update((external_url.url, external_url) for external_url in queryset)
+        return found
+
+    def check(self, client=None) -> Union[Success, Failure]:
+        """Comprueba la URL y guarda el resultado.
+
+        Se usa una petición ``HEAD``. Si falla, porque algunos
+        servidores no la admiten o responden de forma distinta, se
+        repite con una petición ``GET`` de un único *byte* (Cabecera
+        ``Range``), sin leer el contenido.
+
+        Params:
+
+            - client (ConnectionPool): Opcional. La reserva de
+              conexiones a usar.
+
+        Returns:
+
+            El resultado de la petición, una instancia de ``Success`` o
+            de ``Failure``.
+        """
+        info = urlparse(self.url)
+        controller = get_controller((info.scheme, info.netloc))
+        start_time = time.time()
+        result = fetch(self.url, 'HEAD', client=client, controller=controller)
+        if result.is_failure() and int(result.code) >= 400:
+            result = fetch(
+                self.url,
+                'GET',
+                want_body=lambda response: False,
+                client=client,
+                headers={'Range': 'bytes=0-0'},
+                controller=controller,
+                )
+        self.checked_at = fechas.just_now()
+        self.check_time = time.time() - start_time
+        if result.is_success():
+            self.status = result.value.status
+            self.error_message = ''
+        else:
+            self.status = int(result.code)
+            self.error_message = result.error_message[:512]
+        self.save()
+        return result
+
+
+class ExternalLink(models.Model):
+    """Enlace de una página a una URL externa.
+    """
+
+    class Meta:
+        db_table = f'"{TABLESPACE}"."external_link"'
+        verbose_name = 'Enlace a URL externa'
+        verbose_name_plural = 'Enlaces a URL externas'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['from_page', 'to_url'],
+                name='unique_from_page_to_url'
+            ),
+        ]
+
+    id_external_link = models.BigAutoField(primary_key=True)
+    from_page = models.ForeignKey(
+        Page,
+        related_name='external_links',
+        on_delete=models.CASCADE,
+    )
+    to_url = models.ForeignKey(
+        ExternalUrl,
+        related_name='links',
+        on_delete=models.CASCADE,
+    )
+
+
+class ArchivedResponse(models.Model):
+    """Índice del archivo de respuestas.
+
+    Indica en qué segmento, y en qué posición, está archivado el
+    contenido de una página descargado en un momento dado. Ver el
+    módulo ``archive``.
+    """
+
+    class Meta:
+        db_table = f'"{TABLESPACE}"."archived_response"'
+        verbose_name = 'Respuesta archivada'
+        verbose_name_plural = 'Respuestas archivadas'
+        ordering = ['page', '-fetched_at']
+        indexes = [
+            models.Index(fields=['page', 'fetched_at']),
+        ]
+
+    id_archived_response = models.BigAutoField(primary_key=True)
+    page = models.ForeignKey(
+        Page,
+        related_name='archived',
+        on_delete=models.CASCADE,
+    )
+    fetched_at = models.DateTimeField()
+    status = models.IntegerField(default=200)
+    segment = models.CharField(max_length=128)
+    offset = models.BigIntegerField()
+    length = models.IntegerField()
+    content_hash = models.CharField(max_length=64, default='', blank=True)
+
+    def __str__(self):
+        return f'{self.page} ({self.fetched_at})'
+
+    @classmethod
+    def store(cls, page, response, fetched_at) -> Self:
+        """Archiva el contenido de una respuesta.
+
+        Params:
+
+            - page (Page): La página comprobada.
+
+            - response (fetcher.Response): La respuesta, con el contenido.
+
+            - fetched_at (datetime): Fecha y hora de la descarga.
+
+        Returns:
+
+            La entrada del índice, ya guardada en la base de datos.
+        """
+        archive = page.site.get_archive()
+        header = {
+            'page': page.pk,
+            'url': response.url,
+            'fetched_at': fetched_at.isoformat(),
+            'status': response.status,
+            'headers': list(response.headers.items()),
+            'is_truncated': response.is_truncated,
+            }
+        segment, offset, length = archive.append(header, response.body, page.site_id)
+        return cls.objects.create(
+            page=page,
+            fetched_at=fetched_at,
+            status=response.status,
+            segment=segment,
+            offset=offset,
+            length=length,
+            content_hash=get_content_hash(response.body),
+            )
+
+    def load(self) -> tuple[dict, HTTPMessage, str]:
+        """Lee la respuesta archivada, sin acceder a la red.
+
+        Returns:
+
+            Una tupla con los metadatos del registro, las cabeceras
+            HTTP y el contenido de la página.
+        """
+        archive = self.page.site.get_archive()
+        if archive is None:
+            raise ArchiveError(f'El site {self.page.site} no tiene archivo')
+        header, body = archive.read(self.segment, self.offset, self.page.site_id)
+        headers = HTTPMessage()
+        for name, value in header['headers']:
+            headers[name] = value
+        return header, headers, body
+
+
 class ValueManager(models.Manager):
 
     def get_by_natural_key(self, page, name):
@@ -662,6 +1989,87 @@ class Value(models.Model):
         _value.save()
         return _value
 
+    @classmethod
+    def bulk_upsert(cls, page, values: dict):
+        """Guarda todos los valores asociados a una página.
+
+        Se borran los valores de la página cuyo nombre no esté en
+        ``values``, con una sola consulta, y se añaden o modifican el
+        resto con otra, independientemente del número de valores. Ver
+        ``bulk_upsert_many``.
+
+        Params:
+
+            - page (Page): La página a la que se vinculan los valores.
+
+            - values (dict): Diccionario con los nombres y los valores.
+              Los valores se almacenan como cadenas de texto (Ver
+              ``upsert``).
+        """
+        cls.bulk_upsert_many({page: values})
+
+    @classmethod
+    def bulk_upsert_many(cls, values_by_page: dict):
+        """Guarda todos los valores asociados a varias páginas.
+
+        Con una sola consulta se borran los valores cuyo nombre ya no
+        está entre los de su página, y con otra (Por cada ``BULK_SIZE``
+        valores) se añaden o modifican el resto. En PostgreSQL se usa
+        ``INSERT ... ON CONFLICT ... DO UPDATE``, y solo se escriben las
+        filas cuyo valor ha cambiado; en el resto de bases de datos,
+        ``bulk_create`` con ``update_conflicts``.
+
+        Params:
+
+            - values_by_page (dict): Diccionario cuyas claves son las
+              páginas, y los valores, diccionarios con los nombres y
+              valores de cada una.
+        """
+        if not values_by_page:
+            return
+        stale = functools.reduce(operator.or_, [
+            models.Q(page=page) & ~models.Q(name__in=list(values))
+            for page, values in values_by_page.items()
+            ])
+        cls.objects.filter(stale).delete()
+        rows = [
+            (page.pk, name, str(value))
+            for page, values in values_by_page.items()
+            for name, value in values.items()
+            ]
+        if not rows:
+            return
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                for start in range(0, len(rows), BULK_SIZE):
+                    chunk = rows[start:start + BULK_SIZE]
+                    cursor.execute(
+                        cls._upsert_sql(len(chunk)),
+                        [field for row in chunk for field in row],
+                        )
+        else:
+            cls.objects.bulk_create(
+                [cls(page_id=page_id, name=name, value=value) for page_id, name, value in rows],
+                batch_size=BULK_SIZE,
+                update_conflicts=True,
+                unique_fields=['page', 'name'],
+                update_fields=['value'],
+                )
+
+    @classmethod
+    def _upsert_sql(cls, num_rows: int) -> str:
+        # Cada fila tiene tres parámetros: la clave primaria de la
+        # página, el nombre y el valor.
+        table = connection.ops.quote_name(cls._meta.db_table)
+        placeholders = ', '.join(['(%s, %s, %s)'] * num_rows)
+        return (
+            f'INSERT INTO {table} (page_id, name, value)'
+            f' VALUES {placeholders}'
+            ' ON CONFLICT (page_id, name) DO UPDATE'
+            ' SET value = EXCLUDED.value'
+            f' WHERE {table}.value IS DISTINCT FROM EXCLUDED.value'
+            )
+
     def natural_key(self) -> tuple[Page, str]:
         """Obtener los valores de la clave natural del valor.
 
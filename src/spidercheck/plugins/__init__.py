@@ -3,10 +3,37 @@
 from os.path import dirname
 from pathlib import Path
 import importlib
+import inspect
 
 BASE_PATH = Path(dirname(__file__))
 
 
+def accepts_document(process) -> bool:
+    """Verdadero si la función ``process`` de un plugin acepta el
+    parámetro ``document`` (Ver el módulo ``document``).
+
+    Los plugins antiguos solo aceptan los parámetros ``page``,
+    ``headers`` y ``body``, y se siguen llamando igual.
+
+    Examples:
+
+        >>> accepts_document(lambda page, headers, body: {})
+        False
+        >>> accepts_document(lambda page, headers, body, document=None: {})
+        True
+    """
+    try:
+        parameters = inspect.signature(process).parameters
+    except (TypeError, ValueError):
+        return False
+    if 'document' in parameters:
+        return True
+    return any(
+        parameter.kind is inspect.Parameter.VAR_KEYWORD
+        for parameter in parameters.values()
+        )
+
+
 class PluginRegistry:
 
     def __init__(self):
@@ -15,6 +42,7 @@ class PluginRegistry:
             for f in BASE_PATH.glob('*.py')
             if not f.stem.startswith('_')
             }
+        self.with_document = set()
         self._initialized = False
 
     def initialize(self):
@@ -23,6 +51,8 @@ class PluginRegistry:
                 _module = importlib.import_module(f'spidercheck.plugins.{module_name}')
                 _process = getattr(_module, 'process')
                 self.modules[module_name] = _process
+                if accepts_document(_process):
+                    self.with_document.add(module_name)
             self._initialized = True
 
     def get_all_plugins(self):
@@ -31,5 +61,10 @@ class PluginRegistry:
         for name in self.modules:
             yield name, self.modules[name]
 
+    def accepts_document(self, name) -> bool:
+        if not self._initialized:
+            self.initialize()
+        return name in self.with_document
+
 
 registry = PluginRegistry()
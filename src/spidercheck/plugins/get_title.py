@@ -21,6 +21,14 @@ functión tiene que cumplir las siguientes características:
 
         - `body`: El cuerpo de la respuesta obtenida de la petición
 
+    - Opcionalmente, puede aceptar un cuarto parámetro con nombre,
+      `document`: El contenido de la página ya analizado, una
+      instancia de `HtmlDocument` (Ver el módulo `document`), con
+      los enlaces, el título, las etiquetas `meta`, los encabezados
+      y el texto. Así el contenido se analiza una sola vez para
+      todos los plugins. Puede valer `None` si el plugin se llama
+      desde otro sitio.
+
     - Debe devolver un diccionario con los datos adicionales
       que queremos asociar a esta `url`.
 
@@ -28,23 +36,20 @@ functión tiene que cumplir las siguientes características:
       si no nos interesa aportar ninguna información nueva.
 
 En este ejemplo, se devuelve el contenido de la etiqueta `title`,
-si se encuentra en el cuerpo de la página. Si no se encuentra
+si se encuentra en el documento. Si no se encuentra
 se devuelve un diccionario vacio.
 
 Los otros dos parámetros --`url` y `header`-- son ignorados, en
 este ejemplo, pero aun así, la función debe aceptarlos.
 """
 
-from bs4 import BeautifulSoup
-
-from spidercheck.seqtools import first
+from spidercheck.document import parse_document
 
 
-def process(_page, _headers, body):
+def process(_page, _headers, body, document=None):
     '''Extraer el título de las páginas'''
-    soup = BeautifulSoup(body, 'html.parser')
-    page_title = first(soup.find_all('title'))
-    if page_title:
-        page_title = page_title.get_text().strip()
-        return {'title': page_title}
+    if document is None:
+        document = parse_document(body)
+    if document.title is not None:
+        return {'title': document.title}
     return {}
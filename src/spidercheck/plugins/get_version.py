@@ -2,14 +2,19 @@
 
 import re
 
+from spidercheck.fetcher import content_is_html
+
 
 PAT_VERSION = re.compile(r'<meta name="version" content="(\d+)">')
 
 
-def process(_page, headers, body):
+def process(_page, headers, body, document=None):
     '''Obtener el numero de versión.'''
-    from spidercheck.core import content_is_html
-    if content_is_html(headers):
+    if document is not None:
+        version = document.meta.get('version', '')
+        if version.isdigit():
+            return {'version': version}
+    elif content_is_html(headers):
         match = PAT_VERSION.search(body)
         if match:
             version = match.group(1)
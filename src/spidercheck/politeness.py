@@ -0,0 +1,251 @@
+#!/usr/bin/env python3
+
+"""
+Módulo ``politeness``
+------------------------------------------------------------------------
+
+Control adaptativo del ritmo de peticiones a un servidor.
+
+En vez de esperar un tiempo fijo entre cada comprobación, el ritmo de
+peticiones se regula con un **cubo de fichas** (*token bucket*) por
+servidor, cuya velocidad de recarga se ajusta según la respuesta del
+propio servidor:
+
+- Nunca se supera el ritmo indicado por la directiva ``Crawl-delay``
+  del fichero ``robots.txt``, si existe.
+
+- Si el servidor responde con ``429`` (*Too Many Requests*) o ``503``
+  (*Service Unavailable*), o no responde, se reduce el ritmo a la mitad
+  y se hace una pausa que crece de forma exponencial con cada error
+  consecutivo. Si el servidor incluye la cabecera ``Retry-After``, se
+  respeta.
+
+- Si el servidor responde rápido, se aumenta el ritmo poco a poco,
+  hasta el máximo permitido. Si responde lento, se reduce.
+"""
+
+from email.utils import parsedate_to_datetime
+from typing import Optional
+import threading
+import time
+
+
+#: Códigos de estado que indican que el servidor está sobrecargado
+OVERLOAD_CODES = frozenset([429, 503])
+
+#: Pausa máxima, en segundos, tras errores consecutivos
+MAX_BACKOFF = 300.0
+
+
+def parse_retry_after(value: Optional[str], now: Optional[float] = None) -> Optional[float]:
+    """Interpreta el valor de la cabecera ``Retry-After``.
+
+    Params:
+
+        - value (str): El valor de la cabecera. Puede ser un número de
+          segundos o una fecha HTTP.
+
+        - now (float): Marca temporal actual (Segundos desde el EPOCH).
+
+    Returns:
+
+        El número de segundos a esperar, o ``None`` si no se indica o
+        no se puede interpretar.
+
+    Examples:
+
+        >>> parse_retry_after('120')
+        120.0
+        >>> parse_retry_after('Wed, 21 Oct 2015 07:28:00 GMT', now=1445412470.0)
+        10.0
+        >>> parse_retry_after('mañana') is None
+        True
+    """
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        when = parsedate_to_datetime(value).timestamp()
+    except (TypeError, ValueError):
+        return None
+    now = time.time() if now is None else now
+    return max(0.0, when - now)
+
+
+class RateController:
+    """Regulador adaptativo del ritmo de peticiones a un servidor.
+
+    Params:
+
+        - rate (float): Ritmo inicial, en peticiones por segundo.
+
+        - max_rate (float): Ritmo máximo, en peticiones por segundo.
+
+        - min_rate (float): Ritmo mínimo, en peticiones por segundo.
+
+        - crawl_delay (float): Valor de la directiva ``Crawl-delay``
+          del ``robots.txt``, si existe. Limita el ritmo máximo.
+
+        - target_latency (float): Tiempo de respuesta, en segundos, por
+          debajo del cual se considera que el servidor va holgado.
+
+        - burst (float): Capacidad del cubo, es decir, número de
+          peticiones que se pueden realizar seguidas sin esperar.
+    """
+
+    def __init__(
+            self,
+            rate: float = 0.5,
+            max_rate: float = 5.0,
+            min_rate: float = 0.05,
+            crawl_delay: Optional[float] = None,
+            target_latency: float = 0.5,
+            burst: float = 1.0,
+            clock=time.monotonic,
+            sleep=time.sleep,
+            ):
+        self.limit = max_rate
+        self.crawl_delay = crawl_delay
+        self.lowest_rate = min_rate
+        self.rate = rate
+        self._apply_limits()
+        self.target_latency = target_latency
+        self.burst = burst
+        self.clock = clock
+        self.sleep = sleep
+        self.tokens = burst
+        self.updated = clock()
+        self.blocked_until = 0.0
+        self.errors = 0
+        self._lock = threading.Lock()
+
+    def __repr__(self):
+        return f'RateController(rate={self.rate:.3f}, max_rate={self.max_rate:.3f})'
+
+    def _apply_limits(self):
+        self.max_rate = self.limit
+        if self.crawl_delay:
+            self.max_rate = min(self.max_rate, 1.0 / self.crawl_delay)
+        self.min_rate = min(self.lowest_rate, self.max_rate)
+        self.rate = min(max(self.rate, self.min_rate), self.max_rate)
+
+    def configure(
+            self,
+            rate: Optional[float] = None,
+            max_rate: Optional[float] = None,
+            crawl_delay: Optional[float] = None,
+            ):
+        """Cambia los parámetros de un regulador ya creado.
+
+        Los parámetros que no se indican se mantienen.
+
+        Params:
+
+            - rate (float): Nuevo ritmo actual, en peticiones por
+              segundo.
+
+            - max_rate (float): Nuevo ritmo máximo, en peticiones por
+              segundo.
+
+            - crawl_delay (float): Nuevo valor de la directiva
+              ``Crawl-delay``. Cero si ya no existe.
+        """
+        with self._lock:
+            if max_rate is not None:
+                self.limit = max_rate
+            if crawl_delay is not None:
+                self.crawl_delay = crawl_delay
+            if rate is not None:
+                self.rate = rate
+            self._apply_limits()
+
+    def _refill(self, now):
+        elapsed = max(0.0, now - self.updated)
+        self.tokens = min(self.burst, self.tokens + elapsed * self.rate)
+        self.updated = now
+
+    def reserve(self) -> float:
+        """Reserva el turno para la siguiente petición.
+
+        Returns:
+
+            El número de segundos que hay que esperar antes de realizar
+            la petición.
+        """
+        with self._lock:
+            now = self.clock()
+            self._refill(now)
+            self.tokens -= 1.0
+            wait = 0.0
+            if self.tokens < 0:
+                wait = -self.tokens / self.rate
+            return max(wait, self.blocked_until - now)
+
+    def acquire(self):
+        """Espera, si es necesario, hasta que se pueda hacer la petición.
+        """
+        wait = self.reserve()
+        if wait > 0:
+            self.sleep(wait)
+
+    def feedback(self, status: int, latency: float, retry_after: Optional[str] = None):
+        """Ajusta el ritmo según el resultado de una petición.
+
+        Params:
+
+            - status (int): Código de estado de la respuesta, o ``-1``
+              si no se obtuvo respuesta.
+
+            - latency (float): Segundos hasta recibir la respuesta.
+
+            - retry_after (str): Valor de la cabecera ``Retry-After``,
+              si existe.
+        """
+        with self._lock:
+            now = self.clock()
+            if status in OVERLOAD_CODES or status < 0:
+                self.errors += 1
+                self.rate = max(self.min_rate, self.rate / 2.0)
+                delay = parse_retry_after(retry_after)
+                if delay is None:
+                    delay = (2 ** self.errors) / self.rate / 4.0
+                delay = min(MAX_BACKOFF, delay)
+                self.blocked_until = max(self.blocked_until, now + delay)
+                self.tokens = min(self.tokens, 0.0)
+                return
+            self.errors = 0
+            if latency <= self.target_latency:
+                self.rate = min(self.max_rate, self.rate * 1.1 + 0.01)
+            elif latency > 2 * self.target_latency:
+                self.rate = max(self.min_rate, self.rate * 0.8)
+
+
+_controllers = {}
+_controllers_lock = threading.Lock()
+
+
+def find_controller(key) -> Optional[RateController]:
+    """Devuelve el regulador asociado a una clave, si ya existe.
+    """
+    with _controllers_lock:
+        return _controllers.get(key)
+
+
+def get_controller(key, **kwargs) -> RateController:
+    """Devuelve el regulador asociado a una clave, normalmente un servidor.
+
+    El regulador se crea la primera vez que se solicita, con los
+    parámetros indicados, y se mantiene durante toda la vida del
+    proceso.
+
+    Returns:
+
+        Una instancia de ``RateController``.
+    """
+    with _controllers_lock:
+        controller = _controllers.get(key)
+        if controller is None:
+            controller = _controllers[key] = RateController(**kwargs)
+        return controller
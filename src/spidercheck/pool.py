@@ -0,0 +1,273 @@
+#!/usr/bin/env python3
+
+"""
+Módulo ``pool``
+------------------------------------------------------------------------
+
+Reserva (*pool*) de conexiones HTTP persistentes.
+
+En lugar de abrir una conexión nueva para cada petición, con el coste
+de establecer la conexión TCP y, para ``https``, la negociación TLS, las
+conexiones se devuelven a la reserva al terminar cada petición y se
+reutilizan en las siguientes peticiones al mismo servidor, mientras el
+servidor las mantenga abiertas (*keep-alive*).
+
+Cada *site* tiene su propia reserva, que dura lo que dure el proceso de
+rastreo. Ver ``Site.get_http_client``.
+"""
+
+from http.client import HTTPConnection, HTTPSConnection
+from http.client import HTTPException
+from urllib.parse import urlsplit
+import threading
+import time
+
+
+#: Número máximo de bytes a descartar para poder reutilizar una conexión
+#: cuya respuesta no queremos leer.
+MAX_DRAIN_BYTES = 64 * 1024
+
+#: Tiempo máximo de espera, en segundos, para las operaciones de red
+DEFAULT_TIMEOUT = 30.0
+
+
+class ConnectionPool:
+    """Reserva de conexiones HTTP persistentes, segura entre hilos.
+
+    Params:
+
+        - max_size (int): Número máximo de conexiones inactivas que se
+          conservan por servidor.
+
+        - idle_timeout (float): Segundos que una conexión puede
+          permanecer inactiva en la reserva antes de ser cerrada.
+
+        - timeout (float): Tiempo máximo de espera para las operaciones
+          de red.
+
+    Atributos:
+
+        handshakes (int): Número de conexiones nuevas establecidas.
+
+        reused (int): Número de peticiones que han reutilizado una
+            conexión existente, es decir, conexiones (y negociaciones
+            TLS) que nos hemos ahorrado.
+    """
+
+    def __init__(self, max_size=4, idle_timeout=30.0, timeout=DEFAULT_TIMEOUT):
+        self.max_size = max_size
+        self.idle_timeout = idle_timeout
+        self.timeout = timeout
+        self.handshakes = 0
+        self.reused = 0
+        self._idle = {}
+        self._lock = threading.Lock()
+
+    def __repr__(self):
+        return (
+            f'ConnectionPool(max_size={self.max_size!r},'
+            f' idle_timeout={self.idle_timeout!r})'
+            )
+
+    def stats(self) -> dict:
+        """Estadísticas de uso de la reserva.
+
+        Returns:
+
+            Un diccionario con el número de conexiones establecidas
+            (``handshakes``), reutilizadas (``reused``) y el número de
+            conexiones inactivas en este momento (``idle``).
+        """
+        with self._lock:
+            idle = sum(len(conns) for conns in self._idle.values())
+            return {
+                'handshakes': self.handshakes,
+                'reused': self.reused,
+                'idle': idle,
+                }
+
+    def _new_connection(self, key):
+        scheme, host, port = key
+        connection_class = HTTPSConnection if scheme == 'https' else HTTPConnection
+        with self._lock:
+            self.handshakes += 1
+        return connection_class(host, port, timeout=self.timeout)
+
+    def acquire(self, key):
+        """Obtiene una conexión para el servidor indicado.
+
+        Returns:
+
+            Una tupla con la conexión y un indicador lógico que vale
+            ``True`` si la conexión es reutilizada.
+        """
+        now = time.monotonic()
+        expired = []
+        connection = None
+        with self._lock:
+            idle = self._idle.get(key, [])
+            while idle:
+                candidate, last_used = idle.pop()
+                if now - last_used > self.idle_timeout:
+                    expired.append(candidate)
+                    continue
+                connection = candidate
+                self.reused += 1
+                break
+        for candidate in expired:
+            candidate.close()
+        if connection is not None:
+            return connection, True
+        return self._new_connection(key), False
+
+    def release(self, key, connection):
+        """Devuelve una conexión a la reserva para su reutilización.
+        """
+        with self._lock:
+            idle = self._idle.setdefault(key, [])
+            if len(idle) < self.max_size:
+                idle.append((connection, time.monotonic()))
+                return
+        connection.close()
+
+    def close(self):
+        """Cierra todas las conexiones inactivas.
+        """
+        with self._lock:
+            all_idle = list(self._idle.values())
+            self._idle = {}
+        for idle in all_idle:
+            for connection, _ in idle:
+                connection.close()
+
+    def request(self, method, url, headers=None, timings=None):
+        """Realiza una petición HTTP usando una conexión de la reserva.
+
+        Si una conexión reutilizada resulta haber sido cerrada por el
+        servidor, se reintenta la petición una vez con una conexión
+        nueva.
+
+        Si se indica ``timings`` (Ver ``timings.Timings``), se acumulan
+        en él los tiempos de las fases ``connect`` y ``ttfb``.
+
+        Returns:
+
+            Un objeto ``PooledResponse``. Es responsabilidad del
+            llamador invocar a su método ``release`` (o usarlo como
+            gestor de contexto) cuando haya terminado de leer.
+        """
+        info = urlsplit(url)
+        key = (info.scheme, info.hostname, info.port)
+        target = info.path or '/'
+        if info.query:
+            target = f'{target}?{info.query}'
+        while True:
+            connection, is_reused = self.acquire(key)
+            try:
+                start = time.perf_counter()
+                if not is_reused:
+                    connection.connect()
+                    connected = time.perf_counter()
+                    if timings is not None:
+                        timings.add('connect', connected - start)
+                    start = connected
+                connection.request(method, target, headers=headers or {})
+                response = connection.getresponse()
+                if timings is not None:
+                    timings.add('ttfb', time.perf_counter() - start)
+                return PooledResponse(self, key, connection, response, method)
+            except (HTTPException, ConnectionError) as err:
+                connection.close()
+                if not is_reused:
+                    raise err
+            except Exception:
+                connection.close()
+                raise
+
+
+class PooledResponse:
+    """Respuesta HTTP vinculada a una conexión de la reserva.
+
+    Al liberarla, si la respuesta se ha leído por completo (o quedan
+    pocos datos pendientes) y el servidor admite *keep-alive*, la
+    conexión vuelve a la reserva. En caso contrario se cierra.
+    """
+
+    def __init__(self, pool, key, connection, response, method):
+        self.pool = pool
+        self.key = key
+        self.connection = connection
+        self.response = response
+        self.method = method
+        self.status = response.status
+        self.headers = response.headers
+
+    def read(self, amt=None) -> bytes:
+        return self.response.read(amt)
+
+    def read1(self, amt=-1) -> bytes:
+        """Lee como mucho ``amt`` bytes, sin esperar a tenerlos todos.
+        """
+        return self.response.read1(amt)
+
+    def release(self):
+        if self.connection is None:
+            return
+        connection, self.connection = self.connection, None
+        response = self.response
+        try:
+            if not response.isclosed():
+                length = response.length
+                if length is None or length > MAX_DRAIN_BYTES:
+                    connection.close()
+                    return
+                response.read()
+        except (HTTPException, OSError):
+            connection.close()
+            return
+        if response.will_close:
+            connection.close()
+            return
+        self.pool.release(self.key, connection)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.release()
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(key, max_size=4, idle_timeout=30.0) -> ConnectionPool:
+    """Devuelve la reserva de conexiones asociada a una clave.
+
+    La reserva se crea la primera vez que se solicita, y se mantiene
+    durante toda la vida del proceso. Si cambian los parámetros de
+    configuración, se actualizan en la reserva existente.
+
+    Params:
+
+        - key: La clave de la reserva, normalmente la clave primaria
+          del *site*.
+
+        - max_size (int): Número máximo de conexiones inactivas por
+          servidor.
+
+        - idle_timeout (float): Tiempo máximo, en segundos, que una
+          conexión puede estar inactiva.
+
+    Returns:
+
+        Una instancia de ``ConnectionPool``.
+    """
+    with _pools_lock:
+        pool = _pools.get(key)
+        if pool is None:
+            pool = _pools[key] = ConnectionPool(max_size, idle_timeout)
+        else:
+            pool.max_size = max_size
+            pool.idle_timeout = idle_timeout
+        return pool
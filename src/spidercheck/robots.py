@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+
+"""
+Módulo ``robots``
+------------------------------------------------------------------------
+
+Interpretación y caché del fichero ``robots.txt`` de cada *site*.
+
+El contenido del fichero se almacena en la base de datos (Modelo
+``RobotsTxt``), con una fecha de caducidad, de forma que se comparte
+entre todos los procesos que estén rastreando el mismo *site*. Cuando
+caduca, se vuelve a pedir al servidor con una petición condicional.
+
+Las reglas se interpretan una sola vez por cada versión del fichero y
+se mantienen en memoria, de forma que comprobar si se puede visitar una
+URL no requiere ni peticiones HTTP ni consultas a la base de datos.
+
+Si el servidor responde al pedir el fichero con:
+
+- ``401`` o ``403``: No se puede visitar ninguna página.
+
+- Cualquier otro código ``4xx``: No hay restricciones.
+
+- Un código ``5xx``, o no responde: Si teníamos una versión anterior
+  del fichero, se sigue usando. En caso contrario, no se puede visitar
+  ninguna página. En ambos casos se vuelve a intentar pasado un tiempo
+  más corto (``ROBOTS_ERROR_TTL``).
+"""
+
+from datetime import timedelta as TimeDelta
+from typing import Optional
+from urllib.robotparser import RobotFileParser
+import threading
+
+from .fingerprint import content_hash
+
+
+#: Tiempo de validez del ``robots.txt`` almacenado
+ROBOTS_TTL = TimeDelta(hours=24)
+
+#: Tiempo tras el que se reintenta si no se pudo obtener el ``robots.txt``
+ROBOTS_ERROR_TTL = TimeDelta(minutes=30)
+
+#: Tamaño máximo del ``robots.txt`` que se procesa (500 KiB)
+MAX_ROBOTS_SIZE = 500 * 1024
+
+
+def is_disallow_all(status: int) -> bool:
+    """Verdadero si el código de estado impide visitar todo el *site*.
+
+    Examples:
+
+        >>> is_disallow_all(403)
+        True
+        >>> is_disallow_all(404)
+        False
+        >>> is_disallow_all(503)
+        True
+    """
+    if status in (401, 403):
+        return True
+    return status >= 500 or status < 0
+
+
+def compile_rules(body: str, status: int = 200) -> RobotFileParser:
+    """Interpreta el contenido de un fichero ``robots.txt``.
+
+    Params:
+
+        - body (str): El contenido del fichero.
+
+        - status (int): El código de estado con el que respondió el
+          servidor al pedir el fichero.
+
+    Returns:
+
+        Una instancia de ``RobotFileParser`` con las reglas ya
+        interpretadas.
+
+    Examples:
+
+        >>> rules = compile_rules('User-agent: *\\nDisallow: /privado/')
+        >>> rules.can_fetch('*', '/privado/datos')
+        False
+        >>> rules.can_fetch('*', '/publico/')
+        True
+        >>> compile_rules('', 404).can_fetch('*', '/privado/')
+        True
+    """
+    rules = RobotFileParser()
+    if is_disallow_all(status):
+        rules.disallow_all = True
+    elif 400 <= status < 500:
+        rules.allow_all = True
+    else:
+        rules.parse(body.splitlines())
+    rules.modified()
+    return rules
+
+
+_compiled = {}
+_compiled_lock = threading.Lock()
+
+
+def find_rules(key, now) -> Optional[RobotFileParser]:
+    """Devuelve las reglas en memoria, si no han caducado.
+
+    Params:
+
+        - key: La clave de la caché, normalmente la clave primaria del
+          *site*.
+
+        - now (datetime): La fecha y hora actual.
+
+    Returns:
+
+        Una instancia de ``RobotFileParser``, o ``None`` si no hay
+        reglas en memoria o han caducado.
+    """
+    with _compiled_lock:
+        entry = _compiled.get(key)
+    if entry and now < entry[1]:
+        return entry[2]
+    return None
+
+
+def get_rules(key, body: str, status: int, expires_at) -> RobotFileParser:
+    """Devuelve las reglas interpretadas, reutilizando las de la memoria.
+
+    Solo se vuelve a interpretar el fichero si ha cambiado su contenido
+    o el código de estado.
+
+    Params:
+
+        - key: La clave de la caché, normalmente la clave primaria del
+          *site*.
+
+        - body (str): El contenido del fichero.
+
+        - status (int): El código de estado con el que respondió el
+          servidor.
+
+        - expires_at (datetime): Fecha y hora de caducidad. Hasta
+          entonces, ``find_rules`` devuelve estas reglas.
+
+    Returns:
+
+        Una instancia de ``RobotFileParser``.
+    """
+    version = (status, content_hash(body))
+    with _compiled_lock:
+        entry = _compiled.get(key)
+    if entry and entry[0] == version:
+        rules = entry[2]
+    else:
+        rules = compile_rules(body, status)
+    with _compiled_lock:
+        _compiled[key] = (version, expires_at, rules)
+    return rules
@@ -0,0 +1,356 @@
+#!/usr/bin/env python3
+
+"""
+Módulo ``sink``
+------------------------------------------------------------------------
+
+Escritura diferida (*write-behind*) de los resultados del rastreo.
+
+Cada comprobación de una página guarda la página varias veces, y los
+enlaces y los valores de los *plugins* se escriben por separado, cada
+uno en su propia transacción. Durante un rastreo, el coste de tantas
+confirmaciones (*commits*) es la mayor parte de la carga de la base de
+datos.
+
+Un ``ResultSink`` acumula los resultados de muchas comprobaciones, y
+los escribe todos juntos, en una sola transacción por lote:
+
+- Los campos modificados de las páginas, con ``bulk_update``. Si una
+  página se guarda varias veces, solo se escribe una vez, con la unión
+  de los campos modificados.
+
+- Los enlaces nuevos, con ``bulk_create``, y los enlaces borrados, con
+  una sola consulta, después de borrar todos los enlaces de las
+  páginas que se han quedado sin ellos (Ver ``clear_links``).
+
+- Los valores de los *plugins*, con ``Value.bulk_upsert_many``.
+
+- La vuelta a la frontera de las páginas comprobadas, con
+  ``FrontierEntry.complete_many``. Hasta entonces siguen arrendadas,
+  así que si el proceso muere antes de escribir el lote, se vuelven a
+  comprobar cuando caduque el arrendamiento.
+
+Las páginas nuevas (La frontera) se siguen creando en el momento, para
+que el rastreo pueda continuar con ellas.
+
+El lote se escribe cuando acumula ``max_pages`` páginas, o cuando han
+pasado ``max_delay`` segundos desde el primer resultado pendiente
+(Aunque no lleguen más resultados: un temporizador lo escribe desde
+otro hilo), al terminar (Usado como gestor de contexto, o con ``flush``) o al recibir
+alguna de las señales indicadas (Por defecto, ``SIGTERM``). Para cada
+escritura se mide el tiempo empleado (Ver ``stats``).
+"""
+
+from typing import Iterable
+from typing import Optional
+import functools
+import logging
+import operator
+import signal
+import threading
+import time
+
+from django.db import connection
+from django.db import models
+from django.db import transaction
+
+
+#: Número de páginas por lote, por defecto
+MAX_PAGES = 100
+
+#: Segundos máximos que un resultado puede esperar a escribirse
+MAX_DELAY = 2.0
+
+_logger = logging.getLogger(__name__)
+
+
+class _Batch:
+
+    def __init__(self):
+        self.pages = {}
+        self.fields = {}
+        self.added_links = {}
+        self.removed_links = {}
+        self.cleared_links = set()
+        self.values = {}
+        self.completed = set()
+        self.started = None
+
+    def __len__(self):
+        return len(self.pages)
+
+    def merge(self, newer):
+        for pk, page in newer.pages.items():
+            self.pages[pk] = page
+            self.fields.setdefault(pk, set()).update(newer.fields[pk])
+        for pk in newer.cleared_links:
+            self.added_links.pop(pk, None)
+            self.removed_links.pop(pk, None)
+            self.cleared_links.add(pk)
+        for pk, links in newer.added_links.items():
+            self.removed_links.get(pk, set()).difference_update(links)
+            self.added_links.setdefault(pk, set()).update(links)
+        for pk, links in newer.removed_links.items():
+            self.added_links.get(pk, set()).difference_update(links)
+            self.removed_links.setdefault(pk, set()).update(links)
+        self.values.update(newer.values)
+        self.completed.update(newer.completed)
+        if self.started is None:
+            self.started = newer.started
+
+
+class ResultSink:
+    """Acumula los resultados de las comprobaciones y los escribe por lotes.
+
+    Se puede compartir entre varios hilos.
+
+    Params:
+
+        - max_pages (int): Número de páginas a partir del cual se
+          escribe el lote.
+
+        - max_delay (float): Segundos desde el primer resultado
+          pendiente a partir de los cuales se escribe el lote.
+
+        - signals (Iterable[int]): Señales que provocan que se termine
+          el proceso escribiendo antes los resultados pendientes,
+          mientras se usa como gestor de contexto en el hilo principal.
+    """
+
+    def __init__(
+            self,
+            max_pages: int = MAX_PAGES,
+            max_delay: float = MAX_DELAY,
+            signals: Iterable[int] = (signal.SIGTERM,),
+            ):
+        self.max_pages = max(1, max_pages)
+        self.max_delay = max_delay
+        self.signals = tuple(signals)
+        self.lock = threading.Lock()
+        self.batch = _Batch()
+        self.flushing = set()
+        self.latencies = []
+        self.num_pages = 0
+        self._previous_handlers = {}
+        self._timer = None
+
+    def __enter__(self):
+        if threading.current_thread() is threading.main_thread():
+            for signum in self.signals:
+                self._previous_handlers[signum] = signal.signal(signum, self._on_signal)
+        return self
+
+    def __exit__(self, *args):
+        for signum, handler in self._previous_handlers.items():
+            signal.signal(signum, handler)
+        self._previous_handlers.clear()
+        self.flush()
+
+    def _on_signal(self, signum, frame):
+        # Se termina como con Ctrl-C: el gestor de contexto escribe los
+        # resultados pendientes mientras se deshace la pila.
+        raise SystemExit(128 + signum)
+
+    def _add(self, page, update):
+        with self.lock:
+            batch = self.batch
+            is_first = batch.started is None
+            if is_first:
+                batch.started = time.monotonic()
+            batch.pages.setdefault(page.pk, page)
+            batch.fields.setdefault(page.pk, set())
+            update(batch)
+            is_due = (
+                len(batch) >= self.max_pages
+                or time.monotonic() - batch.started >= self.max_delay
+                )
+            if is_first and not is_due:
+                self._timer = threading.Timer(self.max_delay, self._on_timer, args=(batch,))
+                self._timer.daemon = True
+                self._timer.start()
+        if is_due:
+            self.flush()
+
+    def _on_timer(self, batch):
+        try:
+            with self.lock:
+                is_pending = self.batch is batch
+            if is_pending:
+                self.flush()
+        except Exception as err:
+            _logger.warning('Imposible escribir el lote pendiente: %s', err)
+        finally:
+            # Cada hilo tiene su propia conexión a la base de datos
+            connection.close()
+
+    def save_page(self, page, update_fields: Optional[Iterable[str]] = None):
+        """Anota los campos modificados de una página.
+
+        Params:
+
+            - page (Page): La página.
+
+            - update_fields (Iterable[str]): Los campos modificados. Si
+              no se indican, todos.
+        """
+        if update_fields is None:
+            update_fields = [
+                field.name
+                for field in page._meta.concrete_fields
+                if not field.primary_key
+                ]
+
+        def update(batch):
+            batch.pages[page.pk] = page
+            batch.fields[page.pk].update(update_fields)
+
+        self._add(page, update)
+
+    def update_links(self, page, added: Iterable[int], removed: Iterable[int]):
+        """Anota los enlaces añadidos y borrados de una página.
+
+        Params:
+
+            - page (Page): La página de la que salen los enlaces.
+
+            - added (Iterable[int]): Claves primarias de las páginas
+              enlazadas nuevas.
+
+            - removed (Iterable[int]): Claves primarias de las páginas
+              que ya no se enlazan.
+        """
+        added = set(added)
+        removed = set(removed)
+
+        def update(batch):
+            pending_added = batch.added_links.setdefault(page.pk, set())
+            pending_removed = batch.removed_links.setdefault(page.pk, set())
+            pending_added.difference_update(removed)
+            pending_removed.difference_update(added)
+            pending_added.update(added)
+            pending_removed.update(removed)
+
+        self._add(page, update)
+
+    def clear_links(self, page):
+        """Anota que se borran todos los enlaces de una página, incluidos
+        los que estén pendientes de escribir.
+
+        Params:
+
+            - page (Page): La página de la que salen los enlaces.
+        """
+        def update(batch):
+            batch.added_links.pop(page.pk, None)
+            batch.removed_links.pop(page.pk, None)
+            batch.cleared_links.add(page.pk)
+
+        self._add(page, update)
+
+    def set_values(self, page, values: dict):
+        """Anota los valores de los *plugins* de una página. Sustituyen
+        a todos los anteriores. Ver ``Value.bulk_upsert``.
+        """
+        def update(batch):
+            batch.values[page.pk] = dict(values)
+
+        self._add(page, update)
+
+    def complete(self, page):
+        """Anota que la comprobación de una página ha terminado, para
+        devolverla a la frontera. Ver ``FrontierEntry.complete``.
+        """
+        def update(batch):
+            batch.completed.add(page.pk)
+
+        self._add(page, update)
+
+    def pending(self) -> set:
+        """Claves primarias de las páginas con resultados sin escribir.
+
+        No se deben volver a comprobar hasta que se escriban.
+        """
+        with self.lock:
+            return set(self.batch.pages) | self.flushing
+
+    def flush(self):
+        """Escribe los resultados pendientes, en una sola transacción.
+
+        Si falla, los resultados se mantienen pendientes, y se eleva
+        la excepción.
+        """
+        from .models import FrontierEntry
+        from .models import Link
+        from .models import Page
+        from .models import Value
+        with self.lock:
+            batch, self.batch = self.batch, _Batch()
+            self.flushing.update(batch.pages)
+            timer, self._timer = self._timer, None
+        if timer is not None:
+            timer.cancel()
+        if not batch.pages:
+            return
+        start = time.monotonic()
+        try:
+            with transaction.atomic():
+                by_fields = {}
+                for pk, page in batch.pages.items():
+                    fields = tuple(sorted(batch.fields[pk]))
+                    if fields:
+                        by_fields.setdefault(fields, []).append(page)
+                for fields, pages in by_fields.items():
+                    Page.objects.bulk_update(pages, fields)
+                if batch.cleared_links:
+                    Link.objects.filter(from_page_id__in=batch.cleared_links).delete()
+                removed = [
+                    models.Q(from_page_id=pk, to_page_id__in=links)
+                    for pk, links in batch.removed_links.items()
+                    if links
+                    ]
+                if removed:
+                    Link.objects.filter(functools.reduce(operator.or_, removed)).delete()
+                added = [
+                    Link(from_page_id=pk, to_page_id=to_pk)
+                    for pk, links in batch.added_links.items()
+                    for to_pk in links
+                    ]
+                if added:
+                    Link.objects.bulk_create(added, ignore_conflicts=True)
+                Value.bulk_upsert_many({
+                    batch.pages[pk]: values
+                    for pk, values in batch.values.items()
+                    })
+                FrontierEntry.complete_many(batch.pages[pk] for pk in batch.completed)
+        except BaseException:
+            with self.lock:
+                batch.merge(self.batch)
+                self.batch = batch
+                self.flushing.difference_update(batch.pages)
+            raise
+        latency = time.monotonic() - start
+        with self.lock:
+            self.flushing.difference_update(batch.pages)
+            self.latencies.append(latency)
+            self.num_pages += len(batch)
+        _logger.debug('Escritas %d páginas en %.1f ms', len(batch), latency * 1000)
+
+    def stats(self) -> dict:
+        """Estadísticas de las escrituras realizadas.
+
+        Returns:
+
+            Un diccionario con el número de lotes escritos
+            (``flushes``), de páginas (``pages``), y la latencia media
+            y máxima de las escrituras, en milisegundos (``mean_ms`` y
+            ``max_ms``).
+        """
+        with self.lock:
+            latencies = list(self.latencies)
+            num_pages = self.num_pages
+        return {
+            'flushes': len(latencies),
+            'pages': num_pages,
+            'mean_ms': round(sum(latencies) * 1000 / len(latencies), 2) if latencies else 0.0,
+            'max_ms': round(max(latencies) * 1000, 2) if latencies else 0.0,
+            }
@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+
+"""
+Módulo ``timings``
+------------------------------------------------------------------------
+
+Medición del tiempo empleado en cada fase de la comprobación de una
+página.
+
+Las fases que se miden son:
+
+- ``wait``: Espera para respetar el ritmo de peticiones al servidor.
+
+- ``connect``: Resolución DNS y establecimiento de la conexión (y la
+  negociación TLS, si es ``https``). Es cero si se reutiliza una
+  conexión.
+
+- ``ttfb``: Desde que se envía la petición hasta que se reciben las
+  cabeceras de la respuesta (*Time To First Byte*).
+
+- ``download``: Descarga, descompresión y decodificación del contenido.
+
+- ``archive``: Almacenamiento del contenido en el archivo de respuestas,
+  si el *site* tiene uno. Ver el módulo ``archive``.
+
+- ``parse``: Análisis del HTML y extracción de los enlaces.
+
+- ``links``: Actualización de las páginas y enlaces en la base de datos.
+
+- ``plugins``: Ejecución de los *plugins*.
+
+- ``db``: Resto de escrituras en la base de datos.
+
+Si una petición sigue redirecciones, o se hacen dos peticiones
+(``HEAD`` + ``GET``), los tiempos de cada fase se acumulan.
+"""
+
+from contextlib import contextmanager
+import time
+
+
+#: Fases de la comprobación de una página, en orden
+PHASES = (
+    'wait',
+    'connect',
+    'ttfb',
+    'download',
+    'archive',
+    'parse',
+    'links',
+    'plugins',
+    'db',
+    )
+
+#: Descripción de cada fase
+PHASE_LABELS = {
+    'wait': 'Espera',
+    'connect': 'DNS/Conexión',
+    'ttfb': 'Primer byte',
+    'download': 'Descarga',
+    'archive': 'Archivo',
+    'parse': 'Análisis',
+    'links': 'Enlaces',
+    'plugins': 'Plugins',
+    'db': 'Base de datos',
+    }
+
+
+class Timings:
+    """Acumulador de los tiempos empleados en cada fase.
+
+    Examples:
+
+        >>> timings = Timings()
+        >>> timings.add('parse', 0.0123)
+        >>> timings.add('parse', 0.0010)
+        >>> timings.as_dict()
+        {'parse': 13.3}
+    """
+
+    def __init__(self, clock=time.perf_counter):
+        self.clock = clock
+        self.phases = {}
+
+    def __repr__(self):
+        return f'Timings({self.as_dict()!r})'
+
+    def add(self, name: str, seconds: float):
+        """Suma los segundos indicados al tiempo de una fase.
+        """
+        self.phases[name] = self.phases.get(name, 0.0) + seconds
+
+    @contextmanager
+    def phase(self, name: str):
+        """Gestor de contexto que mide el tiempo de una fase.
+
+        Examples:
+
+            >>> timings = Timings(clock=iter([1.0, 1.5]).__next__)
+            >>> with timings.phase('download'):
+            ...     pass
+            >>> timings.as_dict()
+            {'download': 500.0}
+        """
+        start = self.clock()
+        try:
+            yield self
+        finally:
+            self.add(name, self.clock() - start)
+
+    def as_dict(self) -> dict:
+        """Tiempos de cada fase, en milisegundos.
+
+        Returns:
+
+            Un diccionario con el nombre de la fase como clave y los
+            milisegundos empleados, redondeados a una décima, como
+            valor. Solo se incluyen las fases que se han medido.
+        """
+        return {
+            name: round(seconds * 1000.0, 1)
+            for name, seconds in self.phases.items()
+            }
+
+
+def as_table(timings: dict) -> list[tuple[str, float]]:
+    """Tiempos de cada fase, en orden, listos para mostrar.
+
+    Params:
+
+        - timings (dict): Tiempos en milisegundos, tal y como los
+          devuelve ``Timings.as_dict``.
+
+    Returns:
+
+        Una lista de tuplas con la descripción de la fase y los
+        milisegundos empleados.
+
+    Examples:
+
+        >>> as_table({'ttfb': 12.5, 'wait': 0.0})
+        [('Espera', 0.0), ('Primer byte', 12.5)]
+    """
+    return [
+        (PHASE_LABELS[name], timings[name])
+        for name in PHASES
+        if name in timings
+        ]
@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+
+"""
+Módulo ``traps``
+------------------------------------------------------------------------
+
+Detección de trampas para rastreadores (*crawler traps*).
+
+Los calendarios, las búsquedas por facetas o las combinaciones de
+parámetros de ordenación y filtrado generan un número ilimitado de URL
+distintas, y la frontera nunca se vacía. Para evitarlo, las URL nuevas
+se agrupan por su plantilla (Ver ``url_template``): la ruta, con los
+números sustituidos por ``#``, y el conjunto de nombres de los
+parámetros, sin sus valores. De cada grupo con parámetros solo se
+admite un número máximo de variantes (Campo ``max_variants`` del
+*site*); el resto se descartan, y se contabilizan en el modelo
+``TrapGroup``. Los grupos sin parámetros no tienen límite: rutas como
+``/noticias/123/`` comparten plantilla con todas las demás noticias, y
+limitarlas impediría rastrear los *sites* con muchos contenidos.
+
+Además, hay URL sospechosas por sí mismas, que se descartan siempre
+(Ver ``trap_reason``):
+
+- Las rutas con demasiados segmentos (Más de ``MAX_DEPTH``), típicas
+  de los enlaces relativos mal construidos, que se van acumulando.
+
+- Las rutas en las que un mismo segmento se repite ``MAX_REPEAT`` veces
+  o más, como ``/a/b/a/b/a/b/``.
+"""
+
+from urllib.parse import unquote
+import re
+
+
+#: Número máximo de variantes de cada plantilla con parámetros, por defecto
+MAX_VARIANTS = 1000
+
+#: Número máximo de segmentos de una ruta
+MAX_DEPTH = 16
+
+#: Número de veces que tiene que aparecer un segmento en una ruta para
+#: que se considere sospechosa
+MAX_REPEAT = 3
+
+#: Motivos por los que se descarta una URL
+TOO_DEEP = 'depth'
+REPEATED = 'repeat'
+TOO_MANY = 'variants'
+
+_pat_number = re.compile(r'\d+')
+
+
+def url_template(subpath: str, params: str = '') -> str:
+    """Devuelve la plantilla de una URL.
+
+    Params:
+
+        - subpath (str): La ruta.
+
+        - params (str): Los parámetros (*query string*).
+
+    Returns:
+
+        La ruta, con los números sustituidos por ``#``, y los nombres
+        de los parámetros, ordenados y sin repetir.
+
+    Examples:
+
+        >>> url_template('/agenda/2024/05/', 'vista=mes&dia=3')
+        '/agenda/#/#/?dia&vista'
+        >>> url_template('/tienda/', 'color=rojo&talla=m&color=azul')
+        '/tienda/?color&talla'
+        >>> url_template('/noticia-123.html')
+        '/noticia-#.html'
+    """
+    template = _pat_number.sub('#', subpath)
+    names = sorted({
+        unquote(param.partition('=')[0])
+        for param in params.split('&')
+        if param
+        })
+    if names:
+        template += '?' + '&'.join(names)
+    return template
+
+
+def trap_reason(subpath: str) -> str:
+    """Indica si una ruta es sospechosa de ser una trampa.
+
+    Params:
+
+        - subpath (str): La ruta.
+
+    Returns:
+
+        El motivo (``TOO_DEEP`` o ``REPEATED``), o la cadena vacía si
+        la ruta no es sospechosa.
+
+    Examples:
+
+        >>> trap_reason('/noticias/2024/05/titular/')
+        ''
+        >>> trap_reason('/a/b/a/b/a/b/')
+        'repeat'
+        >>> trap_reason('/x' * 20)
+        'depth'
+    """
+    segments = [segment for segment in subpath.split('/') if segment]
+    if len(segments) > MAX_DEPTH:
+        return TOO_DEEP
+    counts = {}
+    for segment in segments:
+        counts[segment] = counts.get(segment, 0) + 1
+        if counts[segment] >= MAX_REPEAT:
+            return REPEATED
+    return ''
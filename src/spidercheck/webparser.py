@@ -1,17 +1,183 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
 
+import codecs
 import re
 
-pat_html_begin = re.compile('<html.*>', re.IGNORECASE)
+from .results import Success, Failure
 
+pat_html_begin = re.compile('<html', re.IGNORECASE)
+pat_html_begin_bytes = re.compile(b'<html', re.IGNORECASE)
 
-def is_valid_html(body):
-    body = body.strip()
-    if len(body) < 14:
-        return False
-    if body[-7:].lower() != '</html>':
-        return False
-    if not pat_html_begin.search(body):
+#: Número de bytes del principio del contenido que se examinan para
+#: decidir si parece HTML
+SNIFF_SIZE = 512
+
+
+def looks_like_html(head):
+    """Comprueba si el principio de un contenido parece HTML.
+
+    Se usa para abortar la descarga de recursos que el servidor declara
+    como ``text/html`` pero que no lo son (Por ejemplo, un PDF).
+
+    Params:
+
+        - head (bytes): Los primeros bytes del contenido.
+
+    Returns:
+
+        ``True`` si el contenido empieza como un documento HTML.
+
+    Examples:
+
+        >>> looks_like_html(b'  <!DOCTYPE html><html>')
+        True
+        >>> looks_like_html(b'%PDF-1.4 ...')
+        False
+        >>> looks_like_html('<html>'.encode('utf-16'))
+        True
+    """
+    head = head[:SNIFF_SIZE]
+    if head.startswith((codecs.BOM_UTF16_LE, codecs.BOM_UTF16_BE)):
+        # Los caracteres ASCII en UTF-16 llevan un byte nulo
+        text = head.decode('utf-16', errors='ignore')
+        return text.lstrip(' \t\r\n\f').startswith('<')
+    if b'\x00' in head:
         return False
-    return True
+    head = head.lstrip(b'\xef\xbb\xbf \t\r\n\f')
+    return head.startswith(b'<')
+
+
+#: Número de caracteres del principio del contenido en los que se busca
+#: la etiqueta ``<html>``
+HEAD_WINDOW = 64 * 1024
+
+#: Número de caracteres del final del contenido en los que se busca la
+#: etiqueta ``</html>``
+TAIL_WINDOW = 1024
+
+#: Longitud mínima de un documento HTML, sin los espacios iniciales y
+#: finales
+MIN_HTML_SIZE = 14
+
+
+def has_html_tag(text) -> bool:
+    """Busca una etiqueta ``<html>`` en un texto.
+
+    Equivale a buscar la expresión regular ``<html.*>``, pero en tiempo
+    lineal: basta con que haya un ``>`` después de ``<html`` en la
+    misma línea, así que, si no lo hay, se salta directamente a la
+    línea siguiente.
+
+    Examples:
+
+        >>> has_html_tag('<!DOCTYPE html>\\n<HTML lang="es">')
+        True
+        >>> has_html_tag('<html\\n>')
+        False
+    """
+    if isinstance(text, bytes):
+        pattern, newline, close = pat_html_begin_bytes, b'\n', b'>'
+    else:
+        pattern, newline, close = pat_html_begin, '\n', '>'
+    pos = 0
+    while match := pattern.search(text, pos):
+        line_end = text.find(newline, match.end())
+        if line_end < 0:
+            line_end = len(text)
+        if text.find(close, match.end(), line_end) >= 0:
+            return True
+        pos = line_end + 1
+    return False
+
+
+class HtmlSniffer:
+    """Comprobación incremental de que un contenido parece HTML.
+
+    Solo se examinan los primeros ``HEAD_WINDOW`` y los últimos
+    ``TAIL_WINDOW`` caracteres, así que el coste no depende del tamaño
+    del contenido, y nunca se copia el contenido completo. Se le pueden
+    pasar los fragmentos según se reciben, como texto o como bytes
+    (Pero sin mezclar ambos tipos).
+
+    Examples:
+
+        >>> sniffer = HtmlSniffer()
+        >>> sniffer.feed('<html><body>')
+        >>> sniffer.feed('Hola</body></html>\\n')
+        >>> bool(sniffer.result())
+        True
+    """
+
+    def __init__(self, head_window=HEAD_WINDOW, tail_window=TAIL_WINDOW):
+        self.head_window = head_window
+        self.tail_window = tail_window
+        self.size = 0
+        self._head = None
+        self._tail = None
+
+    def feed(self, chunk):
+        if not chunk:
+            return
+        if self._head is None:
+            self._head = chunk[:self.head_window]
+            self._tail = chunk[-self.tail_window:]
+        else:
+            if len(self._head) < self.head_window:
+                self._head += chunk[:self.head_window - len(self._head)]
+            self._tail = (self._tail + chunk[-self.tail_window:])[-self.tail_window:]
+        self.size += len(chunk)
+
+    def result(self):
+        """Resultado de la comprobación.
+
+        Returns:
+
+            Una instancia de ``Success`` si el contenido parece HTML, o
+            de ``Failure`` con el motivo por el que no lo parece.
+        """
+        if self._head is None:
+            return Failure('El contenido está vacío')
+        head = self._head.lstrip()
+        tail = self._tail.rstrip()
+        start = len(self._head) - len(head)
+        end = self.size - (len(self._tail) - len(tail))
+        if end - start < MIN_HTML_SIZE:
+            return Failure('El contenido es demasiado corto')
+        end_tag = b'</html>' if isinstance(head, bytes) else '</html>'
+        if tail[-7:].lower() != end_tag:
+            return Failure('El contenido no termina con </html>')
+        if not has_html_tag(self._head):
+            return Failure(
+                f'No se encuentra la etiqueta <html> en los primeros'
+                f' {self.head_window} caracteres'
+                )
+        return Success(True)
+
+
+def check_html(body):
+    """Comprueba si un contenido parece un documento HTML completo.
+
+    Params:
+
+        - body (str): El contenido.
+
+    Returns:
+
+        Una instancia de ``Success`` si lo parece, o de ``Failure`` con
+        el motivo por el que no lo parece.
+
+    Examples:
+
+        >>> check_html('<html><body>Hola</body></html>').is_success()
+        True
+        >>> check_html('<html><body>Hola</body>').error_message
+        'El contenido no termina con </html>'
+    """
+    sniffer = HtmlSniffer()
+    sniffer.feed(body)
+    return sniffer.result()
+
+
+def is_valid_html(body):
+    return bool(check_html(body))
@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+
+import threading
+from http.server import ThreadingHTTPServer
+
+import pytest
+
+
+def pytest_configure(config):
+    config.addinivalue_line('markers', 'slow: Pruebas lentas (Bancos de pruebas)')
+    config.addinivalue_line('markers', 'wip: Pruebas en desarrollo (Work in Progress)')
+
+
+class LocalServer(ThreadingHTTPServer):
+    """Servidor HTTP local para las pruebas, en un puerto libre.
+
+    Además de los atributos habituales, tiene un cerrojo (``lock``) y
+    una lista (``requests``) a disposición de los manejadores, para
+    registrar las peticiones recibidas.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, handler):
+        super().__init__(('127.0.0.1', 0), handler)
+        self.lock = threading.Lock()
+        self.requests = []
+
+    @property
+    def netloc(self) -> str:
+        host, port = self.server_address
+        return f'{host}:{port}'
+
+    def url(self, path: str = '/') -> str:
+        return f'http://{self.netloc}{path}'
+
+
+@pytest.fixture
+def server(request):
+    """Arranca un ``LocalServer`` durante la prueba.
+
+    El manejador de las peticiones es, por orden:
+
+    - El parámetro del *fixture*, si se usa con ``indirect=True``.
+
+    - La clase ``Handler`` del módulo de la prueba.
+
+    Si el módulo define una función ``init_server``, se llama con el
+    servidor antes de arrancarlo, para añadir otros atributos.
+    """
+    handler = getattr(request, 'param', None) or request.module.Handler
+    httpd = LocalServer(handler)
+    init_server = getattr(request.module, 'init_server', None)
+    if init_server is not None:
+        init_server(httpd)
+    thread = threading.Thread(target=httpd.serve_forever, args=(0.05,), daemon=True)
+    thread.start()
+    yield httpd
+    httpd.shutdown()
+    httpd.server_close()
+
+
+@pytest.fixture
+def make_site(request):
+    """Devuelve una función que crea *sites* para las pruebas.
+
+    Por defecto, el nombre del *site* es el del módulo de la prueba,
+    sin el prefijo ``test_spidercheck_``, y el servidor es
+    ``example.com``. Se puede indicar cualquier otro campo del modelo
+    ``Site``. La caché de reglas del ``robots.txt`` se vacía antes de
+    crearlo.
+    """
+    def make_site(**kwargs):
+        from spidercheck import robots
+        from spidercheck.models import Site
+        robots._compiled.clear()
+        kwargs.setdefault('name', request.module.__name__.rsplit('_', 1)[-1])
+        kwargs.setdefault('scheme', 'http')
+        kwargs.setdefault('netloc', 'example.com')
+        kwargs.setdefault('path', '/')
+        return Site.objects.create(**kwargs)
+
+    return make_site
+
+
+@pytest.fixture
+def site(request, make_site):
+    """Un *site* creado con ``make_site``.
+
+    Si el módulo de la prueba define una clase ``Handler``, el *site*
+    apunta al servidor local (Ver el *fixture* ``server``).
+    """
+    if hasattr(request.module, 'Handler'):
+        return make_site(netloc=request.getfixturevalue('server').netloc)
+    return make_site()
+
+
+@pytest.fixture
+def fast_controllers(monkeypatch):
+    """Sustituye los reguladores del ritmo de peticiones por otros sin
+    apenas límite, para que las pruebas no tengan que esperar.
+    """
+    from spidercheck import models
+    from spidercheck.politeness import RateController
+    monkeypatch.setattr(
+        models,
+        'get_controller',
+        lambda key, **kwargs: RateController(rate=1000.0, max_rate=1000.0),
+        )
+    monkeypatch.setattr(models, 'find_controller', lambda key: None)
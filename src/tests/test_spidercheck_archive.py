@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+
+from http.client import HTTPMessage
+
+import pytest
+
+from spidercheck import archive
+from spidercheck.archive import Archive, ArchiveError
+
+
+HTML = (
+    '<!DOCTYPE html><html><head><title>Canción {num}</title></head>'
+    '<body><a href="/uno/">uno</a> <a href="https://example.org/">fuera</a>'
+    '</body></html>'
+    )
+
+
+def test_append_and_read(tmp_path):
+    store = Archive(tmp_path)
+    positions = [
+        store.append({'page': num}, HTML.format(num=num))
+        for num in range(10)
+        ]
+    for num, (segment, offset, length) in enumerate(positions):
+        header, body = store.read(segment, offset)
+        assert header['page'] == num
+        assert header['codec'] == store.codec
+        assert body == HTML.format(num=num)
+    assert len({segment for segment, _, _ in positions}) == 1
+    store.close()
+
+
+def test_segments_rotate(tmp_path):
+    store = Archive(tmp_path, segment_size=1)
+    first, _, _ = store.append({}, 'uno')
+    second, offset, _ = store.append({}, 'dos')
+    assert first != second
+    assert offset == 0
+    assert store.read(second, 0)[1] == 'dos'
+    assert len(list(tmp_path.glob('segment-*.sca'))) == 2
+
+
+def test_invalid_record(tmp_path):
+    store = Archive(tmp_path)
+    segment, _, _ = store.append({}, 'uno')
+    with pytest.raises(ArchiveError):
+        store.read(segment, 1)
+
+
+def test_zlib_fallback(tmp_path, monkeypatch):
+    monkeypatch.setattr(archive, 'zstandard', None)
+    store = Archive(tmp_path)
+    segment, offset, _ = store.append({}, HTML)
+    header, body = store.read(segment, offset)
+    assert header['codec'] == 'zlib'
+    assert body == HTML
+
+
+def test_site_dictionary(tmp_path):
+    pytest.importorskip('zstandard')
+    store = Archive(tmp_path, dict_samples=50)
+    first = [store.append({}, HTML.format(num=num) * 20, 1) for num in range(60)]
+    second = [
+        store.append({}, f'<p>{num}</p>' * 20 + HTML.format(num=num), 2)
+        for num in range(60)
+        ]
+    assert len(list(tmp_path.glob('dict-1-*.zdict'))) == 1
+    assert len(list(tmp_path.glob('dict-2-*.zdict'))) == 1
+    store = Archive(tmp_path)
+    header, body = store.read(*first[-1][:2], 1)
+    assert header['dict_id'] != 0
+    assert body == HTML.format(num=59) * 20
+    header_2, body_2 = store.read(*second[-1][:2], 2)
+    assert header_2['dict_id'] not in (0, header['dict_id'])
+    assert body_2 == '<p>59</p>' * 20 + HTML.format(num=59)
+
+
+@pytest.mark.django_db
+def test_replay_page_without_network(tmp_path):
+    from spidercheck import core
+    from spidercheck.fechas import just_now
+    from spidercheck.fetcher import Response
+    from spidercheck.models import ArchivedResponse, Page, Site
+    site = Site.objects.create(
+        name='replay',
+        scheme='http',
+        netloc='replay.invalid',
+        path='/',
+        archive_dir=str(tmp_path),
+        )
+    page = Page.objects.create(site=site, subpath='/', params='')
+    headers = HTTPMessage()
+    headers['Content-Type'] = 'text/html'
+    response = Response(page.get_full_url(), 200, headers, body=HTML.format(num=1))
+    ArchivedResponse.store(page, response, just_now())
+    result = core.replay_page(page)
+    assert result.is_success(), result
+    assert [link.to_page.subpath for link in page.outgoing_links.all()] == ['/uno/']
+    assert page.external_links.get().to_url.url == 'https://example.org/'
+    assert page.values.get(name='title').value == 'Canción 1'
+
+
+if __name__ == "__main__":
+    pytest.main()
@@ -0,0 +1,204 @@
+#!/usr/bin/env python3
+
+"""
+Pruebas de conformidad de los motores de análisis de HTML.
+
+Todos los motores instalados deben obtener exactamente los mismos
+enlaces, título, etiquetas ``meta``, encabezados y texto que el
+analizador de referencia (``html.parser``) para cada documento del
+corpus.
+"""
+
+import time
+
+import pytest
+
+from spidercheck.document import available_backends
+from spidercheck.document import parse_document
+from spidercheck.document import select_backend
+from spidercheck.parser import LinkExtractor
+
+
+REFERENCE = 'html.parser'
+
+CORPUS = {
+    'basic': '''<!DOCTYPE html>
+<html lang="es">
+<head>
+  <meta charset="utf-8">
+  <title>Inicio</title>
+  <meta name="version" content="7">
+  <link rel="stylesheet" href="/static/css/main.css">
+  <link rel="icon" href="/favicon.ico">
+  <script src="/static/js/main.js"></script>
+</head>
+<body>
+  <header><a href="/">Inicio</a> | <a href="/contacto/">Contacto</a></header>
+  <main>
+    <h1>Bienvenida</h1>
+    <p>Texto con <a href="noticias/">enlace relativo</a>.</p>
+    <img src="/img/logo.png" alt="Logo">
+  </main>
+</body>
+</html>''',
+    'entities': '''<html><head><title>Datos &amp; cifras</title></head><body>
+<a href="/buscar/?q=a&amp;p=2">Buscar</a>
+<a href="/caf&eacute;/">Café</a>
+<a href="/a%20b/">Espacio</a>
+<p>Precio: 10&nbsp;&euro; &lt;IVA&gt;</p>
+</body></html>''',
+    'uppercase_and_unquoted': '''<HTML><HEAD><TITLE>MAYÚSCULAS</TITLE>
+<META NAME="Keywords" CONTENT="uno, dos"></HEAD>
+<BODY><A HREF=/sin-comillas/>Uno</A> <IMG SRC=/img/a.gif>
+<a href='/comillas-simples/'>Dos</a></BODY></HTML>''',
+    'excluded_and_empty': '''<html><body>
+<a href="/api/datos/">API</a>
+<a href="/api2/sicres/">API2</a>
+<a href="/__debug__/">Debug</a>
+<a href="">Vacío</a>
+<a>Sin href</a>
+<a href>Sin valor</a>
+<img alt="Sin src">
+<a href="/apista/">No es la API</a>
+</body></html>''',
+    'scripts_and_comments': '''<html><head>
+<script>document.write('<a href="/falso/">x</a>');</script>
+<style>a[href="/falso-css/"] { color: red; }</style>
+</head><body>
+<!-- <a href="/comentado/">Comentado</a> -->
+<script type="module" src="/js/modulo.js"></script>
+<noscript><img src="/img/pixel.gif"></noscript>
+<a href="/real/">Real</a>
+</body></html>''',
+    'unclosed_tags': '''<html><head><title>Sin cerrar</title></head><body>
+<ul><li><a href="/uno/">Uno</a><li><a href="/dos/">Dos</a></ul>
+<p>Párrafo uno<p>Párrafo dos
+<div><a href="/tres/">Tres</div>
+</body></html>''',
+    'external_and_schemes': '''<html><body>
+<a href="https://www.example.com/">Externo</a>
+<a href="//cdn.example.com/lib.js">Protocolo relativo</a>
+<a href="mailto:info@example.com">Correo</a>
+<a href="tel:+34922000000">Teléfono</a>
+<a href="javascript:void(0)">JS</a>
+<a href="#seccion">Ancla</a>
+<a href="  /con-espacios/  ">Espacios</a>
+<img src="data:image/gif;base64,R0lGODlhAQABAAAAACw=">
+</body></html>''',
+    'unicode': '''<html><head><title>Año nuevo — 2024</title></head><body>
+<main><h2>Índice</h2><a href="/año/2024/">Año</a>
+<a href="/ñandú/">Ñandú</a><p>Ünïcödé ✓</p></main>
+</body></html>''',
+    'headings_outside_main': '''<html><body>
+<header><h1>Cabecera</h1></header>
+<main><h1>Principal</h1><h3>Sección</h3><p>Contenido</p></main>
+<footer><h4>Pie</h4></footer>
+</body></html>''',
+    'no_html_wrapper': '''<title>Fragmento</title>
+<a href="/fragmento/">Fragmento</a><h2>Título</h2><p>Texto</p>''',
+    'inline_svg': '''<html><head><title>Con SVG</title></head><body>
+<svg width="10" height="10"><rect width="10" height="10"/></svg>
+<a href="/despues-del-svg/">Después</a>
+</body></html>''',
+    'duplicate_attributes': '''<html><body>
+<a href="/primero/" href="/segundo/">Repetido</a>
+<img src="/img/primera.png" src="/img/segunda.png">
+</body></html>''',
+    'raw_text_elements': '''<html><body>
+<textarea><a href="/textarea/">T</a> &amp;</textarea>
+<iframe><a href="/iframe/">I</a></iframe>
+<xmp><a href="/xmp/">X</a></xmp>
+<a href="/real/">Real</a>
+</body></html>''',
+    'template': '''<html><body>
+<template><a href="/plantilla/">P</a><img src="/img/plantilla.png"></template>
+<a href="/real/">Real</a>
+</body></html>''',
+    'title_with_markup': '''<html><head><title>A <b>B</b> &amp; C</title></head>
+<body></body></html>''',
+    'empty': '',
+}
+
+
+def synthetic_page(num_links=300, seed=0):
+    parts = ['<html><head><title>Página sintética</title>']
+    parts.append('<link rel="stylesheet" href="/css/sitio.css"></head><body><main>')
+    for index in range(num_links):
+        parts.append(
+            f'<div class="fila"><span>Elemento {index}</span>'
+            f' <a href="/pagina/{seed}/{index}/">Enlace {index}</a></div>'
+            )
+        if index % 25 == 0:
+            parts.append(f'<h2>Bloque {index // 25}</h2><img src="/img/{index}.png">')
+    parts.append('</main></body></html>')
+    return ''.join(parts)
+
+
+def summary(document):
+    return {
+        'links': document.links,
+        'styles': document.styles,
+        'scripts': document.scripts,
+        'images': document.images,
+        'title': document.title,
+        'meta': document.meta,
+        'headings': document.headings,
+        'text': document.text,
+        }
+
+
+@pytest.fixture(params=[name for name in available_backends() if name != REFERENCE])
+def backend(request):
+    return request.param
+
+
+def test_reference_matches_link_extractor():
+    for html in CORPUS.values():
+        extractor = LinkExtractor()
+        extractor.feed(html)
+        document = parse_document(html, backend=REFERENCE)
+        assert set(document.all_links()) == set(extractor.all_links())
+
+
+@pytest.mark.parametrize('name', list(CORPUS))
+def test_backend_conformance(backend, name):
+    html = CORPUS[name]
+    expected = summary(parse_document(html, backend=REFERENCE))
+    assert summary(parse_document(html, backend=backend)) == expected
+
+
+def test_backend_conformance_synthetic(backend):
+    html = synthetic_page()
+    expected = summary(parse_document(html, backend=REFERENCE))
+    assert summary(parse_document(html, backend=backend)) == expected
+
+
+def test_select_backend_falls_back():
+    assert select_backend('no-existe') == REFERENCE
+    assert select_backend() == REFERENCE
+
+
+def test_follows_html_specification():
+    document = parse_document(CORPUS['duplicate_attributes'])
+    assert document.links == {'/primero/'}
+    assert document.images == {'/img/primera.png'}
+    assert parse_document(CORPUS['raw_text_elements']).links == {'/real/'}
+    assert set(parse_document(CORPUS['template']).all_links()) == {'/real/'}
+    assert parse_document(CORPUS['title_with_markup']).title == 'A <b>B</b> & C'
+
+
+@pytest.mark.slow
+def test_backend_micro_benchmark():
+    html = synthetic_page(num_links=2000)
+    repeat = 20
+    times = {}
+    for name in available_backends():
+        start = time.perf_counter()
+        for _ in range(repeat):
+            links = set(parse_document(html, backend=name).all_links())
+        times[name] = (time.perf_counter() - start) / repeat * 1000.0
+        assert len(links) == 2000 + 1 + 2000 // 25
+    print(' '.join(f'{name}: {ms:.2f}ms' for name, ms in times.items()))
+    for name, ms in times.items():
+        if name != REFERENCE:
+            assert ms < times[REFERENCE]
@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+
+import pytest
+
+from spidercheck.bench import SyntheticSite, run_benchmark
+
+
+def test_synthetic_site_is_connected():
+    site = SyntheticSite(num_pages=50, fan_out=5, seed=3)
+    seen, pending = set(), ['/p/0/']
+    while pending:
+        path = pending.pop()
+        if path in seen or path not in site.links:
+            continue
+        seen.add(path)
+        pending.extend(site.links[path])
+    assert len(seen) == 50
+
+
+def test_synthetic_site_rates():
+    site = SyntheticSite(
+        num_pages=1000,
+        fan_out=10,
+        asset_ratio=0.3,
+        error_rate=0.1,
+        redirect_rate=0.1,
+        )
+    links = [link for links in site.links.values() for link in links[1:]]
+    assets = sum(1 for link in links if link.startswith('/static/'))
+    assert 0.25 < assets / len(links) < 0.35
+    assert 0.08 < len(site.redirects) / len(links) < 0.12
+    assert 0.07 < len(site.errors) / site.num_pages < 0.13
+    status, headers, _ = site.resolve(next(iter(site.redirects)))
+    assert status == 301 and headers['Location'].startswith('/p/')
+
+
+def test_page_size():
+    site = SyntheticSite(num_pages=5, page_size=4096)
+    assert 3500 < len(site.render('/p/1/')) < 4700
+
+
+def _reachable(synthetic):
+    # Las URL enlazadas solo desde páginas con error no se descubren
+    seen, pending = set(), ['/p/0/']
+    while pending:
+        path = pending.pop()
+        if path in seen:
+            continue
+        seen.add(path)
+        if path in synthetic.redirects:
+            pending.append(synthetic.redirects[path])
+        elif synthetic.resolve(path)[0] == 200:
+            pending.extend(synthetic.links.get(path, []))
+    return seen
+
+
+@pytest.mark.slow
+@pytest.mark.django_db
+def test_benchmark_check_site():
+    synthetic = SyntheticSite(num_pages=60, fan_out=8)
+    result = run_benchmark(synthetic, engine='check')
+    print(f'\n{result}')
+    assert result.num_pages == len(_reachable(synthetic))
+    assert result.requests_per_page >= 1.0
+    assert result.queries_per_page > 0
+    assert result.pages_per_second > 0
+
+
+if __name__ == "__main__":
+    pytest.main()
@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+
+import pytest
+
+from spidercheck.canonical import Canonicalizer
+
+
+SAMPLES = [
+    ('/a/?b=2&a=1', '/a/?a=1&b=2'),
+    ('/a/?a=2&b=1&a=1', '/a/?a=2&a=1&b=1'),
+    ('/a/?utm_source=x&UTM_Medium=y&id=3', '/a/?id=3'),
+    ('/a/?fbclid=1&gclid=2', '/a/'),
+    ('/a/index.html', '/a/'),
+    ('/a/INDEX.HTM?p=1', '/a/?p=1'),
+    ('/a/indice.html', '/a/indice.html'),
+    ('/%7Euser/%e2%82%ac', '/~user/%E2%82%AC'),
+    ('/a b/ñ', '/a%20b/%C3%B1'),
+    ('/a%2Fb/', '/a%2Fb/'),
+    ('/carrito;jsessionid=0A1B/ver', '/carrito/ver'),
+    ('/a/;v=1', '/a/;v=1'),
+    ('/a/#seccion', '/a/'),
+    ('/a/?', '/a/'),
+    ('/Mayusculas/', '/Mayusculas/'),
+]
+
+
+@pytest.mark.parametrize('url, expected', SAMPLES)
+def test_canonicalize(url, expected):
+    assert Canonicalizer()(url) == expected
+
+
+def test_canonicalize_is_idempotent():
+    canonicalize = Canonicalizer(lowercase=True)
+    for url, _ in SAMPLES:
+        once = canonicalize(url)
+        assert canonicalize(once) == once
+
+
+def test_site_configuration():
+    canonicalize = Canonicalizer(
+        drop_params=['orden', 'pag*'],
+        sort_params=False,
+        lowercase=True,
+        default_documents=[],
+        )
+    assert canonicalize('/Lista/index.html?z=1&orden=2&pagina=3&a=4') == '/lista/index.html?z=1&a=4'
+
+
+@pytest.mark.django_db
+def test_classify_links_are_canonical(site):
+    page, _ = site.add_page(site.url('/'))
+    local_links, _ = page.classify_links(
+        '<a href="/b/?y=2&x=1&utm_campaign=z">B</a>'
+        '<a href="/b/index.html?x=1&y=2">B</a>'
+        '<a href="/?utm_source=portada">Inicio</a>',
+        offline=True,
+        )
+    assert set(local_links) == {'/b/?x=1&y=2'}
+
+
+@pytest.mark.django_db
+def test_dedup_site_merges_pages_and_links(site):
+    from spidercheck.core import dedup_site
+    from spidercheck.models import Link
+    home, _ = site.add_page(site.url('/'))
+    other, _ = site.add_page(site.url('/otra/'))
+    first, _ = site.add_page(site.url('/b/index.html?y=2&x=1'))
+    second, _ = site.add_page(site.url('/b/?x=1&y=2&utm_source=z'))
+    Link.objects.create(from_page=home, to_page=first)
+    Link.objects.create(from_page=home, to_page=second)
+    Link.objects.create(from_page=other, to_page=second)
+    Link.objects.create(from_page=first, to_page=second)
+    Link.objects.create(from_page=second, to_page=home)
+    assert len(list(dedup_site(site, dry_run=True))) == 1
+    assert site.pages.count() == 4
+    results = list(dedup_site(site))
+    assert len(results) == 1
+    assert site.pages.count() == 3
+    page = site.pages.get(subpath='/b/')
+    assert page.pk == first.pk
+    assert page.params == 'x=1&y=2'
+    assert {link.from_page_id for link in page.incoming_links.all()} == {home.pk, other.pk}
+    assert {link.to_page_id for link in page.outgoing_links.all()} == {home.pk}
+    assert list(dedup_site(site)) == []
@@ -0,0 +1,373 @@
+#!/usr/bin/env python3
+
+from http.server import BaseHTTPRequestHandler
+import threading
+
+import pytest
+
+
+# Sin esperas entre peticiones al servidor local
+pytestmark = pytest.mark.usefixtures('fast_controllers')
+
+
+HTML = (
+    b'<!DOCTYPE html>\n<html><head><title>Inicio</title></head>'
+    b'<body><a href="/otra/">Otra</a></body></html>'
+    )
+
+ETAG = '"v1"'
+
+LISTING_HEAD = (
+    '<!DOCTYPE html>\n<html><head><title>Listado</title></head><body>'
+    + ''.join(f'<p><a href="/item/{i}/">Elemento {i}</a></p>' for i in range(100))
+    ).encode('utf-8')
+
+LISTING_TAIL = b'<a href="/ultimo/">Fin</a></body></html>'
+
+
+class Handler(BaseHTTPRequestHandler):
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        self.server.requests.append((self.path, self.headers.get('If-None-Match')))
+        if self.path == '/roto/':
+            self.send_error(500)
+            return
+        if self.path == '/listado/':
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/html; charset=utf-8')
+            self.send_header('Content-Length', str(len(LISTING_HEAD) + len(LISTING_TAIL)))
+            self.end_headers()
+            self.wfile.write(LISTING_HEAD)
+            self.wfile.flush()
+            self.server.release.wait(5)
+            self.wfile.write(LISTING_TAIL)
+            return
+        if self.path == '/viejo/':
+            self.send_response(301)
+            self.send_header('Location', '/otra/')
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+        if self.path in self.server.moved:
+            self.send_response(302)
+            self.send_header('Location', '/otra/')
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+        if self.path in ('/sin-etag/', '/cambia/'):
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/html; charset=utf-8')
+            self.send_header('Content-Length', str(len(HTML)))
+            self.end_headers()
+            self.wfile.write(HTML)
+            return
+        if self.path not in ('/', '/otra/'):
+            self.send_error(404)
+            return
+        if self.headers.get('If-None-Match') == ETAG:
+            self.send_response(304)
+            self.send_header('ETag', ETAG)
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/html; charset=utf-8')
+        self.send_header('ETag', ETAG)
+        self.send_header('Content-Length', str(len(HTML)))
+        self.end_headers()
+        self.wfile.write(HTML)
+
+
+def init_server(httpd):
+    httpd.release = threading.Event()
+    httpd.moved = set()
+
+
+@pytest.fixture
+def calls(monkeypatch):
+    from spidercheck import core
+    calls = []
+
+    def spy(name, func):
+        def wrapper(*args, **kwargs):
+            calls.append(name)
+            return func(*args, **kwargs)
+        monkeypatch.setattr(core, name, wrapper)
+
+    spy('_update_links', core._update_links)
+    spy('_run_plugins', core._run_plugins)
+    return calls
+
+
+@pytest.mark.django_db
+def test_not_modified_skips_links_and_plugins(server, site, calls):
+    from spidercheck.core import check_page
+    page, _ = site.add_page(server.url('/'))
+    assert check_page(page)
+    assert calls == ['_update_links', '_run_plugins']
+    assert page.content_hash
+    assert site.pages.filter(subpath='/otra/').exists()
+    calls.clear()
+    page.refresh_from_db()
+    result = check_page(page)
+    assert 'Sin cambios' in result.value
+    assert calls == []
+    assert server.requests[-1] == ('/', ETAG)
+    page.refresh_from_db()
+    assert page.status == 200
+    assert page.outgoing_links.count() == 1
+
+
+@pytest.mark.django_db
+def test_same_content_hash_skips_links_and_plugins(server, site, calls):
+    from spidercheck.core import check_page
+    site.detect_near_duplicates = True
+    site.save()
+    page, _ = site.add_page(server.url('/sin-etag/'))
+    assert check_page(page)
+    assert calls == ['_update_links', '_run_plugins']
+    page.refresh_from_db()
+    assert page.simhash is not None
+    calls.clear()
+    result = check_page(page)
+    assert 'Misma huella' in result.value
+    assert calls == []
+    assert server.requests[-1] == ('/sin-etag/', None)
+    page.refresh_from_db()
+    assert page.outgoing_links.count() == 1
+
+
+@pytest.mark.django_db
+def test_no_conditional_headers_after_error(server, site):
+    from spidercheck.core import check_page
+    page, _ = site.add_page(server.url('/roto/'))
+    page.etag = ETAG
+    page.content_hash = 'antiguo'
+    page.status = 200
+    page.save()
+    assert page.get_conditional_headers()
+    assert not check_page(page)
+    page.refresh_from_db()
+    assert page.status == 500
+    assert page.get_conditional_headers() == {}
+
+
+@pytest.mark.django_db
+def test_known_alias_is_not_followed_again(server, site, calls):
+    from spidercheck.core import check_page
+    page, _ = site.add_page(server.url('/viejo/'))
+    assert check_page(page)
+    assert [path for path, _ in server.requests][-2:] == ['/viejo/', '/otra/']
+    page.refresh_from_db()
+    assert page.alias_of.subpath == '/otra/'
+    assert page.redirects[0]['location'] == server.url('/otra/')
+    del server.requests[:]
+    result = check_page(page)
+    assert 'Sin cambios' in result.value
+    assert [path for path, _ in server.requests] == ['/viejo/']
+    assert calls == []
+    page.refresh_from_db()
+    assert page.alias_of.subpath == '/otra/'
+
+
+@pytest.mark.django_db
+def test_links_are_restored_after_alias(server, site):
+    from spidercheck.core import check_page
+    page, _ = site.add_page(server.url('/cambia/'))
+    assert check_page(page)
+    assert page.outgoing_links.count() == 1
+    server.moved.add('/cambia/')
+    assert check_page(page)
+    page.refresh_from_db()
+    assert page.is_alias()
+    assert page.outgoing_links.count() == 0
+    assert page.links_hash == ''
+    server.moved.clear()
+    assert check_page(page)
+    page.refresh_from_db()
+    assert not page.is_alias()
+    assert page.outgoing_links.count() == 1
+
+
+@pytest.mark.django_db
+def test_stream_links_while_downloading(server, site, monkeypatch):
+    from spidercheck import core
+    site.stream_links = True
+    site.save()
+    pending = []
+
+    def add_pages(page, links):
+        # El servidor no envía el final de la página hasta que se
+        # añaden los primeros enlaces a la frontera
+        pending.append(site.pages.filter(subpath='/ultimo/').exists())
+        add_pages_orig(page, links)
+        server.release.set()
+
+    add_pages_orig = core._add_pages
+    monkeypatch.setattr(core, '_add_pages', add_pages)
+    monkeypatch.setattr(core, 'parse_document', None)
+    page, _ = site.add_page(server.url('/listado/'))
+    assert core.check_page(page)
+    assert pending[0] is False
+    assert site.pages.filter(subpath__startswith='/item/').count() == 100
+    assert page.outgoing_links.count() == 101
+
+
+def _navigation(items, external=range(20)):
+    return ''.join(
+        [f'<a href="/item/{i}/">{i}</a><a href="/tag/{i}/">{i}</a>' for i in items]
+        + [f'<a href="https://externo.example.org/{i}/">{i}</a>' for i in external]
+        )
+
+
+@pytest.mark.django_db
+def test_update_links_in_bulk(site, django_assert_num_queries, django_assert_max_num_queries):
+    from spidercheck.core import _update_links
+    page, _ = site.add_page(site.url('/'))
+    site.get_robots_txt(offline=True)
+    assert site.check_external_links
+    with django_assert_max_num_queries(30):
+        _, added = _update_links(page, _navigation(range(200)), offline=True)
+    assert len(added) == page.outgoing_links.count() == 400
+    assert page.external_links.count() == 20
+    # Mismo conjunto de enlaces: robots.txt, reglas de exclusión y
+    # páginas enlazadas
+    with django_assert_num_queries(3):
+        assert _update_links(page, _navigation(reversed(range(200))), offline=True) == (set(), set())
+    # Páginas ya existentes: buscarlas, enlaces actuales, borrado y
+    # huella, y los enlaces externos actuales y sus URL
+    with django_assert_num_queries(8):
+        removed, added = _update_links(page, _navigation(range(1, 200)), offline=True)
+    assert len(removed) == 2 and not added
+    assert page.outgoing_links.count() == 398
+    # Enlaces externos: los actuales, buscar las URL, crear las nuevas,
+    # volver a buscarlas, insertar los enlaces y borrar los que sobran
+    with django_assert_num_queries(11):
+        _update_links(page, _navigation(range(1, 200), range(10, 30)), offline=True)
+    assert page.external_links.count() == 20
+    assert page.outgoing_links.count() == 398
+
+
+@pytest.mark.django_db
+def test_update_links_after_target_changes(site):
+    from spidercheck.core import _update_links
+    page, _ = site.add_page(site.url('/'))
+    html = '<a href="/otra/">Otra</a>'
+    _update_links(page, html, offline=True)
+    target = page.outgoing_links.get().to_page
+    # Como en la vista ``toogle_is_linkable``
+    target.is_linkable = False
+    target.save()
+    target.incoming_links.all().delete()
+    assert _update_links(page, html, offline=True) == (set(), set())
+    target.is_linkable = True
+    target.save()
+    assert _update_links(page, html, offline=True) == (set(), {target.pk})
+    target.delete()
+    _, added = _update_links(page, html, offline=True)
+    assert page.outgoing_links.get().to_page.subpath == '/otra/'
+    assert len(added) == 1
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize('num_values', [1, 40])
+def test_values_bulk_upsert(site, num_values, django_assert_num_queries):
+    from spidercheck.models import Value
+    page, _ = site.add_page(site.url('/'))
+    Value.upsert(page, 'antiguo', 'x')
+    Value.upsert(page, 'title', 'Antes')
+    values = {f'valor_{i}': i for i in range(num_values)}
+    values['title'] = 'Después'
+    with django_assert_num_queries(2):
+        Value.bulk_upsert(page, values)
+    assert dict(page.values.values_list('name', 'value')) == {
+        name: str(value) for name, value in values.items()
+        }
+    with django_assert_num_queries(1):
+        Value.bulk_upsert(page, {})
+    assert not page.values.exists()
+
+
+def test_values_upsert_sql():
+    from spidercheck.models import Value
+    sql = Value._upsert_sql(2)
+    assert sql.count('(%s, %s, %s)') == 2
+    assert 'ON CONFLICT (page_id, name) DO UPDATE' in sql
+    assert sql.endswith('.value IS DISTINCT FROM EXCLUDED.value')
+
+
+@pytest.mark.django_db
+def test_values_bulk_upsert_in_chunks(site, monkeypatch, django_assert_num_queries):
+    from django.db import connection
+    from spidercheck import models
+    from spidercheck.models import Value
+    pages = [site.add_page(site.url(f'/{n}/'))[0] for n in range(2)]
+    Value.upsert(pages[0], 'antiguo', 'x')
+    # Se usa la sentencia de PostgreSQL, que admiten también las
+    # versiones recientes de SQLite
+    monkeypatch.setattr(connection, 'vendor', 'postgresql')
+    monkeypatch.setattr(models, 'BULK_SIZE', 5)
+    values = {page: {f'valor_{i}': i for i in range(6)} for page in pages}
+    # Borrado y tres inserciones de cinco, cinco y dos filas
+    with django_assert_num_queries(4):
+        Value.bulk_upsert_many(values)
+    values[pages[1]]['valor_0'] = 'cambiado'
+    Value.bulk_upsert_many(values)
+    for page in pages:
+        assert dict(page.values.values_list('name', 'value')) == {
+            name: str(value) for name, value in values[page].items()
+            }
+
+
+@pytest.mark.django_db
+def test_check_page_with_result_sink(server, site):
+    from spidercheck.core import check_page
+    from spidercheck.models import Page
+    from spidercheck.sink import ResultSink
+    page, _ = site.add_page(server.url('/'))
+    priority = page.frontier_entry.priority
+    sink = ResultSink(max_pages=10, max_delay=60)
+    assert check_page(page, sink=sink)
+    stored = Page.objects.get(pk=page.pk)
+    assert stored.status == 0 and not stored.is_checked
+    assert stored.frontier_entry.priority == priority
+    assert stored.outgoing_links.count() == 0
+    assert site.pages.filter(subpath='/otra/').exists()
+    assert sink.pending() == {page.pk}
+    sink.flush()
+    stored.refresh_from_db()
+    assert stored.status == 200 and stored.is_checked
+    assert stored.content_hash and stored.links_hash
+    assert stored.outgoing_links.count() == 1
+    stored.frontier_entry.refresh_from_db()
+    assert stored.frontier_entry.priority - priority > 3600
+
+
+@pytest.mark.django_db
+def test_alias_clears_links_through_result_sink(server, site):
+    from spidercheck.core import check_page
+    from spidercheck.sink import ResultSink
+    page, _ = site.add_page(server.url('/cambia/'))
+    assert check_page(page)
+    server.moved.add('/cambia/')
+    sink = ResultSink(max_pages=10, max_delay=60)
+    assert check_page(page, sink=sink)
+    assert page.outgoing_links.count() == 1
+    sink.flush()
+    page.refresh_from_db()
+    assert page.is_alias()
+    assert page.outgoing_links.count() == 0
+    assert page.links_hash == ''
+
+
+@pytest.mark.django_db
+def test_check_site_applies_gap_to_existing_controller(site, monkeypatch):
+    from spidercheck import core, models
+    from spidercheck.politeness import RateController
+    controller = RateController(rate=1000.0, max_rate=1000.0)
+    monkeypatch.setattr(models, 'find_controller', lambda key: controller)
+    list(core.check_site(site, 0, gap=2))
+    assert controller.rate == pytest.approx(0.5)
+    assert controller.max_rate == pytest.approx(site.max_rate)
@@ -0,0 +1,169 @@
+#!/usr/bin/env python3
+
+import asyncio
+import threading
+import time
+from http.server import BaseHTTPRequestHandler
+
+import pytest
+
+from spidercheck import fetcher
+from spidercheck.crawler import AsyncCrawler, HostLimiter
+from spidercheck.results import Success, Failure
+
+
+class Handler(BaseHTTPRequestHandler):
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        server = self.server
+        with server.lock:
+            server.active += 1
+            server.max_active = max(server.max_active, server.active)
+            server.starts.append(time.monotonic())
+        time.sleep(0.05)
+        body = b'<html><body>ok</body></html>'
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/html')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+        with server.lock:
+            server.active -= 1
+
+
+def init_server(httpd):
+    httpd.active = httpd.max_active = 0
+    httpd.starts = []
+
+
+class FakePage:
+
+    def __init__(self, pk, url):
+        self.pk = pk
+        self.url = url
+        self.is_checked = False
+
+    def get_full_url(self):
+        return self.url
+
+
+class FakeSite:
+
+    def __init__(self, server, num_pages):
+        self.netloc = server.netloc
+        self.pages = [
+            FakePage(pk, f'http://{self.netloc}/{pk}/')
+            for pk in range(num_pages)
+            ]
+
+    def next_page_to_check(self, exclude=()):
+        for page in self.pages:
+            if not page.is_checked and page.pk not in exclude:
+                return page
+        return None
+
+
+def check(page):
+    page.is_checked = True
+    result = fetcher.fetch_page(page.get_full_url())
+    if result.is_failure():
+        return Failure(str(result))
+    return Success(page.pk)
+
+
+async def crawl(crawler, num):
+    return [result async for result in crawler.crawl(num)]
+
+
+def test_crawl_all_pages(server):
+    site = FakeSite(server, 12)
+    crawler = AsyncCrawler(site, concurrency=4, per_host=4, check=check)
+    results = asyncio.run(crawl(crawler, 100))
+    assert sorted(r.value for r in results) == list(range(12))
+    assert 1 < server.max_active <= 4
+
+
+def test_per_host_limit(server):
+    site = FakeSite(server, 8)
+    crawler = AsyncCrawler(site, concurrency=8, per_host=2, check=check)
+    results = asyncio.run(crawl(crawler, 8))
+    assert len(results) == 8
+    assert server.max_active <= 2
+
+
+def test_num_limit(server):
+    site = FakeSite(server, 8)
+    crawler = AsyncCrawler(site, concurrency=4, check=check)
+    results = asyncio.run(crawl(crawler, 3))
+    assert len(results) == 3
+
+
+def test_rate_limit(server):
+    from spidercheck.politeness import RateController
+    controller = RateController(rate=20, max_rate=20)
+
+    def paced_check(page):
+        page.is_checked = True
+        fetcher.fetch_page(page.get_full_url(), controller=controller)
+        return Success(page.pk)
+
+    site = FakeSite(server, 5)
+    crawler = AsyncCrawler(site, concurrency=5, per_host=5, check=paced_check)
+    asyncio.run(crawl(crawler, 5))
+    starts = sorted(server.starts)
+    assert starts[-1] - starts[0] >= 4 * (1 / 20) * 0.9
+
+
+def test_host_limiter():
+    limiter = HostLimiter(max_concurrency=1)
+
+    async def run():
+        async with limiter:
+            return True
+
+    assert asyncio.run(run())
+
+
+@pytest.mark.django_db
+def test_load_or_create_race(monkeypatch):
+    from spidercheck import models
+    site = models.Site.objects.create(name='race', scheme='http', netloc='race.example.com', path='/')
+    page, created = site.add_page('http://race.example.com/comun/')
+    assert created
+    # Simula que otro hilo ha creado la página después de buscarla
+    monkeypatch.setattr(models, 'first', lambda queryset: None)
+    again, created = site.add_page('http://race.example.com/comun/')
+    assert not created
+    assert again.pk == page.pk
+
+
+@pytest.mark.django_db(transaction=True)
+def test_concurrent_pages_share_link_target():
+    from concurrent.futures import ThreadPoolExecutor
+    from django.db import connection
+    from spidercheck.models import Site
+    if not connection.features.test_db_allows_multiple_connections:
+        # SQLite en memoria no admite escrituras concurrentes
+        pytest.skip('La base de datos de pruebas no admite varias conexiones')
+    site = Site.objects.create(name='shared', scheme='http', netloc='shared.example.com', path='/')
+    barrier = threading.Barrier(4)
+
+    def add_shared_target(_):
+        try:
+            barrier.wait()
+            page, _ = site.add_page('http://shared.example.com/destino/')
+            return page.pk
+        finally:
+            connection.close()
+
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        pks = list(executor.map(add_shared_target, range(4)))
+    assert len(set(pks)) == 1
+    assert site.pages.filter(subpath='/destino/').count() == 1
+
+
+if __name__ == "__main__":
+    pytest.main()
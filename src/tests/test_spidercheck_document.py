@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+
+import pytest
+
+from spidercheck.document import IncrementalParser
+from spidercheck.document import parse_document
+from spidercheck.parser import LinkExtractor
+from spidercheck.plugins import accepts_document
+from spidercheck.plugins import get_title
+from spidercheck.plugins import get_version
+
+
+HTML = '''<!DOCTYPE html>
+<html>
+<head>
+  <title>
+    Portal de transparencia
+  </title>
+  <meta name="version" content="42">
+  <meta name="keywords" content="Datos, Presupuestos">
+  <link rel="stylesheet" href="/static/main.css">
+  <script src="/static/main.js"></script>
+  <style>body { color: red; }</style>
+</head>
+<body>
+  <nav><a href="/inicio/">Inicio</a> <a href="/api/datos/">API</a></nav>
+  <main>
+    <h1>Presupuestos</h1>
+    <p>Los presupuestos<br>de <b>2024</b>.</p>
+    <img src="/img/grafico.png">
+    <h2>Ingresos</h2><h2>Gastos</h2>
+    <script>var x = 1;</script>
+    <a href="https://www.example.com/">Externo</a>
+  </main>
+  <footer>Pie de página</footer>
+</body>
+</html>
+'''
+
+
+@pytest.fixture
+def document():
+    return parse_document(HTML)
+
+
+def test_same_links_as_link_extractor(document):
+    extractor = LinkExtractor()
+    extractor.feed(HTML)
+    assert list(document.all_links()) == list(extractor.all_links())
+    # Las reglas de exclusión se aplican al clasificar los enlaces
+    assert '/api/datos/' in document.links
+
+
+@pytest.mark.parametrize('size', [1, 7, 64])
+def test_incremental_parser_matches_parse_document(document, size):
+    batches = []
+    parser = IncrementalParser(batches.append, batch_size=2)
+    for start in range(0, len(HTML), size):
+        parser.feed(HTML[start:start + size])
+    incremental = parser.close()
+    assert set(incremental.all_links()) == set(document.all_links())
+    assert sorted(sum(batches, [])) == sorted(document.all_links())
+    assert incremental.title == document.title
+    assert incremental.meta == document.meta
+    assert incremental.headings == document.headings
+    assert incremental.text == document.text
+
+
+def test_title_and_meta(document):
+    assert document.title == 'Portal de transparencia'
+    assert document.meta['version'] == '42'
+    assert document.meta['keywords'] == 'Datos, Presupuestos'
+
+
+def test_headings_and_text_of_main(document):
+    assert document.headings['h1'] == ['Presupuestos']
+    assert document.headings['h2'] == ['Ingresos', 'Gastos']
+    assert document.headings['h3'] == []
+    assert document.text == (
+        'Presupuestos Los presupuestos de 2024. Ingresos Gastos Externo'
+        )
+
+
+def test_text_of_body_without_main():
+    document = parse_document('<html><body><h3>Uno</h3><p>Dos</p></body></html>')
+    assert document.title is None
+    assert document.headings['h3'] == ['Uno']
+    assert document.text == 'Uno Dos'
+
+
+def test_accepts_document():
+    assert accepts_document(get_title.process)
+    assert accepts_document(lambda page, headers, body, **kwargs: {})
+    assert not accepts_document(lambda page, headers, body: {})
+
+
+@pytest.mark.parametrize('document', [None, parse_document(HTML)], ids=['body', 'document'])
+def test_plugins_with_and_without_document(document):
+    headers = {'content-type': 'text/html; charset=utf-8'}
+    assert get_title.process(None, headers, HTML, document=document) == {
+        'title': 'Portal de transparencia',
+        }
+    assert get_version.process(None, headers, HTML, document=document) == {
+        'version': '42',
+        }
@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+
+import re
+
+import pytest
+
+from spidercheck.exclusion import Excluder
+from spidercheck.exclusion import Rule
+
+
+RULES = [
+    Rule('prefix', '/privado/'),
+    Rule('prefix', '/priv/'),
+    Rule('glob', '*.pdf'),
+    Rule('glob', '/agenda/*?mes=*'),
+    Rule('regex', r'/calendario/\d{4}/'),
+    ]
+
+SAMPLES = [
+    ('/privado/', True),
+    ('/PRIV/x', True),
+    ('/privacidad/', False),
+    ('/docs/informe.PDF', True),
+    ('/docs/informe.pdf?v=2', False),
+    ('/agenda/cultura/?mes=10', True),
+    ('/agenda/cultura/', False),
+    ('/calendario/2024/', True),
+    ('/calendario/hoy/', False),
+    ('/otros/calendario/2024/', False),
+    ]
+
+
+@pytest.mark.parametrize('url, expected', SAMPLES)
+def test_excluder(url, expected):
+    is_excluded = Excluder(RULES)
+    assert is_excluded(url) is expected
+    assert is_excluded(url) is any(Excluder([rule])(url) for rule in RULES)
+
+
+def test_invalid_regex():
+    with pytest.raises(re.error):
+        Excluder([Rule('regex', '/(sin-cerrar/')])
+
+
+@pytest.mark.django_db
+def test_classify_links_skips_excluded(site):
+    page, _ = site.add_page(site.url('/docs/'))
+    site.excludes.create(kind='glob', pattern='*/borrador/*')
+    local_links, _ = page.classify_links(
+        '<a href="/api/datos/">API</a>'
+        '<a href="http://example.com/api/otros/">API</a>'
+        '<a href="informe/borrador/1">Borrador</a>'
+        '<a href="informe/">Informe</a>',
+        offline=True,
+        )
+    assert local_links == ['/docs/informe/']
+
+
+@pytest.mark.django_db
+def test_add_exclude_rule_removes_pending_pages(site):
+    for subpath in ['/agenda/1/', '/agenda/2/', '/agenda/3/', '/noticias/']:
+        site.add_page(site.url(subpath))
+    site.pages.filter(subpath='/agenda/3/').update(is_checked=True)
+    rule, removed = site.add_exclude_rule('prefix', '/agenda/')
+    assert removed == 2
+    assert rule.removed == 2
+    assert sorted(site.pages.values_list('subpath', flat=True)) == ['/agenda/3/', '/noticias/']
+    assert site.get_excluder()('/agenda/4/')
+    with pytest.raises(ValueError):
+        site.add_exclude_rule('sufijo', '/x/')
@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+
+from datetime import timedelta as TimeDelta
+from http.server import BaseHTTPRequestHandler
+
+import pytest
+
+
+# Sin esperas entre peticiones al servidor local
+pytestmark = pytest.mark.usefixtures('fast_controllers')
+
+
+class Handler(BaseHTTPRequestHandler):
+
+    def log_message(self, *args):
+        pass
+
+    def _reply(self):
+        self.server.requests.append((self.command, self.path))
+        if self.path == '/roto':
+            self.send_error(404)
+            return
+        if self.path == '/sin-head' and self.command == 'HEAD':
+            self.send_error(405)
+            return
+        status = 206 if self.headers.get('Range') else 200
+        self.send_response(status)
+        self.send_header('Content-Type', 'text/html')
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    do_HEAD = _reply
+    do_GET = _reply
+
+
+def make_page(name):
+    from spidercheck.models import Page, Site
+    site = Site.objects.create(
+        name=name,
+        scheme='http',
+        netloc=f'{name}.example.com',
+        path='/',
+        )
+    return Page.objects.create(site=site, subpath='/', params='')
+
+
+@pytest.mark.django_db
+def test_external_urls_are_shared(server):
+    from spidercheck import core
+    from spidercheck.models import ExternalUrl
+    urls = [server.url('/bien'), server.url('/roto')]
+    uno, dos = make_page('uno'), make_page('dos')
+    core._update_external_links(uno, urls)
+    core._update_external_links(dos, urls + urls)
+    assert ExternalUrl.objects.count() == 2
+    assert uno.external_links.count() == dos.external_links.count() == 2
+    core._update_external_links(uno, urls[:1])
+    assert uno.external_links.count() == 1
+
+
+@pytest.mark.django_db
+def test_check_external_urls_once_per_ttl(server):
+    from spidercheck import core
+    urls = [server.url('/bien'), server.url('/roto'), server.url('/sin-head')]
+    core._update_external_links(make_page('uno'), urls)
+    core._update_external_links(make_page('dos'), urls)
+    results = list(core.check_external_urls(10))
+    assert [bool(result) for result in results] == [True, False, True]
+    assert server.requests == [
+        ('HEAD', '/bien'),
+        ('HEAD', '/roto'),
+        ('GET', '/roto'),
+        ('HEAD', '/sin-head'),
+        ('GET', '/sin-head'),
+        ]
+    assert list(core.check_external_urls(10)) == []
+    assert len(list(core.check_external_urls(10, ttl=TimeDelta(0)))) == 3
+
+
+@pytest.mark.django_db
+def test_external_urls_with_errors(server):
+    from spidercheck import core
+    page = make_page('uno')
+    core._update_external_links(page, [server.url('/bien'), server.url('/roto')])
+    list(core.check_external_urls(10))
+    errors = page.site.external_urls_with_errors()
+    assert [external_url.url for external_url in errors] == [server.url('/roto')]
+    assert errors[0].status == 404
+
+
+if __name__ == "__main__":
+    pytest.main()
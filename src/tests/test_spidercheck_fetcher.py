@@ -0,0 +1,310 @@
+#!/usr/bin/env python3
+
+import gzip
+import tracemalloc
+import zlib
+from http.server import BaseHTTPRequestHandler
+
+import pytest
+
+from spidercheck import fetcher
+from spidercheck.pool import ConnectionPool
+from spidercheck.timings import Timings
+
+
+HTML = (
+    b'<!DOCTYPE html>\n<html><head><title>Hola</title></head>'
+    b'<body><a href="/uno/">uno</a></body></html>'
+    )
+
+ETAG = '"v1"'
+
+RESOURCES = {
+    '/': ('text/html; charset=utf-8', HTML),
+    '/uno/': ('text/html', HTML),
+    '/logo.png': ('image/png', b'\x89PNG' + b'\x00' * 128),
+    '/datos': ('application/json', b'{"a": 1}'),
+    '/latin1/': (
+        'text/html',
+        '<html><head><meta charset="iso-8859-1"></head>'
+        '<body>Canción</body></html>'.encode('latin-1'),
+        ),
+    '/incompleto/': ('text/html', b'<html><body>' + b'x' * 100000),
+    '/utf16/': ('text/html', '<html><body>Canción</body></html>'.encode('utf-16')),
+    '/bomba/': ('text/html', b'<html><body>' + b' ' * (16 * 1024 * 1024) + b'</body></html>'),
+    }
+
+#: Redirecciones: ruta -> (código, destino)
+REDIRECTS = {
+    '/viejo': (301, '/uno'),
+    '/uno': (302, '/uno/'),
+    }
+
+#: Tamaño del recurso enorme servido en /huge/
+HUGE_SIZE = 32 * 1024 * 1024
+
+COMPRESSORS = {
+    'gzip': gzip.compress,
+    'deflate': zlib.compress,
+    }
+
+
+class Handler(BaseHTTPRequestHandler):
+
+    def log_message(self, *args):
+        pass
+
+    def _reply_huge(self, content_type, first_bytes):
+        self.send_response(200)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(HUGE_SIZE))
+        self.end_headers()
+        block = first_bytes + b'x' * (64 * 1024 - len(first_bytes))
+        try:
+            for _ in range(HUGE_SIZE // len(block)):
+                self.wfile.write(block)
+                block = b'x' * len(block)
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+
+    def _reply(self, with_body):
+        self.server.requests.append((self.command, self.path))
+        if self.path == '/huge/':
+            self._reply_huge('text/html', b'<html><body>')
+            return
+        if self.path == '/fake/':
+            self._reply_huge('text/html', b'%PDF-1.4\n')
+            return
+        if self.path in REDIRECTS:
+            status, location = REDIRECTS[self.path]
+            self.send_response(status)
+            self.send_header('Location', location)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+        if self.path not in RESOURCES:
+            self.send_error(404)
+            return
+        content_type, body = RESOURCES[self.path]
+        if self.headers.get('If-None-Match') == ETAG:
+            self.send_response(304)
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header('ETag', ETAG)
+        self.send_header('Content-Type', content_type)
+        encoding = self.headers.get('X-Test-Encoding')
+        if encoding:
+            body = COMPRESSORS[encoding](body)
+            self.send_header('Content-Encoding', encoding)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        if with_body:
+            self.wfile.write(body)
+
+    def do_HEAD(self):
+        self._reply(with_body=False)
+
+    def do_GET(self):
+        self._reply(with_body=True)
+
+
+def test_is_asset_url():
+    assert fetcher.is_asset_url('http://example.com/img/logo.PNG')
+    assert fetcher.is_asset_url('/docs/informe.pdf?v=2')
+    assert not fetcher.is_asset_url('http://example.com/')
+    assert not fetcher.is_asset_url('http://example.com/noticias/index.html')
+
+
+def test_single_request_html(server):
+    result = fetcher.fetch_page(server.url('/'), single_request=True)
+    assert result.is_success()
+    response = result.value
+    assert response.status == 200
+    assert response.is_html()
+    assert response.body == HTML.decode('utf-8')
+    assert response.num_requests == 1
+    assert server.requests == [('GET', '/')]
+
+
+def test_two_requests_html(server):
+    result = fetcher.fetch_page(server.url('/'), single_request=False)
+    response = result.value
+    assert response.body == HTML.decode('utf-8')
+    assert response.num_requests == 2
+    assert server.requests == [('HEAD', '/'), ('GET', '/')]
+
+
+def test_asset_uses_head(server):
+    result = fetcher.fetch_page(server.url('/logo.png'))
+    response = result.value
+    assert response.content_type == 'image/png'
+    assert response.body is None
+    assert server.requests == [('HEAD', '/logo.png')]
+
+
+def test_non_html_body_is_not_read(server):
+    result = fetcher.fetch_page(server.url('/datos'))
+    response = result.value
+    assert response.content_type == 'application/json'
+    assert response.body is None
+    assert server.requests == [('GET', '/datos')]
+
+
+def test_external_body_is_not_read(server):
+    result = fetcher.fetch_page(server.url('/'), is_local=lambda url: False)
+    assert result.value.body is None
+
+
+def test_conditional_request(server):
+    result = fetcher.fetch_page(server.url('/'))
+    etag = result.value.etag
+    assert etag == ETAG
+    validators = fetcher.get_conditional_headers(etag=etag)
+    result = fetcher.fetch_page(server.url('/'), validators=validators)
+    response = result.value
+    assert response.is_not_modified()
+    assert response.body is None
+
+
+def test_conditional_request_two_requests(server):
+    validators = fetcher.get_conditional_headers(etag=ETAG)
+    result = fetcher.fetch_page(
+        server.url('/'),
+        single_request=False,
+        validators=validators,
+        )
+    assert result.value.is_not_modified()
+    assert server.requests == [('HEAD', '/')]
+
+
+@pytest.mark.parametrize('encoding', ['gzip', 'deflate'])
+def test_compressed_body(server, encoding):
+    result = fetcher.fetch(
+        server.url('/'),
+        headers={'X-Test-Encoding': encoding},
+        )
+    response = result.value
+    assert response.content_encoding == encoding
+    assert response.body == HTML.decode('utf-8')
+    assert response.decoded_bytes == len(HTML)
+    assert response.size_bytes == len(HTML)
+    assert 0 < response.wire_bytes
+
+
+def test_uncompressed_body(server):
+    response = fetcher.fetch(server.url('/')).value
+    assert response.wire_bytes == response.decoded_bytes == len(HTML)
+
+
+def test_charset_from_meta(server):
+    response = fetcher.fetch(server.url('/latin1/')).value
+    assert 'Canción' in response.body
+    assert response.encoding == 'iso8859-1'
+
+
+def test_body_size_cap(server):
+    tracemalloc.start()
+    response = fetcher.fetch(server.url('/huge/'), max_bytes=1024 * 1024).value
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    assert response.is_truncated
+    assert response.decoded_bytes == 1024 * 1024
+    assert response.wire_bytes < 2 * 1024 * 1024
+    assert peak < 8 * 1024 * 1024
+
+
+def test_html_sniff_aborts_download(server):
+    response = fetcher.fetch(server.url('/fake/')).value
+    assert response.body is None
+    assert response.rejected
+    assert response.wire_bytes <= fetcher.CHUNK_SIZE
+
+
+def test_html_check_while_streaming(server):
+    response = fetcher.fetch(server.url('/incompleto/')).value
+    assert response.body is None
+    assert response.html_check.is_failure()
+    assert response.rejected.endswith('El contenido no termina con </html>')
+    response = fetcher.fetch(server.url('/')).value
+    assert response.html_check.is_success()
+
+
+def test_utf16_html_is_not_rejected(server):
+    response = fetcher.fetch(server.url('/utf16/')).value
+    assert response.rejected is None
+    assert 'Canción' in response.body
+
+
+@pytest.mark.parametrize('encoding', ['gzip', 'deflate'])
+def test_decompression_bomb_is_capped(server, encoding):
+    tracemalloc.start()
+    response = fetcher.fetch(
+        server.url('/bomba/'),
+        headers={'X-Test-Encoding': encoding},
+        max_bytes=1024 * 1024,
+        ).value
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    assert response.is_truncated
+    assert response.decoded_bytes == 1024 * 1024
+    assert response.wire_bytes < 1024 * 1024
+    assert peak < 8 * 1024 * 1024
+
+
+def test_redirect_chain_is_recorded(server):
+    result = fetcher.fetch_page(server.url('/viejo'))
+    response = result.value
+    assert response.url == server.url('/uno/')
+    assert response.body == HTML.decode('utf-8')
+    assert [(hop['status'], hop['location']) for hop in response.redirects] == [
+        (301, server.url('/uno')),
+        (302, server.url('/uno/')),
+        ]
+
+
+def test_redirect_body_can_be_skipped(server):
+    result = fetcher.fetch_page(
+        server.url('/viejo'),
+        want_body=lambda response: not response.redirects,
+        )
+    response = result.value
+    assert response.status == 200
+    assert response.body is None
+    assert len(response.redirects) == 2
+
+
+def test_not_found(server):
+    result = fetcher.fetch_page(server.url('/no-existe/'))
+    assert result.is_failure()
+    assert result.code == 404
+
+
+def test_timings_per_phase(server):
+    pool = ConnectionPool()
+    timings = Timings()
+    fetcher.fetch_page(server.url('/'), client=pool, timings=timings)
+    assert set(timings.phases) == {'connect', 'ttfb', 'download'}
+    assert all(seconds >= 0 for seconds in timings.phases.values())
+    pool.close()
+
+
+@pytest.mark.slow
+def test_benchmark_requests_per_page(server):
+    paths = ['/', '/uno/', '/logo.png', '/datos'] * 25
+    saved = {}
+    for single_request in (False, True):
+        server.requests.clear()
+        for path in paths:
+            fetcher.fetch_page(server.url(path), single_request=single_request)
+        saved[single_request] = len(server.requests) / len(paths)
+    print(
+        f'\nPeticiones por página: HEAD+GET={saved[False]:.2f}'
+        f' GET={saved[True]:.2f}'
+        f' (ahorro: {saved[False] - saved[True]:.2f} peticiones/página)'
+        )
+    assert saved[True] < saved[False]
+
+
+if __name__ == "__main__":
+    pytest.main()
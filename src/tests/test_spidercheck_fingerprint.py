@@ -0,0 +1,46 @@
+#!/usr/bin/env python3
+
+import pytest
+
+from spidercheck.fingerprint import distance
+from spidercheck.fingerprint import near_duplicates
+from spidercheck.fingerprint import simhash
+
+
+TEXT = (
+    'El ayuntamiento informa de que el plazo de presentación de '
+    'solicitudes para las ayudas al alquiler permanecerá abierto hasta '
+    'el próximo día treinta, y que la documentación necesaria puede '
+    'consultarse en la sede electrónica o en las oficinas municipales.'
+    )
+
+
+def test_simhash_of_similar_texts_are_close():
+    base = simhash(TEXT)
+    assert simhash(TEXT) == base
+    assert distance(base, simhash(TEXT.replace('treinta', 'treinta y uno'))) <= 8
+    assert distance(base, simhash('Calendario de partidos del torneo de primavera')) > 8
+
+
+def test_near_duplicates():
+    fingerprints = {
+        'a': simhash(TEXT),
+        'b': simhash(TEXT) ^ 0b101,
+        'c': simhash(TEXT) ^ (1 << 40),
+        'd': simhash('Calendario de partidos del torneo de primavera'),
+        }
+    assert near_duplicates(fingerprints, max_distance=3) == [['a', 'b', 'c']]
+    assert near_duplicates(fingerprints, max_distance=0) == []
+
+
+@pytest.mark.django_db
+def test_site_near_duplicate_pages():
+    from spidercheck.models import Site
+    site = Site.objects.create(name='similar', scheme='http', netloc='example.com', path='/')
+    for subpath, text in [('/a/', TEXT), ('/b/', TEXT + ' Gracias.'), ('/c/', 'Otra cosa')]:
+        page, _ = site.add_page(site.url(subpath))
+        page.simhash = simhash(text)
+        page.save()
+    site.add_page(site.url('/sin-huella/'))
+    groups = site.near_duplicate_pages(max_distance=10)
+    assert [sorted(page.subpath for page in group) for group in groups] == [['/a/', '/b/']]
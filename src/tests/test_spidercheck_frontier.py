@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+
+from datetime import timedelta as TimeDelta
+import time
+
+import pytest
+
+
+def add_pages(site, *paths):
+    return [site.add_page(site.url(path))[0] for path in paths]
+
+
+@pytest.mark.django_db
+def test_new_pages_are_leased_in_order(site):
+    from spidercheck.models import FrontierEntry
+    first, second, third = add_pages(site, '/a/', '/b/', '/c/')
+    assert FrontierEntry.lease(site, 2, worker='w1') == [first, second]
+    assert FrontierEntry.lease(site, 2, worker='w2') == [third]
+    assert FrontierEntry.lease(site, 2, worker='w3') == []
+    entry = FrontierEntry.objects.get(page=first)
+    assert entry.leased_by == 'w1' and entry.leased_until is not None
+
+
+@pytest.mark.django_db
+def test_complete_reschedules_by_status(site):
+    from spidercheck.models import FrontierEntry
+    ok, broken, pending = add_pages(site, '/ok/', '/roto/', '/nueva/')
+    FrontierEntry.lease(site, 2)
+    ok.status, broken.status = 200, 404
+    FrontierEntry.complete(ok)
+    FrontierEntry.complete(broken)
+    # Todavía no les toca volver a comprobarse
+    assert FrontierEntry.lease(site, 3) == [pending]
+    assert FrontierEntry.lease(site, 3, due=False) == [broken, ok]
+    entry = FrontierEntry.objects.get(page=ok)
+    assert entry.priority - FrontierEntry.objects.get(page=broken).priority > 3600
+
+
+@pytest.mark.django_db
+def test_only_due_pages_are_leased(site):
+    from spidercheck.models import FrontierEntry
+    early, late = add_pages(site, '/antes/', '/despues/')
+    FrontierEntry.objects.filter(page=early).update(priority=0.0)
+    FrontierEntry.objects.filter(page=late).update(priority=time.time() + 3600)
+    assert site.next_page_to_check() == early
+    assert site.next_page_to_check() is None
+
+
+@pytest.mark.django_db
+def test_expired_leases_are_released(site):
+    from spidercheck.models import FrontierEntry
+    page, = add_pages(site, '/a/')
+    assert FrontierEntry.lease(site, duration=-TimeDelta(seconds=1)) == [page]
+    assert FrontierEntry.lease(site, exclude=[page.pk]) == []
+    assert FrontierEntry.expire(site) == 1
+    assert FrontierEntry.objects.get(page=page).leased_by == ''
+    assert FrontierEntry.lease(site) == [page]
+
+
+@pytest.mark.django_db
+def test_next_page_to_check_rebuilds_frontier(site):
+    from spidercheck.models import FrontierEntry
+    from spidercheck.models import Page
+    page = Page.objects.create(site=site, subpath='/antigua/')
+    assert not FrontierEntry.objects.filter(site=site).exists()
+    assert site.next_page_to_check() == page
+    assert site.next_page_to_check() is None
+    assert site.next_page_to_check(exclude={page.pk}) is None
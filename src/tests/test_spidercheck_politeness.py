@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+
+import pytest
+
+from spidercheck.politeness import MAX_BACKOFF, RateController, get_controller
+
+
+class FakeClock:
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+def make_controller(**kwargs):
+    clock = FakeClock()
+    controller = RateController(clock=clock, sleep=clock.sleep, **kwargs)
+    return controller, clock
+
+
+def test_token_bucket_spacing():
+    controller, clock = make_controller(rate=2.0)
+    for _ in range(5):
+        controller.acquire()
+    assert clock.now == pytest.approx(2.0)
+
+
+@pytest.mark.parametrize('status', [429, 503, -1])
+def test_backoff_on_overload(status):
+    controller, clock = make_controller(rate=2.0)
+    controller.acquire()
+    controller.feedback(status, latency=0.1)
+    assert controller.rate == pytest.approx(1.0)
+    assert controller.reserve() > 0.5
+    controller.feedback(status, latency=0.1)
+    assert controller.rate == pytest.approx(0.5)
+
+
+def test_retry_after_is_honored():
+    controller, clock = make_controller(rate=2.0)
+    controller.acquire()
+    controller.feedback(429, latency=0.1, retry_after='30')
+    controller.acquire()
+    assert clock.now >= 30.0
+
+
+def test_retry_after_is_clamped():
+    controller, clock = make_controller(rate=2.0)
+    controller.feedback(503, latency=0.1, retry_after='86400')
+    assert controller.reserve() == pytest.approx(MAX_BACKOFF)
+
+
+def test_speed_up_when_fast():
+    controller, clock = make_controller(rate=0.5, max_rate=3.0)
+    for _ in range(100):
+        controller.feedback(200, latency=0.05)
+    assert controller.rate == pytest.approx(3.0)
+
+
+def test_slow_down_when_slow():
+    controller, clock = make_controller(rate=2.0)
+    controller.feedback(200, latency=5.0)
+    assert controller.rate < 2.0
+
+
+def test_crawl_delay_caps_rate():
+    controller, clock = make_controller(rate=5.0, max_rate=10.0, crawl_delay=4)
+    assert controller.rate == pytest.approx(0.25)
+    for _ in range(100):
+        controller.feedback(200, latency=0.01)
+    assert controller.rate == pytest.approx(0.25)
+
+
+def test_configure_existing_controller():
+    controller, clock = make_controller(rate=5.0, max_rate=10.0)
+    controller.configure(crawl_delay=4)
+    assert controller.max_rate == pytest.approx(0.25)
+    assert controller.rate == pytest.approx(0.25)
+    controller.configure(crawl_delay=0, rate=2.0)
+    assert controller.max_rate == pytest.approx(10.0)
+    assert controller.rate == pytest.approx(2.0)
+    controller.configure(max_rate=1.0)
+    assert controller.rate == pytest.approx(1.0)
+
+
+def test_get_controller_per_key():
+    assert get_controller('uno') is get_controller('uno')
+    assert get_controller('uno') is not get_controller('dos')
+
+
+if __name__ == "__main__":
+    pytest.main()
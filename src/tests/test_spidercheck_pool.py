@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+
+import time
+from http.server import BaseHTTPRequestHandler
+
+import pytest
+
+from spidercheck import fetcher
+from spidercheck.pool import ConnectionPool, get_pool
+from spidercheck.timings import Timings
+
+
+BODY = b'<!DOCTYPE html><html><body>Hola</body></html>'
+
+
+class Handler(BaseHTTPRequestHandler):
+
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, *args):
+        pass
+
+    def setup(self):
+        super().setup()
+        with self.server.lock:
+            self.server.connections += 1
+
+    def do_HEAD(self):
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/html')
+        self.send_header('Content-Length', str(len(BODY)))
+        self.end_headers()
+
+    def do_GET(self):
+        self.do_HEAD()
+        self.wfile.write(BODY)
+        if self.path == '/bye':
+            # Cierra la conexión sin avisar al cliente
+            self.close_connection = True
+
+
+def init_server(httpd):
+    httpd.connections = 0
+
+
+def test_connections_are_reused(server):
+    pool = ConnectionPool()
+    for _ in range(5):
+        result = fetcher.fetch(server.url(), client=pool)
+        assert result.value.body == BODY.decode('utf-8')
+    stats = pool.stats()
+    assert stats['handshakes'] == 1
+    assert stats['reused'] == 4
+    assert server.connections == 1
+    pool.close()
+
+
+def test_reused_connection_has_no_connect_time(server):
+    pool = ConnectionPool()
+    timings = Timings()
+    fetcher.fetch(server.url(), client=pool, timings=timings)
+    connect = timings.phases['connect']
+    fetcher.fetch(server.url(), client=pool, timings=timings)
+    assert timings.phases['connect'] == connect
+    assert 'ttfb' in timings.phases
+    pool.close()
+
+
+def test_head_and_get_share_connection(server):
+    pool = ConnectionPool()
+    result = fetcher.fetch_page(server.url(), single_request=False, client=pool)
+    assert result.value.num_requests == 2
+    assert pool.stats()['handshakes'] == 1
+    pool.close()
+
+
+def test_idle_timeout(server):
+    pool = ConnectionPool(idle_timeout=0.05)
+    fetcher.fetch(server.url(), client=pool)
+    time.sleep(0.1)
+    fetcher.fetch(server.url(), client=pool)
+    assert pool.stats()['handshakes'] == 2
+    assert pool.stats()['reused'] == 0
+    pool.close()
+
+
+def test_max_size():
+    pool = ConnectionPool(max_size=1)
+
+    class FakeConnection:
+        closed = False
+
+        def close(self):
+            self.closed = True
+
+    first, second = FakeConnection(), FakeConnection()
+    pool.release(('http', 'localhost', None), first)
+    pool.release(('http', 'localhost', None), second)
+    assert pool.stats()['idle'] == 1
+    assert second.closed
+
+
+def test_closed_connection_is_retried(server):
+    pool = ConnectionPool()
+    fetcher.fetch(server.url('/bye'), client=pool)
+    time.sleep(0.05)
+    result = fetcher.fetch(server.url(), client=pool)
+    assert result.is_success()
+    assert pool.stats()['handshakes'] == 2
+
+
+def test_get_pool_per_key():
+    assert get_pool('uno') is get_pool('uno')
+    assert get_pool('uno') is not get_pool('dos')
+    assert get_pool('uno', max_size=9).max_size == 9
+
+
+if __name__ == "__main__":
+    pytest.main()
@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+
+from datetime import timedelta as TimeDelta
+from http.server import BaseHTTPRequestHandler
+
+import pytest
+
+from spidercheck import robots
+
+
+ROBOTS = b'User-agent: *\nDisallow: /privado/\nCrawl-delay: 2\n'
+
+ETAG = '"r1"'
+
+
+class Handler(BaseHTTPRequestHandler):
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        self.server.requests.append(self.path)
+        if self.headers.get('If-None-Match') == ETAG:
+            self.send_response(304)
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain')
+        self.send_header('Content-Length', str(len(ROBOTS)))
+        self.send_header('ETag', ETAG)
+        self.end_headers()
+        self.wfile.write(ROBOTS)
+
+
+@pytest.mark.parametrize('status, allowed', [
+    (200, False),
+    (401, False),
+    (403, False),
+    (404, True),
+    (500, False),
+    (-1, False),
+    ])
+def test_compile_rules_by_status(status, allowed):
+    body = ROBOTS.decode('ascii') if status == 200 else ''
+    rules = robots.compile_rules(body, status)
+    assert rules.can_fetch('*', '/privado/') is allowed
+
+
+def test_rules_are_compiled_once():
+    robots._compiled.clear()
+    first = robots.get_rules('uno', 'Disallow: /x/', 200, None)
+    assert robots.get_rules('uno', 'Disallow: /x/', 200, None) is first
+    assert robots.get_rules('uno', 'Disallow: /y/', 200, None) is not first
+
+
+@pytest.mark.django_db
+def test_robots_txt_is_fetched_once(site, server):
+    for _ in range(5):
+        rules = site.get_robots_txt()
+        assert not rules.can_fetch('*', '/privado/')
+    assert server.requests == ['/robots.txt']
+    assert site.robots_txt.body == ROBOTS.decode('ascii')
+    assert site.get_crawl_delay() == 2.0
+
+
+@pytest.mark.django_db
+def test_expired_robots_txt_is_revalidated(site, server):
+    rules = site.get_robots_txt()
+    assert not rules.can_fetch('*', '/privado/')
+    robots_txt = site.robots_txt
+    robots_txt.expires_at -= robots.ROBOTS_TTL + TimeDelta(seconds=1)
+    robots_txt.save()
+    robots._compiled.clear()
+    rules = site.get_robots_txt()
+    assert not rules.can_fetch('*', '/privado/')
+    robots_txt.refresh_from_db()
+    assert len(server.requests) == 2
+    assert robots_txt.status == 200
+    assert not robots_txt.is_expired()
+    assert robots_txt.body == ROBOTS.decode('ascii')
+
+
+@pytest.mark.django_db
+def test_crawl_delay_is_applied_on_refresh(site):
+    from spidercheck.politeness import get_controller
+    controller = get_controller((site.scheme, site.netloc), rate=5.0, max_rate=10.0)
+    assert controller.max_rate == pytest.approx(10.0)
+    site.get_robots_txt()
+    assert controller.max_rate == pytest.approx(0.5)
+    assert controller.rate == pytest.approx(0.5)
+
+
+if __name__ == "__main__":
+    pytest.main()
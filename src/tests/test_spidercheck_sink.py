@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+
+import os
+import signal
+import time
+
+import pytest
+
+from spidercheck.sink import ResultSink
+
+
+@pytest.fixture
+def pages(site):
+    return [site.add_page(site.url(f'/{n}/'))[0] for n in range(12)]
+
+
+def _status(page):
+    from spidercheck.models import Page
+    return Page.objects.get(pk=page.pk).status
+
+
+@pytest.mark.django_db
+def test_flush_by_count(pages):
+    sink = ResultSink(max_pages=10, max_delay=60)
+    for page in pages[:9]:
+        page.status = 200
+        sink.save_page(page, ['status'])
+    assert _status(pages[0]) == 0
+    assert sink.pending() == {page.pk for page in pages[:9]}
+    pages[9].status = 404
+    sink.save_page(pages[9], ['status'])
+    assert sink.pending() == set()
+    assert [_status(page) for page in pages[:10]] == [200] * 9 + [404]
+    assert sink.stats()['flushes'] == 1
+    assert sink.stats()['pages'] == 10
+
+
+@pytest.mark.django_db
+def test_flush_by_time(pages):
+    sink = ResultSink(max_pages=100, max_delay=0)
+    pages[0].status = 500
+    sink.save_page(pages[0], ['status'])
+    assert _status(pages[0]) == 500
+
+
+@pytest.mark.django_db(transaction=True)
+def test_flush_by_timer(pages):
+    sink = ResultSink(max_pages=100, max_delay=0.2)
+    pages[0].status = 500
+    sink.save_page(pages[0], ['status'])
+    assert _status(pages[0]) == 0
+    deadline = time.monotonic() + 5
+    while sink.pending() and time.monotonic() < deadline:
+        time.sleep(0.05)
+    assert _status(pages[0]) == 500
+    assert sink.stats()['flushes'] == 1
+
+
+@pytest.mark.django_db
+def test_one_transaction_per_batch(pages, django_assert_num_queries):
+    from spidercheck.models import Link
+    home = pages[0]
+    Link.objects.create(from_page=home, to_page=pages[1])
+    sink = ResultSink(max_pages=100, max_delay=60)
+    for page in pages:
+        page.status = 200
+        page.is_checked = True
+        sink.save_page(page, ['status'])
+        sink.save_page(page, ['is_checked'])
+        sink.set_values(page, {'title': f'Página {page.pk}'})
+    sink.update_links(home, added=[page.pk for page in pages[2:]], removed=[pages[1].pk])
+    # Inicio y fin de la transacción, páginas, enlaces borrados y
+    # nuevos, valores borrados y nuevos
+    with django_assert_num_queries(7):
+        sink.flush()
+    assert all(page.status == 200 and page.is_checked for page in map(_refresh, pages))
+    assert sorted(home.outgoing_links.values_list('to_page', flat=True)) == [page.pk for page in pages[2:]]
+    assert home.values.get(name='title').value == f'Página {home.pk}'
+
+
+@pytest.mark.django_db
+def test_clear_links(pages):
+    from spidercheck.models import Link
+    home = pages[0]
+    Link.objects.create(from_page=home, to_page=pages[1])
+    sink = ResultSink(max_pages=100, max_delay=60)
+    sink.update_links(home, added=[pages[2].pk], removed=[])
+    sink.clear_links(home)
+    assert home.outgoing_links.count() == 1
+    sink.update_links(home, added=[pages[3].pk], removed=[])
+    sink.flush()
+    assert list(home.outgoing_links.values_list('to_page', flat=True)) == [pages[3].pk]
+
+
+def _refresh(page):
+    page.refresh_from_db()
+    return page
+
+
+@pytest.mark.django_db
+def test_flush_on_signal(pages):
+    with pytest.raises(SystemExit):
+        with ResultSink(max_pages=100, max_delay=60) as sink:
+            pages[0].status = 503
+            sink.save_page(pages[0], ['status'])
+            os.kill(os.getpid(), signal.SIGTERM)
+    assert _status(pages[0]) == 503
+    assert signal.getsignal(signal.SIGTERM) is not sink._on_signal
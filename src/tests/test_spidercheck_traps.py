@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+
+import pytest
+
+from spidercheck.traps import url_template
+
+
+@pytest.fixture
+def site(make_site):
+    return make_site(max_variants=10)
+
+
+def test_template_ignores_values_and_order():
+    assert url_template('/agenda/', 'mes=1&orden=a') == url_template('/agenda/', 'orden=b&mes=12')
+    assert url_template('/agenda/', 'mes=1') != url_template('/agenda/', 'mes=1&orden=a')
+
+
+@pytest.mark.django_db
+def test_variants_are_capped(site):
+    pages = [site.add_page(site.url(f'/agenda/?mes={n}'))[0] for n in range(50)]
+    assert sum(page is not None for page in pages) == 10
+    assert site.pages.count() == 10
+    assert site.add_page(site.url('/agenda/?mes=0'))[0] == pages[0]
+    assert site.add_page(site.url('/agenda/?dia=1'))[0] is not None
+    group = site.throttled_groups().get()
+    assert (group.template, group.admitted, group.throttled) == ('/agenda/?mes', 10, 40)
+    assert group.reason == 'variants'
+    assert group.example == '/agenda/?mes=49'
+
+
+@pytest.mark.django_db
+def test_pages_created_by_others_are_not_counted(site):
+    from spidercheck.models import Page, TrapGroup
+    # Otro proceso crea dos variantes después de que se buscaran
+    Page.objects.create(site=site, subpath='/agenda/', params='mes=1')
+    Page.objects.create(site=site, subpath='/agenda/', params='mes=2')
+    paths = [('/agenda/', f'mes={n}') for n in range(1, 5)]
+    pages, inserted = site.admit_new_pages(paths)
+    assert set(pages) == set(paths)
+    assert inserted == set(paths[2:])
+    assert TrapGroup.objects.get(site=site).admitted == 2
+
+
+@pytest.mark.django_db
+def test_paths_without_params_are_not_capped(site):
+    for n in range(50):
+        assert site.add_page(site.url(f'/noticias/{n}/'))[0] is not None
+        assert site.add_page(site.url(f'/noticia-{n}.html'))[0] is not None
+    assert site.pages.count() == 100
+    assert not site.throttled_groups().exists()
+
+
+@pytest.mark.django_db
+def test_suspicious_paths_are_rejected(make_site):
+    site = make_site()
+    page, created = site.add_page(site.url('/a/b/a/b/a/b/'))
+    assert page is None and not created
+    assert site.throttled_groups().get().reason == 'repeat'
+
+
+@pytest.mark.django_db
+def test_frontier_stays_bounded(site):
+    from spidercheck.core import _update_links
+    page, _ = site.add_page(site.url('/calendario/'))
+    html = ''.join(f'<a href="/calendario/?dia={n}">{n}</a>' for n in range(30))
+    _update_links(page, html, offline=True)
+    assert site.pages.count() == 11
+    assert page.outgoing_links.count() == 10
@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+
+import re
+import time
+
+import pytest
+
+from spidercheck.webparser import check_html
+from spidercheck.webparser import HtmlSniffer
+from spidercheck.webparser import is_valid_html
+
+
+def old_is_valid_html(body):
+    body = body.strip()
+    if len(body) < 14:
+        return False
+    if body[-7:].lower() != '</html>':
+        return False
+    if not re.search('<html.*>', body, re.IGNORECASE):
+        return False
+    return True
+
+
+SAMPLES = [
+    '<!DOCTYPE html>\n<html lang="es">\n<body>Hola</body>\n</html>\n',
+    '  \n<HTML><BODY>Hola</BODY></HTML>  ',
+    '<html\n lang="es"><body>Hola</body></html>',
+    '<html><body>Hola</body>',
+    '<html></html>',
+    '<html></html> ',
+    '<!-- comentario --> <html><p>x</p></html>',
+    '<p>sin etiqueta html</p></html>',
+    'Hola mundo',
+    '',
+    ]
+
+
+@pytest.mark.parametrize('body', SAMPLES)
+def test_same_result_as_old_implementation(body):
+    assert is_valid_html(body) == old_is_valid_html(body)
+
+
+@pytest.mark.parametrize('body', SAMPLES)
+@pytest.mark.parametrize('chunk_size', [1, 3, 16])
+def test_incremental_feed(body, chunk_size):
+    for data in (body, body.encode('utf-8')):
+        sniffer = HtmlSniffer()
+        for index in range(0, len(data), chunk_size):
+            sniffer.feed(data[index:index + chunk_size])
+        assert bool(sniffer.result()) == is_valid_html(body)
+
+
+def test_rejection_reasons():
+    assert check_html('').error_message == 'El contenido está vacío'
+    assert check_html('<html></html>').error_message == (
+        'El contenido es demasiado corto'
+        )
+    assert check_html('<html><body></body>').error_message == (
+        'El contenido no termina con </html>'
+        )
+    assert check_html('<body>Hola</body></html>').error_message.startswith(
+        'No se encuentra la etiqueta <html>'
+        )
+
+
+def test_html_tag_outside_head_window():
+    body = '<!--' + 'x' * 100 + '--><html><body></body></html>'
+    sniffer = HtmlSniffer(head_window=50)
+    sniffer.feed(body)
+    assert sniffer.result().is_failure()
+
+
+MB = 1024 * 1024
+
+
+@pytest.mark.slow
+@pytest.mark.parametrize('name', ['minified', 'adversarial'])
+def test_benchmark_10mb_pages(name):
+    if name == 'minified':
+        body = '<html><body>' + '<div><a href="/x/">x</a></div>' * (10 * MB // 30) + '</body></html>'
+    else:
+        # Muchas apariciones de ``<html`` sin ``>`` en la misma línea
+        body = '<html' * (10 * MB // 5) + '</html>'
+    start = time.perf_counter()
+    for _ in range(100):
+        check_html(body)
+    elapsed = (time.perf_counter() - start) / 100
+    print(f'{name}: {len(body) / MB:.1f} MB en {elapsed * 1000:.3f}ms')
+    assert elapsed < 0.005